@@ -87,7 +87,8 @@ def send_question(question: str):
         response = requests.post(
             f"{st.session_state.api_url}/ask",
             json=payload,
-            headers={"Content-Type": "application/json"},
+            # タイムアウトより少し前にサーバー側で打ち切らせ、縮退した回答を受け取る
+            headers={"Content-Type": "application/json", "X-Request-Timeout": "28"},
             timeout=30
         )
         
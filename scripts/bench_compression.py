@@ -0,0 +1,193 @@
+"""
+レスポンス圧縮のベンチマーク
+/batch-ask・/stats・マニュアル目次に相当する代表的なレスポンスについて、
+圧縮方式ごとの削減バイト数と圧縮時間、ETagによる再検証の転送量を計測
+"""
+
+import asyncio
+import gzip
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from fastapi import FastAPI, Request, Response
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.bench_serialization import build_responses
+from src.http_compression import CompressionMiddleware, brotli
+from src.responses import cacheable_response, dumps, make_etag, not_modified
+
+
+def build_stats(seed: int = 42) -> dict:
+    """/stats 相当の合成データ"""
+    rng = random.Random(seed)
+    stages = ['exact_match', 'classify', 'faq.dense', 'faq.lexical', 'manual.dense', 'manual.lexical',
+              'rerank', 'search', 'prompt', 'llm', 'total']
+    return {
+        'uptime_seconds': rng.uniform(1000, 100000),
+        'agent_status': 'healthy',
+        'search_engine_status': {'faq': True, 'manual': True, 'overall': True},
+        'search_stats': {
+            'exact_match': {'lookups': 12000, 'hits': 3100, 'hit_rate': 0.258},
+            'adaptive': {'requests': 8000, 'results': 31000, 'dense_fetched': 52000,
+                         'decisions': {'confident': 4100, 'expand': 2200, 'skip': 900, 'base': 800}},
+            'reranker': {'reranked': 0, 'skipped_budget': 0, 'skipped_deadline': 0, 'cache_size': 0}
+        },
+        'token_stats': {'requests': 8000, 'prompt_tokens': 7200000, 'completion_tokens': 1600000},
+        'admission_stats': {'active': 3, 'queue_depth': 0, 'admitted': 8000, 'queued': 120,
+                            'rejected': {'rate_limited': 4, 'queue_full': 0, 'wait_exceeded': 2, 'queue_timeout': 0}},
+        'latency_stats': {
+            stage: {'count': 8000, 'p50_ms': rng.uniform(1, 900), 'p95_ms': rng.uniform(10, 2000),
+                    'p99_ms': rng.uniform(20, 4000), 'mean_ms': rng.uniform(1, 1000)}
+            for stage in stages
+        }
+    }
+
+
+def build_outline(sections: int = 100, seed: int = 42) -> dict:
+    """マニュアル目次相当の合成データ"""
+    rng = random.Random(seed)
+    outline = [
+        {'title': f"操作マニュアル 第{i // 5 + 1}章 {rng.choice(['申請', '承認', '設定', '集計'])}の手順",
+         'page': i + 1, 'file_path': 'data/manuals/operation_manual.pdf'}
+        for i in range(sections)
+    ]
+    return {'sections': outline, 'total': len(outline)}
+
+
+def build_encoders() -> Dict[str, Callable[[bytes], bytes]]:
+    """比較する圧縮方式"""
+    encoders = {
+        'gzip (level 1)': lambda body: gzip.compress(body, compresslevel=1, mtime=0),
+        'gzip (level 6, 既定)': lambda body: gzip.compress(body, compresslevel=6, mtime=0),
+        'gzip (level 9)': lambda body: gzip.compress(body, compresslevel=9, mtime=0)
+    }
+    if brotli is not None:
+        encoders['br (quality 4, 既定)'] = lambda body: brotli.compress(body, quality=4)
+        encoders['br (quality 11)'] = lambda body: brotli.compress(body, quality=11)
+    return encoders
+
+
+def measure(func: Callable[[], object], number: int, repeat: int) -> float:
+    """1回あたりの最良の処理時間（マイクロ秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return best / number * 1e6
+
+
+def create_bench_app(payloads: Dict[str, bytes]) -> FastAPI:
+    """圧縮ミドルウェアとETagを適用したアプリ"""
+    bench_app = FastAPI()
+    bench_app.add_middleware(CompressionMiddleware)
+    outline = build_outline()
+    
+    @bench_app.get("/batch")
+    async def batch():
+        return Response(payloads['/batch-ask'], media_type="application/json")
+    
+    @bench_app.get("/outline")
+    async def get_outline(request: Request):
+        etag = make_etag("manual_outline", "support_bot__v20240101120000", 12)
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+        return cacheable_response(outline, etag)
+    
+    return bench_app
+
+
+async def call_endpoint(
+    bench_app: FastAPI,
+    path: str,
+    headers: List[Tuple[bytes, bytes]]
+) -> Tuple[int, Dict[str, str], int]:
+    """ASGIアプリを直接呼び出し、(ステータス, ヘッダー, 本文のバイト数) を返す"""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+        'query_string': b'', 'headers': headers, 'client': ('127.0.0.1', 0), 'server': ('127.0.0.1', 80)
+    }
+    result = {'status': 0, 'headers': {}, 'size': 0}
+    
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+    
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            result['status'] = message['status']
+            result['headers'] = {key.decode(): value.decode() for key, value in message['headers']}
+        elif message['type'] == 'http.response.body':
+            result['size'] += len(message.get('body', b''))
+    
+    await bench_app(scope, receive, send)
+    return result['status'], result['headers'], result['size']
+
+
+def main():
+    """メイン関数"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="レスポンス圧縮のベンチマーク")
+    parser.add_argument('--responses', type=int, default=10, help='/batch-ask の回答数')
+    parser.add_argument('--sources', type=int, default=5, help='1回答あたりの検索結果数')
+    parser.add_argument('--number', type=int, default=100, help='1回の計測での実行回数')
+    parser.add_argument('--repeat', type=int, default=3, help='計測の繰り返し回数')
+    
+    args = parser.parse_args()
+    
+    payloads = {
+        '/batch-ask': dumps(build_responses(args.responses, args.sources, construct=True)),
+        '/stats': dumps(build_stats()),
+        '/manual/outline': dumps(build_outline())
+    }
+    encoders = build_encoders()
+    if brotli is None:
+        print("brotli が未インストールのため gzip のみ計測します (pip install brotli)")
+    
+    for name, body in payloads.items():
+        print(f"\n=== {name} ({len(body):,}バイト)")
+        print("=" * 72)
+        for encoder_name, encoder in encoders.items():
+            compressed = encoder(body)
+            elapsed = measure(lambda: encoder(body), args.number, args.repeat)
+            saved = len(body) - len(compressed)
+            print(
+                f"{encoder_name:<22}: {len(compressed):8,}バイト "
+                f"(削減 {saved:8,}バイト / {saved / len(body):5.1%}, {elapsed:8.1f}µs)"
+            )
+    
+    # ミドルウェアを通した転送量
+    bench_app = create_bench_app(payloads)
+    loop = asyncio.new_event_loop()
+    accept = "br, gzip" if brotli is not None else "gzip"
+    
+    print(f"\n=== ミドルウェア経由の転送量 (Accept-Encoding: {accept})")
+    print("=" * 72)
+    identity = loop.run_until_complete(call_endpoint(bench_app, "/batch", []))
+    encoded = loop.run_until_complete(call_endpoint(bench_app, "/batch", [(b"accept-encoding", accept.encode())]))
+    print(f"/batch-ask 相当 : 圧縮なし {identity[2]:,}バイト -> "
+          f"{encoded[1].get('content-encoding', 'identity')} {encoded[2]:,}バイト")
+    
+    status, headers, size = loop.run_until_complete(
+        call_endpoint(bench_app, "/outline", [(b"accept-encoding", accept.encode())])
+    )
+    revalidated = loop.run_until_complete(call_endpoint(bench_app, "/outline", [
+        (b"accept-encoding", accept.encode()), (b"if-none-match", headers['etag'].encode())
+    ]))
+    print(f"目次 (初回)     : {status} {size:,}バイト (ETag: {headers['etag']})")
+    print(f"目次 (再検証)   : {revalidated[0]} {revalidated[2]:,}バイト")
+    
+    loop.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+FAQ CSV読み込みのベンチマーク
+従来の iterrows + FAQItem 方式と列指向の読み込みを比較
+"""
+
+import random
+import sys
+import tempfile
+import time
+import pandas as pd
+from pathlib import Path
+from typing import Any, Dict, List
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.models import FAQItem
+from scripts.create_index import iter_faq_chunks
+
+
+def generate_faq_csv(path: Path, rows: int, seed: int = 42):
+    """合成FAQのCSVファイルを生成"""
+    rng = random.Random(seed)
+    subjects = ['勤怠管理システム', '経費精算', '有給申請', '社内WiFi', 'VPN', '会議室予約', '人事評価']
+    actions = ['にログインできません', 'の締め切りはいつですか？', 'はどこから行いますか？', 'の設定方法を教えてください']
+    categories = ['人事', 'IT', '総務', '経理']
+    
+    records = []
+    for i in range(rows):
+        subject = rng.choice(subjects)
+        records.append({
+            'question': f"{subject}{rng.choice(actions)} (#{i})",
+            'answer': f"{subject}については担当部署のポータルを参照してください。問い合わせ番号: {i}",
+            'category': rng.choice(categories),
+            'tags': f"{subject}|{rng.choice(categories)}"
+        })
+    
+    pd.DataFrame(records).to_csv(path, index=False, encoding='utf-8')
+
+
+def load_legacy(csv_path: Path) -> List[Dict[str, Any]]:
+    """従来方式: iterrows で1行ずつ FAQItem を生成"""
+    df = pd.read_csv(csv_path, encoding='utf-8')
+    
+    documents = []
+    for index, row in df.iterrows():
+        faq_item = FAQItem(
+            question=str(row['question']),
+            answer=str(row['answer'])
+        )
+        content = f"質問: {faq_item.question}\n回答: {faq_item.answer}"
+        documents.append({
+            'id': f"faq_{index}",
+            'content': content,
+            'metadata': {
+                'source': 'FAQ',
+                'question': faq_item.question,
+                'answer': faq_item.answer,
+                'type': 'faq',
+                'index': index
+            }
+        })
+    return documents
+
+
+def load_columnar(csv_path: Path) -> List[Dict[str, Any]]:
+    """列指向方式: チャンク単位で一括変換"""
+    documents = []
+    for chunk in iter_faq_chunks(csv_path):
+        documents.extend(chunk)
+    return documents
+
+
+def measure(func, csv_path: Path, repeat: int) -> tuple:
+    """最良の実行時間と件数を計測"""
+    best = float('inf')
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = len(func(csv_path))
+        best = min(best, time.perf_counter() - start)
+    return best, count
+
+
+def main():
+    """メイン関数"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="FAQ CSV読み込みのベンチマーク")
+    parser.add_argument('--rows', type=int, default=100_000, help='合成FAQの行数')
+    parser.add_argument('--repeat', type=int, default=3, help='計測の繰り返し回数')
+    
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = Path(tmp_dir) / "faq_bench.csv"
+        generate_faq_csv(csv_path, args.rows)
+        
+        legacy_time, legacy_count = measure(load_legacy, csv_path, args.repeat)
+        columnar_time, columnar_count = measure(load_columnar, csv_path, args.repeat)
+    
+    print(f"\n=== FAQ読み込みベンチマーク ({args.rows:,}行, {args.repeat}回中の最良値)")
+    print("=" * 50)
+    print(f"iterrows + FAQItem : {legacy_time:8.3f}秒 ({legacy_count:,}件)")
+    print(f"列指向 + チャンク  : {columnar_time:8.3f}秒 ({columnar_count:,}件)")
+    print(f"高速化率           : {legacy_time / columnar_time:8.1f}倍")
+    
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+プロンプト組み立てのベンチマーク
+str.format による毎回の解析と事前分割テンプレートを比較し、
+リクエスト間で不変なプレフィックスの長さを報告
+"""
+
+import os
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.models import SearchResult
+from src.prompts import PromptTemplates
+from src.tokenizer import get_token_counter
+
+# 従来の配置（質問が検索結果より前にある）のFAQテンプレート
+LEGACY_FAQ_ANSWER_TEMPLATE = """
+以下の質問に対して、検索結果の情報を基に回答してください。
+
+ユーザーの質問：
+{question}
+
+関連する検索結果：
+{search_results}
+
+回答の要件：
+1. 質問に直接答える内容を最初に書いてください
+2. 上記の検索結果がある場合はそれらの情報を参考にしてください
+3. 検索結果にない情報は推測せず、「情報が見つかりません」と伝えてください
+4. 機密性の高い内容については適切に配慮してください
+
+回答をお願いします：
+"""
+
+
+def generate_requests(count: int, seed: int = 42) -> List[tuple]:
+    """合成の (質問, 検索結果テキスト) を生成"""
+    rng = random.Random(seed)
+    subjects = ['勤怠管理システム', '経費精算', '有給申請', '社内WiFi', 'VPN', '会議室予約']
+    actions = ['にログインできません', 'の締め切りはいつですか？', 'の設定方法を教えてください']
+    
+    requests = []
+    for i in range(count):
+        subject = rng.choice(subjects)
+        results = [
+            SearchResult(
+                content=f"{subject}の手順 {j}: " + "画面右上のメニューから設定を開きます。" * rng.randint(5, 30),
+                source=f"マニュアル p.{rng.randint(1, 200)}",
+                score=rng.uniform(0.7, 0.95),
+                metadata={'type': 'manual'}
+            )
+            for j in range(rng.randint(2, 5))
+        ]
+        question = f"{subject}{rng.choice(actions)} (#{i})"
+        requests.append((question, PromptTemplates.format_search_results(results)))
+    return requests
+
+
+def measure(build: Callable[[str, str], str], requests: List[tuple], repeat: int) -> float:
+    """1リクエストあたりの最良の組み立て時間（マイクロ秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for question, search_results in requests:
+            build(question, search_results)
+        best = min(best, time.perf_counter() - start)
+    return best / len(requests) * 1e6
+
+
+def common_prefix_length(build: Callable[[str, str], str], requests: List[tuple]) -> int:
+    """実際に生成したプロンプト（システムロール込み）の共通プレフィックス長"""
+    prompts = [PromptTemplates.SYSTEM_ROLE + build(question, results) for question, results in requests]
+    return len(os.path.commonprefix(prompts))
+
+
+def main():
+    """メイン関数"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="プロンプト組み立てのベンチマーク")
+    parser.add_argument('--requests', type=int, default=2000, help='合成リクエスト数')
+    parser.add_argument('--repeat', type=int, default=5, help='計測の繰り返し回数')
+    
+    args = parser.parse_args()
+    
+    requests = generate_requests(args.requests)
+    counter = get_token_counter()
+    
+    builders = {
+        '従来の配置 + str.format': lambda q, r: LEGACY_FAQ_ANSWER_TEMPLATE.format(question=q, search_results=r),
+        '新配置 + str.format': lambda q, r: PromptTemplates.FAQ_ANSWER_TEMPLATE.format(question=q, search_results=r),
+        '新配置 + 事前分割': lambda q, r: PromptTemplates.FAQ_ANSWER.render(question=q, search_results=r)
+    }
+    
+    print(f"\n=== プロンプト組み立てベンチマーク ({args.requests:,}件, {args.repeat}回中の最良値)")
+    print("=" * 60)
+    for name, build in builders.items():
+        per_request = measure(build, requests, args.repeat)
+        prefix_chars = common_prefix_length(build, requests)
+        print(f"{name:<24}: {per_request:7.2f}µs/件, 共通プレフィックス {prefix_chars:,}文字")
+    
+    sample_prompt = PromptTemplates.SYSTEM_ROLE + PromptTemplates.FAQ_ANSWER.render(
+        question=requests[0][0],
+        search_results=requests[0][1]
+    )
+    total_tokens = counter.count(sample_prompt)
+    
+    tokenizer = 'tiktoken' if counter.is_exact else '概算'
+    print(f"\n=== 不変プレフィックス（システムロール + 最初の差し込み項目まで, トークナイザー: {tokenizer}）")
+    print("=" * 60)
+    for name, lengths in PromptTemplates.stable_prefix_report().items():
+        print(f"{name:<14}: {lengths['prefix_chars']:6,}文字, {lengths['prefix_tokens']:6,}トークン")
+    
+    faq_prefix_tokens = PromptTemplates.stable_prefix_report()['FAQ_ANSWER']['prefix_tokens']
+    print(f"\nFAQプロンプト例: 全体 {total_tokens:,}トークン中 {faq_prefix_tokens:,}トークンが不変 "
+          f"({faq_prefix_tokens / total_tokens:.0%})")
+    
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""
+検索結果の内部表現のベンチマーク
+全候補を SearchResult（Pydanticモデル）に変換してから融合する従来の経路と、
+軽量な SearchHit のまま融合して最終結果だけを変換する経路の
+処理時間とメモリ確保量を比較
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.models import SearchResult
+from tool import reciprocal_rank_fusion
+from tool.search_xyz_manual import ManualSearchEngine
+from tool.search_xyz_qa import FAQSearchEngine
+
+RRF_K = 60
+
+# ハイブリッドモードのリトリーバー（密ベクトルの結果のみ埋め込みを持つ）
+RETRIEVERS = ('faq_dense', 'faq_lexical', 'manual_dense', 'manual_lexical')
+
+
+def generate_raw_results(
+    rng: random.Random,
+    doc_type: str,
+    count: int,
+    dimension: int,
+    with_embeddings: bool
+) -> Dict[str, Any]:
+    """ChromaDBのquery結果と同じ形式の合成データを生成"""
+    ids, documents, metadatas, distances = [], [], [], []
+    for _ in range(count):
+        number = rng.randint(0, 499)
+        ids.append(f"{doc_type}_{number}")
+        if doc_type == 'faq':
+            question = f"手順{number}について教えてください"
+            answer = "画面右上のメニューから設定を開き、保存を押します。" * rng.randint(2, 8)
+            documents.append(f"質問: {question}\n回答: {answer}")
+            metadatas.append({'type': 'faq', 'question': question, 'answer': answer})
+        else:
+            title = f"操作マニュアル 第{number % 20}章"
+            documents.append(f"タイトル: {title}\n内容: " + "申請画面で必要事項を入力して送信します。" * rng.randint(4, 16))
+            metadatas.append({'type': 'manual', 'title': title, 'page': number, 'file_path': 'manual.pdf'})
+        distances.append(rng.uniform(0.05, 0.5))
+    
+    embeddings = None
+    if with_embeddings:
+        embeddings = [[[rng.random() for _ in range(dimension)] for _ in range(count)]]
+    
+    return {
+        'ids': [ids],
+        'documents': [documents],
+        'metadatas': [metadatas],
+        'distances': [sorted(distances)],
+        'embeddings': embeddings
+    }
+
+
+def generate_queries(count: int, candidates: int, dimension: int, seed: int = 42) -> List[Dict[str, Dict[str, Any]]]:
+    """合成のクエリごとのリトリーバー別の検索結果を生成"""
+    rng = random.Random(seed)
+    return [
+        {
+            name: generate_raw_results(rng, name.split('_')[0], candidates, dimension, name.endswith('_dense'))
+            for name in RETRIEVERS
+        }
+        for _ in range(count)
+    ]
+
+
+def legacy_process(engine, raw_results: Dict[str, Any], min_score: float) -> List[SearchResult]:
+    """従来の経路: 全候補を SearchResult に変換"""
+    results = []
+    documents = raw_results['documents'][0]
+    embeddings = raw_results['embeddings'][0] if raw_results['embeddings'] is not None else [None] * len(documents)
+    for doc_id, doc, metadata, distance, embedding in zip(
+        raw_results['ids'][0], documents, raw_results['metadatas'][0], raw_results['distances'][0], embeddings
+    ):
+        score = max(0, 1 - distance)
+        if score < min_score:
+            continue
+        if metadata['type'] == 'faq':
+            result = SearchResult(
+                content=engine._format_faq_content(metadata),
+                source=f"FAQ: {metadata.get('question', 'Unknown')}",
+                score=score,
+                metadata={
+                    'type': 'faq',
+                    'question': metadata.get('question', ''),
+                    'answer': metadata.get('answer', ''),
+                    'doc_id': doc_id,
+                    'original_distance': distance
+                }
+            )
+        else:
+            result = SearchResult(
+                content=engine._format_manual_content(metadata, doc),
+                source=engine._format_source_info(metadata),
+                score=score,
+                metadata={
+                    'type': 'manual',
+                    'title': metadata.get('title', ''),
+                    'page': metadata.get('page', 0),
+                    'file_path': metadata.get('file_path', ''),
+                    'doc_id': doc_id,
+                    'original_distance': distance
+                }
+            )
+        result.set_embedding(embedding)
+        results.append(result)
+    results.sort(key=lambda x: x.score, reverse=True)
+    return results
+
+
+def legacy_rrf(rankings: List[Tuple[List[SearchResult], float]], k: int = RRF_K) -> List[SearchResult]:
+    """従来の経路: SearchResult を対象とするRRF"""
+    fused: Dict[str, SearchResult] = {}
+    fused_scores: Dict[str, float] = {}
+    for results, weight in rankings:
+        for rank, result in enumerate(results, 1):
+            key = result.metadata.get('doc_id') or f"{result.source}\n{result.content}"
+            fused_scores[key] = fused_scores.get(key, 0.0) + weight / (k + rank)
+            existing = fused.get(key)
+            if existing is None or result.score > existing.score:
+                fused[key] = result
+    ordered = sorted(fused_scores, key=fused_scores.get, reverse=True)
+    for key in ordered:
+        fused[key].metadata['rrf_score'] = fused_scores[key]
+    return [fused[key] for key in ordered]
+
+
+def build_pipelines(engines: Dict[str, Any], min_score: float, top_k: int) -> Dict[str, Callable]:
+    """1クエリ分の検索結果の処理（変換・融合・上位の選択）"""
+    
+    def legacy(raw_by_retriever: Dict[str, Dict[str, Any]]) -> List[SearchResult]:
+        rankings = [
+            (legacy_process(engines[name.split('_')[0]], raw, min_score), 1.0)
+            for name, raw in raw_by_retriever.items()
+        ]
+        return legacy_rrf(rankings)[:top_k]
+    
+    def hits(raw_by_retriever: Dict[str, Dict[str, Any]]) -> List[SearchResult]:
+        rankings = [
+            (engines[name.split('_')[0]]._process_search_hits(raw, min_score), 1.0)
+            for name, raw in raw_by_retriever.items()
+        ]
+        final_hits = reciprocal_rank_fusion(rankings, k=RRF_K)[:top_k]
+        return [engines[hit.doc_type].to_search_result(hit) for hit in final_hits]
+    
+    return {'従来 (全候補を SearchResult に変換)': legacy, 'SearchHit (最終結果のみ変換)': hits}
+
+
+def measure_time(pipeline: Callable, queries: List[Dict[str, Dict[str, Any]]]) -> float:
+    """全クエリの処理時間（秒）"""
+    start = time.perf_counter()
+    for raw_by_retriever in queries:
+        pipeline(raw_by_retriever)
+    return time.perf_counter() - start
+
+
+def measure_memory(pipeline: Callable, queries: List[Dict[str, Dict[str, Any]]]) -> float:
+    """1クエリあたりのピークのメモリ確保量の平均（バイト）"""
+    tracemalloc.start()
+    total_peak = 0
+    for raw_by_retriever in queries:
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        pipeline(raw_by_retriever)
+        _, peak = tracemalloc.get_traced_memory()
+        total_peak += peak - base
+    tracemalloc.stop()
+    
+    return total_peak / len(queries)
+
+
+def main():
+    """メイン関数"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="検索結果の内部表現のベンチマーク")
+    parser.add_argument('--queries', type=int, default=10000, help='クエリ数')
+    parser.add_argument('--distinct', type=int, default=200, help='生成する検索結果の種類数（クエリ間で使い回す）')
+    parser.add_argument('--candidates', type=int, default=10, help='リトリーバーあたりの候補数')
+    parser.add_argument('--top-k', type=int, default=5, help='最終結果の件数')
+    parser.add_argument('--dimension', type=int, default=384, help='埋め込みの次元数')
+    parser.add_argument('--min-score', type=float, default=0.5, help='最低スコア')
+    
+    args = parser.parse_args()
+    
+    distinct = generate_queries(args.distinct, args.candidates, args.dimension)
+    queries = [distinct[i % len(distinct)] for i in range(args.queries)]
+    
+    # 変換処理（整形メソッド）だけを使うため、ChromaDBには接続しない
+    engines = {
+        'faq': object.__new__(FAQSearchEngine),
+        'manual': object.__new__(ManualSearchEngine)
+    }
+    pipelines = build_pipelines(engines, args.min_score, args.top_k)
+    
+    # 両経路の最終結果が同じ内容であることを確認
+    for raw_by_retriever in distinct:
+        outputs = [pipeline(raw_by_retriever) for pipeline in pipelines.values()]
+        dumped = [[result.model_dump() for result in output] for output in outputs]
+        if dumped[0] != dumped[1]:
+            print("警告: 2つの経路の最終結果が一致しません")
+            break
+    
+    candidates = sum(
+        len(engines[name.split('_')[0]]._process_search_hits(raw, args.min_score))
+        for raw_by_retriever in queries for name, raw in raw_by_retriever.items()
+    )
+    print(f"\n=== {args.queries:,}クエリ（リトリーバー {len(RETRIEVERS)}個 x 候補 {args.candidates}件, 上位 {args.top_k}件）")
+    print(
+        f"SearchResult の生成数: 従来 {candidates / args.queries:.1f}件/クエリ "
+        f"(最低スコア以上の全候補) -> {args.top_k}件/クエリ"
+    )
+    print("=" * 72)
+    
+    baseline = None
+    for name, pipeline in pipelines.items():
+        elapsed = measure_time(pipeline, queries)
+        peak = measure_memory(pipeline, queries)
+        baseline = baseline or elapsed
+        print(f"{name}")
+        print(f"  処理時間      : {elapsed:7.2f}秒 ({elapsed / args.queries * 1e6:7.1f}µs/クエリ, x{baseline / elapsed:4.2f})")
+        print(f"  ピーク確保量  : {peak / 1024:7.1f}KiB/クエリ")
+    
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
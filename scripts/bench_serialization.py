@@ -0,0 +1,185 @@
+"""
+レスポンスのシリアライズのベンチマーク
+response_model を経由する経路とorjsonの経路で /batch-ask 相当のレスポンスの
+処理量を比較し、検証なしの生成（model_construct）の効果も計測する
+"""
+
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+import fastapi
+from fastapi import FastAPI
+from pydantic import TypeAdapter
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.models import AnswerResponse, SearchResult
+from src.responses import ORJSONResponse, dumps
+
+
+def build_sources(rng: random.Random, count: int, construct: bool) -> List[SearchResult]:
+    """合成の検索結果を生成（construct=True は検証なしで生成）"""
+    factory = SearchResult.model_construct if construct else SearchResult
+    sources = []
+    for i in range(count):
+        sources.append(factory(
+            content=f"Q: 手順{i}について\nA: " + "画面右上のメニューから設定を開き、保存を押します。" * rng.randint(3, 12),
+            source=f"FAQ: 手順{i}について",
+            score=rng.uniform(0.7, 0.95),
+            metadata={
+                'type': 'faq',
+                'question': f"手順{i}について",
+                'answer': "画面右上のメニューから設定を開きます。",
+                'doc_id': f"faq_{rng.randint(0, 99999)}",
+                'original_distance': rng.uniform(0.05, 0.3)
+            }
+        ))
+    return sources
+
+
+def build_responses(count: int, sources_per_response: int, construct: bool, seed: int = 42) -> List[AnswerResponse]:
+    """合成の回答レスポンスを生成"""
+    rng = random.Random(seed)
+    factory = AnswerResponse.model_construct if construct else AnswerResponse
+    return [
+        factory(
+            answer="勤怠管理システムのパスワードは、ログイン画面の「パスワードを忘れた方」から再設定できます。" * 3,
+            confidence=rng.uniform(0.5, 0.9),
+            sources=build_sources(rng, sources_per_response, construct),
+            processing_time=rng.uniform(0.5, 3.0),
+            metadata={'tokens': {'prompt_tokens': 900, 'context_tokens': 600, 'results_truncated': 0}},
+            timings={'search': 120.5, 'prompt': 1.2, 'llm': 1450.3, 'total': 1580.1}
+        )
+        for _ in range(count)
+    ]
+
+
+def response_model_path(adapter: TypeAdapter, responses: List[AnswerResponse]) -> bytes:
+    """
+    response_model を経由する経路（FastAPI 0.116 など）
+    
+    戻り値を response_model で検証してからJSON互換の値に変換し、
+    JSONResponse が json.dumps でシリアライズする。
+    """
+    value = adapter.validate_python(responses)
+    content = adapter.dump_python(value, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def create_bench_app(responses: List[AnswerResponse]) -> FastAPI:
+    """同じレスポンスを2つの経路で返すアプリ"""
+    bench_app = FastAPI()
+    
+    @bench_app.get("/standard", response_model=List[AnswerResponse])
+    async def standard():
+        return responses
+    
+    @bench_app.get("/orjson", response_model=List[AnswerResponse], response_class=ORJSONResponse)
+    async def fast():
+        return ORJSONResponse(responses)
+    
+    return bench_app
+
+
+async def call_endpoint(bench_app: FastAPI, path: str) -> bytes:
+    """ASGIアプリを直接呼び出してレスポンス本文を取得（ネットワークを介さない）"""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+        'query_string': b'', 'headers': [], 'client': ('127.0.0.1', 0), 'server': ('127.0.0.1', 80)
+    }
+    body = []
+    
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+    
+    async def send(message):
+        if message['type'] == 'http.response.body':
+            body.append(message.get('body', b''))
+    
+    await bench_app(scope, receive, send)
+    return b"".join(body)
+
+
+def measure(func: Callable[[], object], number: int, repeat: int) -> float:
+    """1回あたりの最良の処理時間（マイクロ秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return best / number * 1e6
+
+
+def main():
+    """メイン関数"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="レスポンスのシリアライズのベンチマーク")
+    parser.add_argument('--responses', type=int, default=10, help='1レスポンスに含める回答数（/batch-ask の上限は10）')
+    parser.add_argument('--sources', type=int, default=5, help='1回答あたりの検索結果数')
+    parser.add_argument('--number', type=int, default=200, help='1回の計測での実行回数')
+    parser.add_argument('--repeat', type=int, default=5, help='計測の繰り返し回数')
+    
+    args = parser.parse_args()
+    
+    responses = build_responses(args.responses, args.sources, construct=True)
+    bench_app = create_bench_app(responses)
+    loop = asyncio.new_event_loop()
+    
+    # 両経路の出力が同じ内容であることを確認
+    standard_body = loop.run_until_complete(call_endpoint(bench_app, "/standard"))
+    fast_body = loop.run_until_complete(call_endpoint(bench_app, "/orjson"))
+    if json.loads(standard_body) != json.loads(fast_body):
+        print("警告: 2つの経路の出力が一致しません")
+    
+    print(f"\n=== 生成（検索結果 {args.sources}件 x 回答 {args.responses}件, {args.repeat}回中の最良値）")
+    print("=" * 72)
+    construction = {
+        '検証あり (コンストラクター)': lambda: build_responses(args.responses, args.sources, construct=False),
+        '検証なし (model_construct)': lambda: build_responses(args.responses, args.sources, construct=True)
+    }
+    baseline = None
+    for name, func in construction.items():
+        elapsed = measure(func, args.number, args.repeat)
+        baseline = baseline or elapsed
+        print(f"{name:<32}: {elapsed:9.1f}µs/レスポンス (x{baseline / elapsed:4.2f})")
+    
+    adapter = TypeAdapter(List[AnswerResponse])
+    
+    print(f"\n=== シリアライズ（{len(fast_body):,}バイト/レスポンス）")
+    print("=" * 72)
+    serializers = {
+        'response_model 経由 + json.dumps': lambda: response_model_path(adapter, responses),
+        'orjson (src.responses.dumps)': lambda: dumps(responses)
+    }
+    results = {name: measure(func, args.number, args.repeat) for name, func in serializers.items()}
+    for name, elapsed in results.items():
+        print(f"{name:<32}: {elapsed:9.1f}µs/レスポンス ({1e6 / elapsed:8.0f}件/秒)")
+    speedup = results['response_model 経由 + json.dumps'] / results['orjson (src.responses.dumps)']
+    print(f"シリアライズの処理量: x{speedup:.2f}")
+    
+    # インストール済みのFastAPIでのエンドポイント全体（ルーティングを含む）
+    print(f"\n=== エンドポイント（FastAPI {fastapi.__version__}）")
+    print("=" * 72)
+    endpoints = {
+        '標準 (response_model)': lambda: loop.run_until_complete(call_endpoint(bench_app, "/standard")),
+        'ORJSONResponse': lambda: loop.run_until_complete(call_endpoint(bench_app, "/orjson"))
+    }
+    for name, func in endpoints.items():
+        elapsed = measure(func, args.number, args.repeat)
+        print(f"{name:<32}: {elapsed:9.1f}µs/レスポンス ({1e6 / elapsed:8.0f}件/秒)")
+    
+    loop.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
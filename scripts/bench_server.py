@@ -0,0 +1,181 @@
+"""
+APIサーバーのスループット計測
+単一プロセス（従来の起動方法）と本番用マルチワーカーで /ask の処理量を比較
+"""
+
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import requests
+
+# プロジェクトルートをパスに追加
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+DEFAULT_APP = "src.api:app"
+
+# サーバーを起動する子プロセスのコード（workers=0 は単一プロセス）
+SERVER_CODE = """
+import importlib, sys
+import uvicorn
+from src.server import PreforkServer
+
+app_path, host, port, workers = sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4])
+module_name, attr = app_path.split(":")
+app = getattr(importlib.import_module(module_name), attr)
+
+if workers == 0:
+    uvicorn.run(app, host=host, port=port, log_level="warning")
+else:
+    preload = None
+    if app_path == "src.api:app":
+        from src.api import preload_shared_resources
+        preload = preload_shared_resources
+    sys.exit(PreforkServer(app, host=host, port=port, workers=workers, preload=preload).run())
+"""
+
+QUESTIONS = [
+    "勤怠管理システムにログインできません",
+    "有給申請の締め切りはいつですか？",
+    "経費精算の方法を教えてください",
+    "VPNに接続できない場合はどうすればよいですか",
+    "会議室の予約方法を教えてください",
+    "パスワードを忘れてしまいました"
+]
+
+
+def start_server(app_path: str, host: str, port: int, workers: int, timeout: float) -> subprocess.Popen:
+    """サーバーを起動し、応答するまで待つ"""
+    process = subprocess.Popen(
+        [sys.executable, "-c", SERVER_CODE, app_path, host, str(port), str(workers)],
+        cwd=PROJECT_ROOT,
+        env={**os.environ, "LOG_LEVEL": "WARNING"}
+    )
+    
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"サーバーが起動しませんでした (終了コード: {process.returncode})")
+        try:
+            requests.get(f"http://{host}:{port}/", timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.5)
+    
+    stop_server(process)
+    raise RuntimeError("サーバーの起動がタイムアウトしました")
+
+
+def stop_server(process: subprocess.Popen, timeout: float = 60):
+    """サーバーに SIGTERM を送り、終了を待つ"""
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def run_load(url: str, path: str, concurrency: int, duration: float, warmup: float) -> Dict[str, float]:
+    """一定時間、並行してリクエストを送り続ける"""
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    measure_from = time.monotonic() + warmup
+    stop_at = measure_from + duration
+    
+    def worker(worker_id: int):
+        nonlocal errors
+        session = requests.Session()
+        count = 0
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                return
+            question = QUESTIONS[(worker_id + count) % len(QUESTIONS)]
+            count += 1
+            start = time.perf_counter()
+            try:
+                response = session.post(f"{url}{path}", data=json.dumps({"question": question}),
+                                        headers={"Content-Type": "application/json"}, timeout=120)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            
+            # ウォームアップ中に送ったリクエストは集計しない
+            if now < measure_from:
+                continue
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for worker_id in range(concurrency):
+            executor.submit(worker, worker_id)
+    
+    values = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / duration,
+        'p50_ms': float(np.percentile(values, 50)),
+        'p95_ms': float(np.percentile(values, 95)),
+        'p99_ms': float(np.percentile(values, 99))
+    }
+
+
+def main():
+    """メイン関数"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="APIサーバーのスループット計測")
+    parser.add_argument('--app', default=DEFAULT_APP, help='計測するアプリ (module:attr)')
+    parser.add_argument('--path', default='/ask', help='リクエスト先のパス')
+    parser.add_argument('--host', default='127.0.0.1', help='待ち受けホスト')
+    parser.add_argument('--port', type=int, default=18080, help='待ち受けポート')
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 2, 4],
+                        help='比較するワーカー数（0 は単一プロセスの uvicorn）')
+    parser.add_argument('--concurrency', type=int, default=16, help='並行クライアント数')
+    parser.add_argument('--duration', type=float, default=30.0, help='計測時間（秒）')
+    parser.add_argument('--warmup', type=float, default=5.0, help='計測前のウォームアップ（秒）')
+    parser.add_argument('--startup-timeout', type=float, default=300.0, help='サーバー起動の待ち時間（秒）')
+    
+    args = parser.parse_args()
+    url = f"http://{args.host}:{args.port}"
+    
+    print(f"\n=== サーバースループット計測 ({args.app} {args.path}, 並行数 {args.concurrency}, {args.duration:.0f}秒)")
+    print("=" * 72)
+    
+    baseline = None
+    for workers in args.workers:
+        label = "単一プロセス" if workers == 0 else f"プリフォーク {workers}ワーカー"
+        process = start_server(args.app, args.host, args.port, workers, args.startup_timeout)
+        try:
+            result = run_load(url, args.path, args.concurrency, args.duration, args.warmup)
+        finally:
+            stop_server(process)
+        
+        baseline = baseline or result['rps']
+        print(
+            f"{label:<20}: {result['rps']:8.1f} req/s (x{result['rps'] / baseline:4.2f}), "
+            f"p50 {result['p50_ms']:7.1f}ms, p95 {result['p95_ms']:7.1f}ms, p99 {result['p99_ms']:7.1f}ms, "
+            f"エラー {result['errors']}件"
+        )
+    
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
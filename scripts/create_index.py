@@ -3,26 +3,143 @@ PDF/CSVを処理してベクトル埋め込みを生成
 埋め込みをChromaDBに格納するインデックス作成スクリプト
 """
 
-import asyncio
+import hashlib
+import queue
 import sys
+import tempfile
+import threading
+import time
+import numpy as np
 import pandas as pd
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Set
 import chromadb
 from chromadb.config import Settings
 from sentence_transformers import SentenceTransformer
-import uuid
 
 # プロジェクトルートをパスに追加
 sys.path.append(str(Path(__file__).parent.parent))
 
 from src.configs import config
+from src.compression import encode_sentence_embeddings, split_compressible
 from src.custom_logger import get_module_logger
-from src.models import FAQItem, ManualSection
+from src.index_registry import get_index_registry
+from src.models import ManualSection
+from scripts.faq_dedup import FAQDeduplicator, apply_alternates, cluster_report, write_dedup_report
+from tool.faq_exact_match import FAQExactIndexBuilder, exact_index_path
+from tool.search_xyz_lexical import LexicalIndexBuilder, lexical_index_path
 
 logger = get_module_logger("create_index")
 
 
+def _document_id(prefix: str, *parts: str) -> str:
+    """内容から決定的なドキュメントIDを生成（内容が変わればIDも変わる）"""
+    digest = hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()[:16]
+    return f"{prefix}_{digest}"
+
+
+# FAQ CSVの必須列（FAQItem の必須フィールドに対応）
+FAQ_REQUIRED_COLUMNS = ['question', 'answer']
+
+# tags 列の区切り文字（連続する区切りと前後の空白もまとめて1つのカンマに正規化）
+FAQ_TAG_SEPARATORS = r"\s*(?:[|;,、]\s*)+"
+
+
+def iter_faq_chunks(
+    csv_path: Path,
+    chunk_size: Optional[int] = None
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    FAQのCSVをチャンク単位で読み込み、列指向でドキュメントに変換
+    
+    行ごとに FAQItem を生成する代わりに、FAQItem の必須フィールド
+    （question/answer）の列があることを列単位で検証する。FAQItem 自体は
+    空文字を許すが、空欄（前後の空白を除いて空）の質問・回答を含む行は
+    検索の役に立たないため除外する（従来の行ごとの経路では空欄が
+    "nan" という文字列のまま索引されていた）。
+    任意列 category / tags があればメタデータに含める。
+    
+    Args:
+        csv_path: FAQのCSVファイル
+        chunk_size: 1チャンクあたりの行数
+    
+    Yields:
+        チャンク分のドキュメントのリスト
+    """
+    reader = pd.read_csv(
+        csv_path,
+        encoding='utf-8',
+        dtype=str,
+        keep_default_na=False,
+        chunksize=chunk_size or config.FAQ_CSV_CHUNK_SIZE
+    )
+    
+    file_path = str(csv_path)
+    seen_ids = set()
+    
+    for chunk in reader:
+        missing = [column for column in FAQ_REQUIRED_COLUMNS if column not in chunk.columns]
+        if missing:
+            raise ValueError(f"FAQファイルに必須列がありません: {missing}")
+        
+        # 空欄（空白のみを含む）の質問・回答を含む行を除外
+        questions = chunk['question'].str.strip()
+        answers = chunk['answer'].str.strip()
+        valid = (questions != "") & (answers != "")
+        invalid_count = int((~valid).sum())
+        if invalid_count:
+            logger.warning(f"質問または回答が空の行を{invalid_count}件スキップしました")
+        
+        questions = questions[valid]
+        answers = answers[valid]
+        
+        # ドキュメント本文を列演算で構築
+        contents = ("質問: " + questions + "\n回答: " + answers).tolist()
+        
+        categories = None
+        if 'category' in chunk.columns:
+            categories = chunk['category'][valid].str.strip().tolist()
+        
+        tags = None
+        if 'tags' in chunk.columns:
+            tags = (
+                chunk['tags'][valid]
+                .str.replace(FAQ_TAG_SEPARATORS, ",", regex=True)
+                .str.strip(", ")
+                .tolist()
+            )
+        
+        documents = []
+        rows = zip(questions.index.tolist(), questions.tolist(), answers.tolist(), contents)
+        for position, (index, question, answer, content) in enumerate(rows):
+            # 完全に同一の行は1件にまとめる
+            doc_id = _document_id("faq", content)
+            if doc_id in seen_ids:
+                continue
+            seen_ids.add(doc_id)
+            
+            metadata = {
+                'source': 'FAQ',
+                'question': question,
+                'answer': answer,
+                'type': 'faq',
+                'index': index,
+                'file_path': file_path
+            }
+            if categories is not None and categories[position]:
+                metadata['category'] = categories[position]
+            if tags is not None and tags[position]:
+                metadata['tags'] = tags[position]
+            
+            documents.append({
+                'id': doc_id,
+                'content': content,
+                'metadata': metadata
+            })
+        
+        yield documents
+
+
 class DocumentProcessor:
     """ドキュメント処理クラス"""
     
@@ -30,9 +147,17 @@ class DocumentProcessor:
         self.embedding_model = SentenceTransformer(config.EMBEDDING_MODEL)
         self.chroma_client = None
         self.collection = None
+        self.collection_name = None
+        self.validation_samples: List[tuple] = []
+        self.last_written = 0
     
-    def connect_to_chroma(self):
-        """ChromaDBに接続"""
+    def connect_to_chroma(self, collection_name: Optional[str] = None):
+        """
+        ChromaDBに接続
+        
+        Args:
+            collection_name: 書き込み先のコレクション名（省略時はエイリアスが指す現行コレクション）
+        """
         try:
             # ChromaDBクライアントを初期化
             self.chroma_client = chromadb.HttpClient(
@@ -41,70 +166,49 @@ class DocumentProcessor:
                 settings=Settings(allow_reset=True)
             )
             
+            self.collection_name = collection_name or get_index_registry().resolve_collection_name()
+            
             # コレクション取得または作成
             try:
                 self.collection = self.chroma_client.get_collection(
-                    name=config.CHROMA_COLLECTION_NAME
+                    name=self.collection_name
                 )
-                logger.info(f"既存のコレクション '{config.CHROMA_COLLECTION_NAME}' に接続しました")
+                logger.info(f"既存のコレクション '{self.collection_name}' に接続しました")
             except:
                 self.collection = self.chroma_client.create_collection(
-                    name=config.CHROMA_COLLECTION_NAME,
+                    name=self.collection_name,
                     metadata={"description": "Support bot knowledge base"}
                 )
-                logger.info(f"新しいコレクション '{config.CHROMA_COLLECTION_NAME}' を作成しました")
+                logger.info(f"新しいコレクション '{self.collection_name}' を作成しました")
                 
         except Exception as e:
             logger.error(f"ChromaDBへの接続に失敗しました: {e}")
             raise
     
-    def process_faq_csv(self, csv_path: Path) -> List[Dict[str, Any]]:
-        """FAQのCSVファイルを処理"""
+    def process_faq_csv(self, csv_path: Path) -> Iterator[Dict[str, Any]]:
+        """FAQのCSVファイルを処理（チャンク単位で順次生成）"""
         try:
             logger.info(f"FAQファイルを処理中: {csv_path}")
             
-            # CSVファイルを読み込み
-            df = pd.read_csv(csv_path, encoding='utf-8')
+            count = 0
+            for documents in iter_faq_chunks(csv_path):
+                count += len(documents)
+                yield from documents
             
-            documents = []
-            for index, row in df.iterrows():
-                # FAQ項目を作成
-                faq_item = FAQItem(
-                    question=str(row['question']),
-                    answer=str(row['answer'])
-                )
-                
-                # ドキュメント形式に変換
-                content = f"質問: {faq_item.question}\n回答: {faq_item.answer}"
-                
-                doc = {
-                    'id': f"faq_{index}_{uuid.uuid4().hex[:8]}",
-                    'content': content,
-                    'metadata': {
-                        'source': 'FAQ',
-                        'question': faq_item.question,
-                        'answer': faq_item.answer,
-                        'type': 'faq',
-                        'index': index
-                    }
-                }
-                documents.append(doc)
-            
-            logger.info(f"FAQ {len(documents)}件を処理しました")
-            return documents
+            logger.info(f"FAQ {count}件を処理しました")
             
         except Exception as e:
             logger.error(f"FAQファイルの処理に失敗しました: {e}")
             raise
     
-    def process_manual_pdf(self, pdf_path: Path) -> List[Dict[str, Any]]:
-        """PDFマニュアルを処理（サンプル実装）"""
+    def process_manual_pdf(self, pdf_path: Path) -> Iterator[Dict[str, Any]]:
+        """PDFマニュアルを処理（セクション単位で順次生成、サンプル実装）"""
         try:
             logger.info(f"PDFファイルを処理中: {pdf_path}")
             
             # 実際のPDF処理ライブラリが必要
             # ここではサンプルデータを使用
-            documents = []
+            count = 0
             
             sample_sections = [
                 {
@@ -120,9 +224,10 @@ class DocumentProcessor:
             ]
             
             for i, section in enumerate(sample_sections):
+                content = f"タイトル: {section['title']}\n内容: {section['content']}"
                 doc = {
-                    'id': f"manual_{i}_{uuid.uuid4().hex[:8]}",
-                    'content': f"タイトル: {section['title']}\n内容: {section['content']}",
+                    'id': _document_id("manual", str(pdf_path), str(i), content),
+                    'content': content,
                     'metadata': {
                         'source': f'Manual: {pdf_path.name}',
                         'title': section['title'],
@@ -131,109 +236,820 @@ class DocumentProcessor:
                         'file_path': str(pdf_path)
                     }
                 }
-                documents.append(doc)
+                count += 1
+                yield doc
             
-            logger.info(f"マニュアル {len(documents)}セクションを処理しました")
-            return documents
+            logger.info(f"マニュアル {count}セクションを処理しました")
             
         except Exception as e:
             logger.error(f"PDFファイルの処理に失敗しました: {e}")
             raise
     
     def embed_documents(self, documents: List[Dict[str, Any]]) -> List[List[float]]:
-        """ドキュメントを埋め込み"""
+        """ドキュメントを埋め込み（計算済みの埋め込みがあれば再利用）"""
         try:
-            logger.info(f"{len(documents)}件のドキュメントを埋め込み中...")
+            pending = [doc for doc in documents if 'embedding' not in doc]
+            logger.debug(f"{len(pending)}/{len(documents)}件のドキュメントを埋め込み中...")
             
-            contents = [doc['content'] for doc in documents]
-            embeddings = self.embedding_model.encode(contents, show_progress_bar=True)
+            encoded = iter([])
+            if pending:
+                contents = [doc['content'] for doc in pending]
+                encoded = iter(self.embedding_model.encode(
+                    contents,
+                    batch_size=config.EMBEDDING_BATCH_SIZE,
+                    show_progress_bar=False
+                ).tolist())
             
-            logger.info("埋め込みが完了しました")
-            return embeddings.tolist()
+            embeddings = [
+                doc['embedding'] if 'embedding' in doc else next(encoded)
+                for doc in documents
+            ]
+            
+            if config.COMPRESSION_ENABLED:
+                self._embed_sentences(documents)
+            
+            return embeddings
             
         except Exception as e:
             logger.error(f"埋め込みに失敗しました: {e}")
             raise
     
+    def _embed_sentences(self, documents: List[Dict[str, Any]]):
+        """
+        圧縮用に本文の文ごとの埋め込みを計算してメタデータに格納
+        
+        検索時に文を選ぶための埋め込みはここで一度だけ計算する。
+        文数が少ないドキュメント（圧縮しないもの）は対象外。
+        バッチ内の全ドキュメントの文をまとめて1回で埋め込む。
+        """
+        targets = []
+        for doc in documents:
+            if 'sentence_embeddings' in doc['metadata']:
+                continue
+            _, sentences = split_compressible(doc['content'])
+            if len(sentences) >= config.COMPRESSION_MIN_SENTENCES:
+                targets.append((doc, sentences))
+        
+        if not targets:
+            return
+        
+        all_sentences = [sentence for _, sentences in targets for sentence in sentences]
+        encoded = self.embedding_model.encode(
+            all_sentences,
+            batch_size=config.EMBEDDING_BATCH_SIZE,
+            show_progress_bar=False
+        )
+        
+        offset = 0
+        for doc, sentences in targets:
+            doc['metadata']['sentence_embeddings'] = encode_sentence_embeddings(
+                encoded[offset:offset + len(sentences)]
+            )
+            doc['metadata']['sentence_count'] = len(sentences)
+            offset += len(sentences)
+        
+        logger.debug(f"{len(targets)}件のドキュメントの文（{len(all_sentences)}文）を埋め込みました")
+    
     def add_to_chroma(self, documents: List[Dict[str, Any]], embeddings: List[List[float]]):
-        """ChromaDBにドキュメントを追加"""
+        """ChromaDBにドキュメントを追加（同一IDは上書き）"""
         try:
-            logger.info(f"{len(documents)}件のドキュメントをChromaDBに追加中...")
+            logger.debug(f"{len(documents)}件のドキュメントをChromaDBに追加中...")
             
             ids = [doc['id'] for doc in documents]
             contents = [doc['content'] for doc in documents]
             metadatas = [doc['metadata'] for doc in documents]
             
-            self.collection.add(
+            self.collection.upsert(
                 ids=ids,
                 documents=contents,
                 embeddings=embeddings,
                 metadatas=metadatas
             )
             
-            logger.info("ChromaDBへの追加が完了しました")
+            # 検証用のサンプルを各バッチの先頭から収集
+            if len(self.validation_samples) < config.INDEX_VALIDATION_SAMPLES:
+                self.validation_samples.append((ids[0], embeddings[0]))
             
         except Exception as e:
             logger.error(f"ChromaDBへの追加に失敗しました: {e}")
             raise
     
-    def create_index(self):
-        """インデックスを作成"""
-        try:
-            logger.info("インデックス作成を開始します")
+    def _fetch_existing_embeddings(self, ids: List[str]) -> Dict[str, tuple]:
+        """コレクションに格納済みの (埋め込み, メタデータ) をIDで取得"""
+        existing = {}
+        if self.collection is None:
+            return existing
+        
+        for start in range(0, len(ids), config.INDEX_BATCH_SIZE):
+            result = self.collection.get(
+                ids=ids[start:start + config.INDEX_BATCH_SIZE],
+                include=["embeddings", "metadatas"]
+            )
+            existing.update(zip(result['ids'], zip(result['embeddings'], result['metadatas'])))
+        return existing
+    
+    def deduplicate_faq(self, csv_path: Path) -> Iterator[Dict[str, Any]]:
+        """
+        FAQの近似重複をまとめ、代表ドキュメントを順次生成
+        
+        クラスタリングには全FAQの埋め込みが必要なため、CSVをチャンク単位で3回読む。
+        
+        1. 埋め込みを計算し（格納済みのものは再利用）、一時ファイルの行列に書き出す
+        2. 行列からクラスタを求め、クラスタに属する行のIDと質問だけを集める
+        3. 代表の行だけを、計算済みの埋め込みを添付して生成する
+        
+        メモリに保持するのはチャンク分のドキュメントと行ごとのLSHキー・素集合、
+        クラスタに属する行の質問のみで、埋め込み行列（FAQ件数 × 次元 × 4バイト）は
+        ディスク上に置く。文の埋め込みはパイプラインの埋め込みステージでバッチごとに計算する。
+        
+        Args:
+            csv_path: FAQのCSVファイル
+        
+        Yields:
+            代表ドキュメント（重複のないものを含む）
+        """
+        with tempfile.TemporaryDirectory(prefix="faq_dedup_") as work_dir:
+            matrix_path = Path(work_dir) / "embeddings.f32"
+            count, dimension = self._write_faq_embeddings(csv_path, matrix_path)
+            if count < 2:
+                yield from self.process_faq_csv(csv_path)
+                return
             
-            # ChromaDBに接続
-            self.connect_to_chroma()
+            embeddings = np.memmap(matrix_path, dtype=np.float32, mode='r', shape=(count, dimension))
+            selections = FAQDeduplicator().select_canonicals(embeddings)
+            duplicates_of = {canonical: duplicates for canonical, duplicates in selections}
+            dropped = {index for _, duplicates in selections for index, _ in duplicates}
             
-            all_documents = []
+            # 代表より後ろにある重複の質問も必要なため、先にクラスタのメンバーだけを集める
+            members = {}
+            if selections:
+                rows = (doc for documents in iter_faq_chunks(csv_path) for doc in documents)
+                for index, doc in enumerate(rows):
+                    if index in dropped or index in duplicates_of:
+                        members[index] = (doc['id'], doc['metadata']['question'])
             
-            # FAQファイルを処理
-            if config.FAQ_FILE.exists():
-                faq_docs = self.process_faq_csv(config.FAQ_FILE)
-                all_documents.extend(faq_docs)
-            else:
-                logger.warning(f"FAQファイルが見つかりません: {config.FAQ_FILE}")
+            report = []
+            index = -1
+            for documents in iter_faq_chunks(csv_path):
+                if index + len(documents) >= count:
+                    raise ValueError(f"FAQファイルが処理中に変更されました: {csv_path}")
+                
+                kept = []
+                for doc in documents:
+                    index += 1
+                    if index in dropped:
+                        continue
+                    duplicates = duplicates_of.get(index)
+                    if duplicates:
+                        apply_alternates(doc['metadata'], [members[position][1] for position, _ in duplicates])
+                        report.append(cluster_report(
+                            doc,
+                            [(*members[position], similarity) for position, similarity in duplicates]
+                        ))
+                    doc['embedding'] = embeddings[index].tolist()
+                    kept.append(doc)
+                
+                # 文の埋め込みも内容が同じなら再利用
+                existing = self._fetch_existing_embeddings([doc['id'] for doc in kept])
+                for doc in kept:
+                    _, metadata = existing.get(doc['id'], (None, None))
+                    for key in ('sentence_embeddings', 'sentence_count'):
+                        if metadata and key in metadata:
+                            doc['metadata'][key] = metadata[key]
+                    
+                    # 言い換えの集合が変わったら別ドキュメントとして扱う（差分同期のため）
+                    alternates = doc['metadata'].get('alternate_questions')
+                    if alternates:
+                        doc['id'] = _document_id("faq", doc['content'], alternates)
+                    yield doc
             
-            # マニュアルディレクトリを処理
-            if config.MANUAL_DIR.exists():
-                for pdf_file in config.MANUAL_DIR.glob("*.pdf"):
-                    manual_docs = self.process_manual_pdf(pdf_file)
-                    all_documents.extend(manual_docs)
+            if index + 1 != count:
+                raise ValueError(f"FAQファイルが処理中に変更されました: {csv_path}")
+            
+            logger.info(
+                f"FAQの近似重複をまとめました: {count}件 -> {count - len(dropped)}件 "
+                f"({len(selections)}クラスタ)"
+            )
+            write_dedup_report(report)
+    
+    def _write_faq_embeddings(self, csv_path: Path, matrix_path: Path) -> tuple:
+        """
+        FAQの埋め込みをチャンク単位で計算して行列のファイルに追記
+        
+        Returns:
+            (行数, 次元数)
+        """
+        count, dimension = 0, 0
+        with open(matrix_path, "wb") as matrix_file:
+            for documents in iter_faq_chunks(csv_path):
+                existing = self._fetch_existing_embeddings([doc['id'] for doc in documents])
+                pending = [doc['content'] for doc in documents if doc['id'] not in existing]
+                encoded = iter([])
+                if pending:
+                    encoded = iter(self.embedding_model.encode(
+                        pending,
+                        batch_size=config.EMBEDDING_BATCH_SIZE,
+                        show_progress_bar=False
+                    ))
+                
+                for doc in documents:
+                    if doc['id'] in existing:
+                        embedding = np.asarray(existing[doc['id']][0], dtype=np.float32)
+                    else:
+                        embedding = np.asarray(next(encoded), dtype=np.float32)
+                    dimension = len(embedding)
+                    matrix_file.write(embedding.tobytes())
+                    count += 1
+                
+                logger.debug(f"FAQの埋め込みを計算済み: {count}件")
+        return count, dimension
+    
+    def iter_file_documents(self, path: Path) -> Iterator[Dict[str, Any]]:
+        """ファイル1件分のドキュメントを生成"""
+        if path == config.FAQ_FILE:
+            if config.FAQ_DEDUP_ENABLED:
+                yield from self.deduplicate_faq(path)
             else:
-                logger.warning(f"マニュアルディレクトリが見つかりません: {config.MANUAL_DIR}")
+                yield from self.process_faq_csv(path)
+        elif path.suffix.lower() == ".pdf":
+            yield from self.process_manual_pdf(path)
+        else:
+            logger.warning(f"未対応のファイル形式です: {path}")
+    
+    def sync_file(self, path: Path, batch_size: Optional[int] = None) -> List[str]:
+        """
+        ファイル1件分の差分をコレクションに反映
+        
+        ドキュメントIDは内容から決まるため、既存IDとの差分だけで
+        追加・削除すべきドキュメントが分かる。削除されたファイルは
+        そのファイル由来のドキュメントをすべて削除する。
+        
+        Args:
+            path: 変更されたファイル
+            batch_size: パイプラインのバッチサイズ
+        
+        Returns:
+            追加・削除されたドキュメントIDのリスト
+        """
+        if path == config.FAQ_FILE:
+            where = {"type": "faq"}
+        else:
+            where = {"file_path": str(path)}
+        
+        existing_ids = set(self.collection.get(where=where, include=[])['ids'])
+        new_ids: Set[str] = set()
+        added_ids: List[str] = []
+        
+        def added_documents() -> Iterator[Dict[str, Any]]:
+            # ドキュメントは保持せず、IDだけを記録しながら追加分をパイプラインに流す
+            for doc in self.iter_file_documents(path):
+                new_ids.add(doc['id'])
+                if doc['id'] not in existing_ids:
+                    added_ids.append(doc['id'])
+                    yield doc
+        
+        if path.exists():
+            pipeline = IndexPipeline(
+                self,
+                batch_size=batch_size or config.INDEX_BATCH_SIZE,
+                queue_size=config.INDEX_QUEUE_SIZE
+            )
+            pipeline.run(added_documents())
+        
+        # 追加が終わってから削除する（反映中に該当するドキュメントがなくならないように）
+        removed_ids = existing_ids - new_ids
+        if removed_ids:
+            self.collection.delete(ids=sorted(removed_ids))
+        
+        logger.info(
+            f"差分を反映しました: {path.name} "
+            f"(追加 {len(added_ids)}件, 削除 {len(removed_ids)}件, 変更なし {len(new_ids & existing_ids)}件)"
+        )
+        return sorted(removed_ids | set(added_ids))
+    
+    def build_derived_indexes(self) -> Path:
+        """
+        コレクションの全ドキュメントから語彙（BM25）インデックスと
+        FAQ完全一致テーブルを構築
+        
+        差分同期後も常にコレクションと一致させるため、ベクトルDBの
+        内容を正として読み直して構築する。
+        
+        Returns:
+            語彙インデックスの保存先のパス
+        """
+        builder = LexicalIndexBuilder()
+        exact_builder = FAQExactIndexBuilder()
+        offset = 0
+        while True:
+            page = self.collection.get(
+                include=["documents", "metadatas"],
+                limit=config.INDEX_BATCH_SIZE,
+                offset=offset
+            )
+            if not page['ids']:
+                break
+            builder.add_many(page['ids'], page['documents'], page['metadatas'])
+            exact_builder.add_many(page['ids'], page['metadatas'])
+            offset += len(page['ids'])
+        
+        index = builder.build()
+        path = lexical_index_path(self.collection_name)
+        index.save(path)
+        logger.info(f"語彙インデックスを保存しました: {path} (ドキュメント数: {len(index)}, 語彙数: {len(index.terms)})")
+        
+        exact_path = exact_index_path(self.collection_name)
+        exact_builder.save(exact_path)
+        logger.info(f"FAQ完全一致テーブルを保存しました: {exact_path} (質問数: {len(exact_builder.entries)})")
+        
+        return path
+    
+    def iter_documents(self) -> Iterator[Dict[str, Any]]:
+        """すべてのソースからドキュメントを順次生成"""
+        # FAQファイルを処理
+        if config.FAQ_FILE.exists():
+            yield from self.iter_file_documents(config.FAQ_FILE)
+        else:
+            logger.warning(f"FAQファイルが見つかりません: {config.FAQ_FILE}")
+        
+        # マニュアルディレクトリを処理
+        if config.MANUAL_DIR.exists():
+            for pdf_file in sorted(config.MANUAL_DIR.glob("*.pdf")):
+                yield from self.process_manual_pdf(pdf_file)
+        else:
+            logger.warning(f"マニュアルディレクトリが見つかりません: {config.MANUAL_DIR}")
+    
+    def create_index(
+        self,
+        batch_size: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        collection_name: Optional[str] = None
+    ):
+        """
+        インデックスを作成
+        
+        Args:
+            batch_size: パイプラインを流れるバッチのドキュメント数
+            queue_size: ステージ間キューの最大バッチ数
+            collection_name: 書き込み先のコレクション名
+        """
+        try:
+            logger.info("インデックス作成を開始します")
             
-            if not all_documents:
-                logger.error("処理するドキュメントが見つかりません")
-                return False
+            # ChromaDBに接続
+            self.connect_to_chroma(collection_name)
+            self.validation_samples = []
             
-            # 埋め込み処理
-            embeddings = self.embed_documents(all_documents)
+            # 抽出・埋め込み・書き込みをパイプラインで並行実行
+            pipeline = IndexPipeline(
+                self,
+                batch_size=batch_size or config.INDEX_BATCH_SIZE,
+                queue_size=queue_size or config.INDEX_QUEUE_SIZE
+            )
+            written = pipeline.run(self.iter_documents())
             
-            # ChromaDBに追加
-            self.add_to_chroma(all_documents, embeddings)
+            if written == 0:
+                logger.error("処理するドキュメントが見つかりません")
+                return False
             
             # 結果表示
             count = self.collection.count()
-            logger.info(f"インデックス作成完了: 総ドキュメント数 {count}")
+            logger.info(f"インデックス作成完了: 追加 {written}件, 総ドキュメント数 {count}")
+            self.last_written = written
+            
+            # 語彙インデックスとFAQ完全一致テーブルを構築
+            self.build_derived_indexes()
+            
+            # 稼働中のコレクションを更新した場合はAPIのキャッシュを全件無効化
+            if self.collection_name == get_index_registry().resolve_collection_name():
+                get_index_registry().bump_version(None)
             
             return True
             
         except Exception as e:
             logger.error(f"インデックス作成に失敗しました: {e}")
             return False
+    
+    def validate_collection(self, expected_count: int) -> bool:
+        """
+        構築したコレクションを検証
+        
+        ドキュメント数の一致と、サンプル文書の埋め込みで
+        自身が最上位にヒットすることを確認する
+        
+        Args:
+            expected_count: 期待するドキュメント数
+        
+        Returns:
+            検証結果
+        """
+        try:
+            count = self.collection.count()
+            if count != expected_count:
+                logger.error(f"ドキュメント数が一致しません (期待: {expected_count}, 実際: {count})")
+                return False
+            
+            for doc_id, embedding in self.validation_samples:
+                results = self.collection.query(
+                    query_embeddings=[embedding],
+                    n_results=1,
+                    include=["distances"]
+                )
+                top_ids = results['ids'][0] if results['ids'] else []
+                if doc_id not in top_ids:
+                    logger.error(f"サンプル検索の検証に失敗しました: {doc_id} (結果: {top_ids})")
+                    return False
+            
+            logger.info(
+                f"コレクション '{self.collection_name}' の検証に成功しました "
+                f"(ドキュメント数: {count}, サンプル検索: {len(self.validation_samples)}件)"
+            )
+            return True
+            
+        except Exception as e:
+            logger.error(f"コレクションの検証に失敗しました: {e}")
+            return False
+    
+    def create_index_blue_green(
+        self,
+        batch_size: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        keep_versions: Optional[int] = None
+    ) -> bool:
+        """
+        新しいバージョンのコレクションを構築し、検証後にエイリアスを切り替え
+        
+        稼働中のコレクションには書き込まないため、構築中もAPIは
+        旧バージョンで応答を続ける。切り替え前のバージョンは
+        ロールバック用に保持し、保持数を超えたものを削除する。
+        
+        Args:
+            batch_size: パイプラインを流れるバッチのドキュメント数
+            queue_size: ステージ間キューの最大バッチ数
+            keep_versions: アクティブ以外に保持するバージョン数
+        
+        Returns:
+            成功したかどうか
+        """
+        registry = get_index_registry()
+        version_name = registry.new_version_name()
+        logger.info(f"ブルー/グリーン構築を開始します: {version_name}")
+        
+        built = self.create_index(
+            batch_size=batch_size,
+            queue_size=queue_size,
+            collection_name=version_name
+        )
+        
+        if not built or not self.validate_collection(self.last_written):
+            # 検証に失敗した新バージョンは破棄し、現行のまま運用を継続
+            logger.error(f"新バージョン '{version_name}' を破棄します")
+            self._drop_collection(version_name)
+            return False
+        
+        # 初回の切り替えでは、それまでのバージョンなしのコレクションをロールバック先に残す
+        registry.activate(version_name, legacy_exists=self._collection_exists(registry.alias))
+        self.collect_garbage(keep_versions)
+        return True
+    
+    def collect_garbage(self, keep_versions: Optional[int] = None):
+        """保持数を超えた旧バージョンのコレクションを削除"""
+        expired = get_index_registry().collect_garbage(keep_versions)
+        for collection_name in expired:
+            self._drop_collection(collection_name)
+    
+    def _collection_exists(self, collection_name: str) -> bool:
+        """コレクションが存在するか"""
+        try:
+            self.chroma_client.get_collection(name=collection_name)
+            return True
+        except Exception:
+            return False
+    
+    def _drop_collection(self, collection_name: str):
+        """コレクションを削除（存在しない場合は無視）"""
+        try:
+            self.chroma_client.delete_collection(collection_name)
+            lexical_index_path(collection_name).unlink(missing_ok=True)
+            exact_index_path(collection_name).unlink(missing_ok=True)
+            logger.info(f"コレクション '{collection_name}' を削除しました")
+        except Exception as e:
+            logger.warning(f"コレクション '{collection_name}' の削除をスキップしました: {e}")
+
+
+class IndexPipeline:
+    """
+    抽出 → 埋め込み → 書き込み のストリーミングパイプライン
+    
+    各ステージは別スレッドで動作し、固定サイズのバッチを
+    上限付きキューで受け渡す。キューが満杯になると上流が待機するため、
+    メモリ使用量は (キューサイズ × バッチサイズ) に抑えられる。
+    """
+    
+    _SENTINEL = object()
+    _POLL_INTERVAL = 0.5
+    
+    def __init__(
+        self,
+        processor: DocumentProcessor,
+        batch_size: int,
+        queue_size: int
+    ):
+        if batch_size < 1:
+            raise ValueError("batch_size must be >= 1")
+        if queue_size < 1:
+            raise ValueError("queue_size must be >= 1")
+        
+        self.processor = processor
+        self.batch_size = batch_size
+        self.embed_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.write_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._errors: List[BaseException] = []
+    
+    def run(self, documents: Iterable[Dict[str, Any]]) -> int:
+        """
+        パイプラインを実行
+        
+        Args:
+            documents: ドキュメントのイテラブル（ジェネレーター推奨）
+        
+        Returns:
+            書き込んだドキュメント数
+        """
+        logger.info(
+            f"パイプラインを開始します (バッチサイズ: {self.batch_size}, "
+            f"キューサイズ: {self.embed_queue.maxsize})"
+        )
+        
+        producer = threading.Thread(
+            target=self._produce, args=(documents,), name="index-producer", daemon=True
+        )
+        embedder = threading.Thread(
+            target=self._embed, name="index-embedder", daemon=True
+        )
+        producer.start()
+        embedder.start()
+        
+        # 書き込みステージはメインスレッドで実行
+        written = self._write()
+        
+        producer.join()
+        embedder.join()
+        
+        if self._errors:
+            raise self._errors[0]
+        
+        return written
+    
+    def _put(self, target: queue.Queue, item: Any) -> bool:
+        """停止要求を確認しながらキューに投入"""
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=self._POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def _get(self, source: queue.Queue) -> Any:
+        """停止要求を確認しながらキューから取得"""
+        while not self._stop.is_set():
+            try:
+                return source.get(timeout=self._POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return self._SENTINEL
+    
+    def _fail(self, stage: str, error: BaseException):
+        """ステージの失敗を記録してパイプライン全体を停止"""
+        logger.error(f"パイプラインの{stage}ステージで失敗しました: {error}")
+        self._errors.append(error)
+        self._stop.set()
+    
+    def _produce(self, documents: Iterable[Dict[str, Any]]):
+        """抽出ステージ: ドキュメントを固定サイズのバッチにまとめる"""
+        try:
+            batch = []
+            for doc in documents:
+                batch.append(doc)
+                if len(batch) >= self.batch_size:
+                    if not self._put(self.embed_queue, batch):
+                        return
+                    batch = []
+            if batch:
+                self._put(self.embed_queue, batch)
+        except Exception as e:
+            self._fail("抽出", e)
+        finally:
+            self._put(self.embed_queue, self._SENTINEL)
+    
+    def _embed(self):
+        """埋め込みステージ: バッチ単位でベクトル化"""
+        try:
+            while True:
+                batch = self._get(self.embed_queue)
+                if batch is self._SENTINEL:
+                    break
+                embeddings = self.processor.embed_documents(batch)
+                if not self._put(self.write_queue, (batch, embeddings)):
+                    break
+        except Exception as e:
+            self._fail("埋め込み", e)
+        finally:
+            self._put(self.write_queue, self._SENTINEL)
+    
+    def _write(self) -> int:
+        """書き込みステージ: バッチ単位でChromaDBに追加"""
+        written = 0
+        try:
+            while True:
+                item = self._get(self.write_queue)
+                if item is self._SENTINEL:
+                    break
+                batch, embeddings = item
+                self.processor.add_to_chroma(batch, embeddings)
+                written += len(batch)
+                logger.info(f"ChromaDBに書き込み済み: {written}件")
+        except Exception as e:
+            self._fail("書き込み", e)
+        return written
+
+
+class IndexWatcher:
+    """
+    FAQ/マニュアルの変更を監視してインクリメンタルに再インデックス
+    
+    ファイルの更新時刻とサイズをポーリングで比較し、変更が
+    落ち着くまで（デバウンス期間）待ってから差分を反映する。
+    反映後はバージョンファイルを更新してAPIに通知する。
+    """
+    
+    def __init__(
+        self,
+        processor: DocumentProcessor,
+        interval: Optional[float] = None,
+        debounce: Optional[float] = None
+    ):
+        self.processor = processor
+        self.interval = interval or config.INDEX_WATCH_INTERVAL
+        self.debounce = debounce if debounce is not None else config.INDEX_WATCH_DEBOUNCE
+    
+    def _snapshot(self) -> Dict[Path, tuple]:
+        """監視対象ファイルの状態を取得"""
+        snapshot = {}
+        candidates = [config.FAQ_FILE]
+        if config.MANUAL_DIR.exists():
+            candidates.extend(config.MANUAL_DIR.glob("*.pdf"))
+        
+        for path in candidates:
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+    
+    def apply(self, paths: Set[Path]):
+        """変更されたファイルの差分を反映してAPIに通知"""
+        changed_ids = []
+        changed_files = []
+        for path in sorted(paths):
+            try:
+                ids = self.processor.sync_file(path)
+            except Exception as e:
+                logger.error(f"差分の反映に失敗しました: {path}: {e}")
+                continue
+            if ids:
+                changed_ids.extend(ids)
+                changed_files.append(str(path))
+        
+        if changed_ids:
+            self.processor.build_derived_indexes()
+            get_index_registry().bump_version(changed_ids, changed_files)
+    
+    def run(self):
+        """監視ループを実行（Ctrl+Cで終了）"""
+        previous = self._snapshot()
+        
+        # 起動時に全ファイルを同期して基準状態を揃える
+        logger.info(f"監視対象 {len(previous)}件のファイルを同期中...")
+        self.apply(set(previous))
+        
+        logger.info(
+            f"ファイル監視を開始します (間隔: {self.interval}秒, デバウンス: {self.debounce}秒)"
+        )
+        
+        pending: Set[Path] = set()
+        last_change = 0.0
+        while True:
+            time.sleep(self.interval)
+            current = self._snapshot()
+            
+            changed = {
+                path for path in previous.keys() | current.keys()
+                if previous.get(path) != current.get(path)
+            }
+            previous = current
+            
+            if changed:
+                pending |= changed
+                last_change = time.monotonic()
+                logger.info(f"変更を検知しました: {', '.join(p.name for p in sorted(changed))}")
+                continue
+            
+            if pending and time.monotonic() - last_change >= self.debounce:
+                self.apply(pending)
+                pending = set()
 
 
 def main():
     """メイン関数"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description="FAQ/マニュアルのインデックスを作成",
+        epilog=(
+            "メモリ使用量: パイプライン上のドキュメントは最大 (2 × キューサイズ + 3) × バッチサイズ件、"
+            f"FAQのCSVは {config.FAQ_CSV_CHUNK_SIZE}行（FAQ_CSV_CHUNK_SIZE）ずつ読み込む。"
+            "FAQの近似重複の集約では埋め込み行列（FAQ件数 × 次元 × 4バイト）を一時ファイルに置き、"
+            "メモリには行ごとのLSHキー・素集合と、重複の質問のみを保持する。"
+        )
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=config.INDEX_BATCH_SIZE,
+        help="パイプラインのバッチサイズ（ドキュメント数）"
+    )
+    parser.add_argument(
+        '--queue-size',
+        type=int,
+        default=config.INDEX_QUEUE_SIZE,
+        help="ステージ間キューの最大バッチ数"
+    )
+    parser.add_argument(
+        '--blue-green',
+        action='store_true',
+        help="新しいバージョンのコレクションに構築し、検証後にエイリアスを切り替え"
+    )
+    parser.add_argument(
+        '--keep-versions',
+        type=int,
+        default=config.INDEX_KEEP_VERSIONS,
+        help="ロールバック用に保持する旧バージョン数"
+    )
+    parser.add_argument(
+        '--rollback',
+        action='store_true',
+        help="エイリアスを直前のバージョンに戻す"
+    )
+    parser.add_argument(
+        '--no-dedup-faq',
+        action='store_true',
+        help="FAQの近似重複の集約を行わない（CSVを1回だけ読み、一時ファイルを使わない）"
+    )
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help="FAQ/マニュアルの変更を監視してインクリメンタルに再インデックス"
+    )
+    
+    args = parser.parse_args()
+    
+    if args.no_dedup_faq:
+        config.FAQ_DEDUP_ENABLED = False
+    
     try:
+        # ロールバックはChromaDBへの書き込みを伴わない
+        if args.rollback:
+            target = get_index_registry().rollback()
+            return 0 if target else 1
+        
         # 設定を検証
         config.validate()
         
         # プロセッサーを初期化
         processor = DocumentProcessor()
         
+        # 監視モード
+        if args.watch:
+            processor.connect_to_chroma()
+            IndexWatcher(processor).run()
+            return 0
+        
         # インデックスを作成
-        success = processor.create_index()
+        if args.blue_green:
+            success = processor.create_index_blue_green(
+                batch_size=args.batch_size,
+                queue_size=args.queue_size,
+                keep_versions=args.keep_versions
+            )
+        else:
+            success = processor.create_index(
+                batch_size=args.batch_size,
+                queue_size=args.queue_size
+            )
         
         if success:
             logger.info("✅ インデックス作成が成功しました")
@@ -242,6 +1058,9 @@ def main():
             logger.error("❌ インデックス作成に失敗しました")
             return 1
             
+    except KeyboardInterrupt:
+        logger.info("\n処理が中断されました")
+        return 0
     except Exception as e:
         logger.error(f"❌ 予期しないエラーが発生しました: {e}")
         return 1
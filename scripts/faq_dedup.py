@@ -0,0 +1,198 @@
+"""
+FAQの近似重複検出
+埋め込みの類似度でFAQをクラスタリングし、代表1件にまとめる
+"""
+
+import json
+import sys
+import numpy as np
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.configs import config
+from src.custom_logger import get_module_logger
+
+logger = get_module_logger("faq_dedup")
+
+
+class _UnionFind:
+    """素集合データ構造（クラスタの併合用）"""
+    
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+    
+    def find(self, x: int) -> int:
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        # 経路圧縮
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+    
+    def union(self, a: int, b: int):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+
+class FAQDeduplicator:
+    """
+    FAQの近似重複検出クラス
+    
+    ランダム超平面によるLSH（SimHash）で候補ペアをバケットに絞り込み、
+    同じバケット内だけでコサイン類似度を計算するため、全件比較の
+    O(N^2) を避けられる。複数テーブルを使うことで取りこぼしを減らす。
+    
+    埋め込み行列は一定行数ずつ読むため、np.memmap（ディスク上の行列）も
+    そのまま渡せる。メモリに保持するのは行ごとのバケットキーと素集合のみ。
+    """
+    
+    # バケットキーを計算する際に一度に読む行数
+    _BLOCK_ROWS = 4096
+    
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        num_bits: Optional[int] = None,
+        num_tables: Optional[int] = None,
+        seed: int = 42
+    ):
+        self.threshold = threshold if threshold is not None else config.FAQ_DEDUP_THRESHOLD
+        self.num_bits = num_bits or config.FAQ_DEDUP_LSH_BITS
+        self.num_tables = num_tables or config.FAQ_DEDUP_LSH_TABLES
+        self.seed = seed
+    
+    def find_clusters(self, embeddings: np.ndarray) -> List[List[int]]:
+        """
+        近似重複のクラスタを検出
+        
+        Args:
+            embeddings: (N, D) の埋め込み行列（np.memmap も可）
+        
+        Returns:
+            2件以上からなるクラスタ（インデックスのリスト）のリスト
+        """
+        count = len(embeddings)
+        if count < 2:
+            return []
+        
+        union_find = _UnionFind(count)
+        rng = np.random.default_rng(self.seed)
+        powers = 1 << np.arange(self.num_bits, dtype=np.int64)
+        
+        for _ in range(self.num_tables):
+            # 超平面のどちら側にあるかをビット列にしてバケットキーとする
+            # （符号は正規化の有無で変わらないため、元の埋め込みのまま計算する）
+            planes = rng.standard_normal((embeddings.shape[1], self.num_bits)).astype(np.float32)
+            keys = np.concatenate([
+                ((np.asarray(embeddings[start:start + self._BLOCK_ROWS], dtype=np.float32) @ planes) > 0)
+                .astype(np.int64) @ powers
+                for start in range(0, count, self._BLOCK_ROWS)
+            ])
+            
+            order = np.argsort(keys, kind='stable')
+            boundaries = np.flatnonzero(np.diff(keys[order])) + 1
+            for bucket in np.split(order, boundaries):
+                if len(bucket) > 1:
+                    self._link_bucket(embeddings, bucket, union_find)
+        
+        clusters: Dict[int, List[int]] = {}
+        for index in range(count):
+            clusters.setdefault(union_find.find(index), []).append(index)
+        
+        return [members for members in clusters.values() if len(members) > 1]
+    
+    def _link_bucket(self, embeddings: np.ndarray, bucket: np.ndarray, union_find: _UnionFind):
+        """バケット内で閾値以上のペアを併合"""
+        bucket = np.sort(bucket)  # ディスク上の行列は位置順に読む
+        vectors = self._normalize(embeddings[bucket])
+        similarities = vectors @ vectors.T
+        rows, cols = np.nonzero(np.triu(similarities >= self.threshold, k=1))
+        for row, col in zip(rows.tolist(), cols.tolist()):
+            union_find.union(int(bucket[row]), int(bucket[col]))
+    
+    @staticmethod
+    def _normalize(embeddings: np.ndarray) -> np.ndarray:
+        """L2正規化（コサイン類似度を内積で計算するため）"""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+    
+    def select_canonicals(self, embeddings: np.ndarray) -> List[Tuple[int, List[Tuple[int, float]]]]:
+        """
+        クラスタごとに代表を選択
+        
+        各クラスタでは他のメンバーとの平均類似度が最も高いもの（メドイド）を代表とする。
+        
+        Args:
+            embeddings: (N, D) の埋め込み行列（np.memmap も可）
+        
+        Returns:
+            (代表のインデックス, [(重複のインデックス, 代表との類似度), ...]) のリスト
+        """
+        selections = []
+        for members in self.find_clusters(embeddings):
+            member_vectors = self._normalize(embeddings[members])
+            similarities = member_vectors @ member_vectors.T
+            canonical_position = int(np.argmax(similarities.sum(axis=1)))
+            selections.append((
+                members[canonical_position],
+                [
+                    (index, round(float(similarities[canonical_position, position]), 4))
+                    for position, index in enumerate(members)
+                    if position != canonical_position
+                ]
+            ))
+        return selections
+
+
+def apply_alternates(metadata: Dict[str, Any], alternates: List[str]):
+    """代表のメタデータに重複の質問（言い換え）を記録"""
+    metadata['alternate_questions'] = "\n".join(alternates)
+    metadata['duplicate_count'] = len(alternates)
+
+
+def cluster_report(
+    canonical_doc: Dict[str, Any],
+    duplicates: List[Tuple[str, str, float]]
+) -> Dict[str, Any]:
+    """
+    クラスタ1件分のレポート
+    
+    Args:
+        canonical_doc: 代表ドキュメント
+        duplicates: (ID, 質問, 代表との類似度) のリスト
+    """
+    return {
+        'canonical_id': canonical_doc['id'],
+        'canonical_question': canonical_doc['metadata'].get('question', ''),
+        'duplicates': [
+            {'id': doc_id, 'question': question, 'similarity': similarity}
+            for doc_id, question, similarity in duplicates
+        ]
+    }
+
+
+def write_dedup_report(report: List[Dict[str, Any]], path: Optional[Path] = None) -> Path:
+    """クラスタのレポートをJSONで出力"""
+    path = Path(path or config.FAQ_DEDUP_REPORT_FILE)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        json.dumps(
+            {
+                'cluster_count': len(report),
+                'removed_count': sum(len(cluster['duplicates']) for cluster in report),
+                'clusters': report
+            },
+            ensure_ascii=False,
+            indent=2
+        ),
+        encoding='utf-8'
+    )
+    logger.info(f"重複クラスタのレポートを出力しました: {path}")
+    return path
@@ -4,7 +4,7 @@ Support Bot Core Package
 """
 
 from .agent import get_support_agent, SupportAgent
-from .api import create_app, run_server
+from .api import create_app, run_server, run_production_server
 from .configs import config
 from .custom_logger import get_module_logger, app_logger
 from .models import (
@@ -20,6 +20,7 @@ __all__ = [
     'SupportAgent', 
     'create_app',
     'run_server',
+    'run_production_server',
     'config',
     'get_module_logger',
     'app_logger',
@@ -0,0 +1,242 @@
+"""
+受付制御（アドミッション制御）
+同時処理数の上限・待ち行列・クライアント別のレート制限で過負荷時のリクエストを早期に断る
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from .configs import config
+from .custom_logger import get_module_logger
+from .metrics import ADMISSION_REJECTED
+
+logger = get_module_logger("admission")
+
+
+class AdmissionRejected(Exception):
+    """受付を拒否した（HTTPステータスと再試行までの秒数を持つ）"""
+    
+    def __init__(self, status_code: int, reason: str, retry_after: float, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.message = message
+
+
+class TokenBucketLimiter:
+    """
+    クライアント別のトークンバケット
+    
+    1分あたり rate 件のペースでトークンが補充され、最大 burst 件まで
+    連続で受け付ける。クライアント数が上限を超えたら最も古いものを破棄する。
+    """
+    
+    def __init__(
+        self,
+        rate_per_minute: Optional[float] = None,
+        burst: Optional[int] = None,
+        max_clients: Optional[int] = None
+    ):
+        self.rate = (config.RATE_LIMIT_PER_MINUTE if rate_per_minute is None else rate_per_minute) / 60.0
+        self.burst = config.RATE_LIMIT_BURST if burst is None else burst
+        self.max_clients = max_clients or config.RATE_LIMIT_MAX_CLIENTS
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+    
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+    
+    def acquire(self, client: str) -> float:
+        """
+        トークンを1つ消費
+        
+        Returns:
+            0（受付可）または次のトークンが補充されるまでの秒数
+        """
+        if not self.enabled:
+            return 0.0
+        
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(client, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+        
+        if tokens >= 1.0:
+            self._buckets[client] = (tokens - 1.0, now)
+            wait = 0.0
+        else:
+            self._buckets[client] = (tokens, now)
+            wait = (1.0 - tokens) / self.rate
+        
+        self._buckets.move_to_end(client)
+        while len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class AdmissionController:
+    """
+    同時処理数の制御
+    
+    同時に処理するリクエストを max_concurrent 件に制限し、超えた分は
+    最大 max_queue 件まで待たせる。待ち行列が満杯の場合や、処理時間の
+    移動平均から見積もった待ち時間が max_wait を超える場合は待たせずに
+    すぐ拒否する（全員がタイムアウトするより一部に確実に回答する）。
+    
+    イベントループのスレッドからのみ呼び出す前提でロックは取らない。
+    """
+    
+    EMA_ALPHA = 0.2
+    
+    def __init__(
+        self,
+        max_concurrent: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        max_wait: Optional[float] = None
+    ):
+        self.max_concurrent = max_concurrent or config.ADMISSION_MAX_CONCURRENT
+        self.max_queue = config.ADMISSION_MAX_QUEUE if max_queue is None else max_queue
+        self.max_wait = max_wait or config.ADMISSION_MAX_WAIT_SECONDS
+        self.rate_limiter = TokenBucketLimiter()
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._service_seconds: Optional[float] = None
+        self.stats = {
+            'admitted': 0,
+            'queued': 0,
+            'rejected': {
+                'rate_limited': 0,
+                'queue_full': 0,
+                'wait_exceeded': 0,
+                'queue_timeout': 0
+            }
+        }
+    
+    def estimated_wait(self) -> float:
+        """新しいリクエストが処理を開始するまでの見積もり時間（秒）"""
+        if self.active < self.max_concurrent and not self._waiters:
+            return 0.0
+        service = self._service_seconds or 0.0
+        return service * (len(self._waiters) + 1) / self.max_concurrent
+    
+    async def acquire(self, client: str) -> float:
+        """
+        処理枠を確保（空くまで待つ）
+        
+        Args:
+            client: レート制限のキー（クライアントのアドレスなど）
+        
+        Returns:
+            確保した時刻（release に渡す）
+        
+        Raises:
+            AdmissionRejected: レート制限・待ち行列の上限・待ち時間の見積もり超過
+        """
+        retry_after = self.rate_limiter.acquire(client)
+        if retry_after > 0:
+            self._reject('rate_limited')
+            raise AdmissionRejected(429, 'rate_limited', retry_after, "リクエストが多すぎます。しばらく待ってから再度お試しください")
+        
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            self.stats['admitted'] += 1
+            return time.monotonic()
+        
+        estimated = self.estimated_wait()
+        if len(self._waiters) >= self.max_queue:
+            self._reject('queue_full')
+            raise AdmissionRejected(503, 'queue_full', estimated or 1.0, "混雑しています。しばらく待ってから再度お試しください")
+        if estimated > self.max_wait:
+            self._reject('wait_exceeded')
+            raise AdmissionRejected(503, 'wait_exceeded', estimated, "混雑しています。しばらく待ってから再度お試しください")
+        
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.stats['queued'] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            # タイムアウトと同時に枠を譲り受けていればそのまま処理する
+            if not self._granted(waiter):
+                self._remove_waiter(waiter)
+                self._reject('queue_timeout')
+                raise AdmissionRejected(503, 'queue_timeout', self.estimated_wait() or 1.0, "混雑しています。しばらく待ってから再度お試しください")
+        except BaseException:
+            # クライアントの切断などで待機が取り消された
+            if self._granted(waiter):
+                self.release(None)
+            else:
+                self._remove_waiter(waiter)
+            raise
+        
+        self.stats['admitted'] += 1
+        return time.monotonic()
+    
+    @staticmethod
+    def _granted(waiter: asyncio.Future) -> bool:
+        """待機中に枠を譲り受けたか"""
+        return waiter.done() and not waiter.cancelled()
+    
+    def _remove_waiter(self, waiter: asyncio.Future):
+        """待ち行列から外す"""
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+    
+    def release(self, admitted_at: Optional[float]):
+        """処理枠を返し、待っているリクエストがあれば枠を譲る"""
+        if admitted_at is not None:
+            elapsed = time.monotonic() - admitted_at
+            if self._service_seconds is None:
+                self._service_seconds = elapsed
+            else:
+                self._service_seconds += self.EMA_ALPHA * (elapsed - self._service_seconds)
+        
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # 枠はそのまま待っているリクエストに引き継ぐ
+                waiter.set_result(None)
+                return
+        self.active -= 1
+    
+    def _reject(self, reason: str):
+        self.stats['rejected'][reason] += 1
+        ADMISSION_REJECTED.inc(reason)
+        logger.warning(
+            f"リクエストを拒否しました ({reason}): 処理中 {self.active}/{self.max_concurrent}, "
+            f"待ち {len(self._waiters)}/{self.max_queue}"
+        )
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """受付制御の統計を取得"""
+        return {
+            'active': self.active,
+            'queue_depth': len(self._waiters),
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+            'max_wait_seconds': self.max_wait,
+            'estimated_wait_seconds': round(self.estimated_wait(), 3),
+            'avg_service_seconds': round(self._service_seconds or 0.0, 3),
+            'rate_limit_per_minute': config.RATE_LIMIT_PER_MINUTE,
+            'tracked_clients': len(self.rate_limiter._buckets),
+            'admitted': self.stats['admitted'],
+            'queued': self.stats['queued'],
+            'rejected': dict(self.stats['rejected'])
+        }
+
+
+# グローバルインスタンス
+_admission_controller = None
+
+def get_admission_controller() -> AdmissionController:
+    """受付制御のグローバルインスタンスを取得"""
+    global _admission_controller
+    if _admission_controller is None:
+        _admission_controller = AdmissionController()
+    return _admission_controller
@@ -3,18 +3,30 @@
 質問応答処理の中核となるエージェント
 """
 
+import asyncio
 import time
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional
 from datetime import datetime
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
+from .compression import compress_content
 from .configs import config
 from .custom_logger import get_module_logger
+from .deadline import (
+    Deadline, DeadlineExceeded, iterate_with_deadline, record_deadline_exceeded,
+    resolve_timeout, run_with_deadline, set_deadline
+)
+from .index_registry import get_index_registry
 from .models import (
     QuestionRequest, AnswerResponse, SearchResult, 
     ErrorResponse
 )
+from .metrics import FOLLOWUP_RETRIEVAL, LLM_REQUEST_SECONDS, LLM_TOKENS
+from .mmr import mmr_select
 from .prompts import prompts
+from .sessions import CachedRetrieval, ChatSession, ConversationTurn, cosine_similarity, previous_turn_ids
+from .timing import finish_request, span, start_request
+from .tokenizer import get_token_counter
 from tool import get_unified_search_engine
 
 logger = get_module_logger("agent")
@@ -25,7 +37,17 @@ class SupportAgent:
     
     def __init__(self):
         self.openai_client = None
+        self.async_openai_client = None
         self.search_engine = None
+        self.token_stats = {
+            'requests': 0,
+            'prompt_tokens': 0,
+            'context_tokens': 0,
+            'context_tokens_original': 0,
+            'completion_tokens': 0,
+            'results_truncated': 0,
+            'results_dropped': 0
+        }
         self._initialize()
     
     def _initialize(self):
@@ -35,6 +57,8 @@ class SupportAgent:
             
             # OpenAIクライアントを初期化
             self.openai_client = OpenAI(api_key=config.OPENAI_API_KEY)
+            # 回答生成用（処理期限・切断時に呼び出しを取り消せるよう非同期クライアントを使う）
+            self.async_openai_client = AsyncOpenAI(api_key=config.OPENAI_API_KEY)
             
             # 統合検索エンジンを取得
             self.search_engine = get_unified_search_engine()
@@ -68,50 +92,105 @@ class SupportAgent:
     
     async def process_question(
         self, 
-        question_request: QuestionRequest
+        question_request: QuestionRequest,
+        deadline: Optional[Deadline] = None,
+        session: Optional[ChatSession] = None
     ) -> AnswerResponse:
         """
         質問を処理して回答を生成
         
+        処理期限は検索（埋め込み・ベクトル検索）とLLM呼び出しに引き継がれる。
+        LLMを呼ぶ時間が残っていない場合は、上位のFAQの回答をそのまま返す。
+        会話セッションを指定した場合は、context の previous_turn_ids で
+        参照するやり取り（省略時は直近）の検索結果と内容を引き継ぐ。
+        
         Args:
             question_request: 質問リクエスト
+            deadline: 処理期限（省略時は context の timeout_seconds または既定値）
+            session: 会話セッション（単発の質問はNone）
         
         Returns:
             回答レスポンス
         """
         start_time = time.time()
+        timer = start_request()
         
         try:
             question = question_request.question
             context = question_request.context or {}
             
-            logger.info(f"質問を処理中: '{question}'")
+            if deadline is None:
+                deadline = Deadline(resolve_timeout(context=context))
+            set_deadline(deadline)
             
-            # 1. 検索実行
-            search_results, search_strategy = await self._search_knowledge_base(
-                question, context
-            )
+            logger.info(f"質問を処理中: '{question}' (処理期限: {deadline.remaining():.1f}秒)")
             
-            # 2. 回答生成
-            if search_results:
-                answer, confidence = await self._generate_answer_with_sources(
-                    question, search_results, search_strategy
+            # 1. 検索実行（会話の続きであれば参照するやり取りの検索結果を使う）
+            search_results, search_strategy = [], "error"
+            query_embedding = retrieval = decision = None
+            turns = session.referenced_turns(previous_turn_ids(context)) if session is not None else []
+            answer_metadata = None
+            try:
+                with span("search"):
+                    if session is not None:
+                        search_results, search_strategy, query_embedding, retrieval, decision = (
+                            await self._retrieve_for_session(question, context, session, turns)
+                        )
+                    else:
+                        search_results, search_strategy = await self._search_knowledge_base(
+                            question, context
+                        )
+                
+                # LLMを呼ぶ時間が残っていなければ呼ばずに縮退する
+                if deadline.remaining() < config.DEADLINE_MIN_LLM_SECONDS:
+                    raise DeadlineExceeded("llm_budget")
+                
+                # 2. 回答生成
+                if search_results:
+                    answer, confidence, answer_metadata = await self._generate_answer_with_sources(
+                        question, search_results, search_strategy,
+                        history=session.history_messages(turns) if session is not None else None
+                    )
+                else:
+                    with span("llm"):
+                        answer, confidence = await self._generate_no_results_answer(question)
+            
+            except DeadlineExceeded as e:
+                record_deadline_exceeded(e)
+                answer, confidence, answer_metadata = self._degraded_answer(
+                    search_results, search_strategy, e.stage
                 )
-            else:
-                answer, confidence = await self._generate_no_results_answer(question)
-                search_results = []
+            
+            # 会話のやり取りとして記録（次の質問で turn_id を指定して参照する）
+            if session is not None:
+                turn_id = session.new_turn_id()
+                session.add_turn(ConversationTurn(
+                    turn_id, question, answer, query_embedding, search_results, search_strategy, retrieval
+                ))
+                answer_metadata = {
+                    **(answer_metadata or {}),
+                    'session_id': session.session_id,
+                    'turn_id': turn_id,
+                    'retrieval': decision or 'error'
+                }
             
             # 3. レスポンス作成
             processing_time = time.time() - start_time
+            timings = finish_request(timer)
             
             response = AnswerResponse(
                 answer=answer,
                 confidence=confidence,
                 sources=search_results,
-                processing_time=processing_time
+                processing_time=processing_time,
+                metadata=answer_metadata,
+                timings=timings
             )
             
-            logger.info(f"質問処理完了: {processing_time:.2f}秒, 信頼度: {confidence:.2f}")
+            logger.info(
+                f"質問処理完了: {processing_time:.2f}秒, 信頼度: {confidence:.2f} "
+                f"(段階別: {', '.join(f'{name}={elapsed:.0f}ms' for name, elapsed in timings.items())})"
+            )
             return response
             
         except Exception as e:
@@ -123,20 +202,336 @@ class SupportAgent:
                 answer="申し訳ございませんが、システムエラーが発生しました。しばらく待ってから再度お試しください。",
                 confidence=0.0,
                 sources=[],
-                processing_time=processing_time
+                processing_time=processing_time,
+                timings=finish_request(timer)
             )
     
+    async def stream_question(
+        self,
+        question_request: QuestionRequest,
+        session: ChatSession,
+        deadline: Optional[Deadline] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        会話セッションの質問を処理し、回答を生成しながら逐次返す
+        
+        話題が続いている（前回検索した質問とクエリ埋め込みが近い）場合は
+        検索をせずに前回の検索結果を使う。回答の生成には直近のやり取り
+        （context の previous_turn_ids で指定したやり取り）を含める。
+        処理期限の扱いは process_question と同じで、生成の途中で期限を
+        過ぎた場合はそこまでの回答を返す。
+        
+        Args:
+            question_request: 質問リクエスト
+            session: 会話セッション
+            deadline: 処理期限（省略時は context の timeout_seconds または既定値）
+        
+        Yields:
+            {"type": "sources", ...}: 回答に使う検索結果と検索方法、やり取りのID
+            {"type": "delta", "content": ...}: 回答の断片
+            {"type": "done", "response": AnswerResponse}: 最終的な回答
+        """
+        start_time = time.time()
+        timer = start_request()
+        question = question_request.question
+        context = question_request.context or {}
+        
+        if deadline is None:
+            deadline = Deadline(resolve_timeout(context=context))
+        set_deadline(deadline)
+        
+        logger.info(f"会話の質問を処理中: '{question}' (セッション: {session.session_id}, 処理期限: {deadline.remaining():.1f}秒)")
+        
+        search_results, search_strategy = [], "error"
+        query_embedding = retrieval = None
+        turn_id = session.new_turn_id()
+        turns = session.referenced_turns(previous_turn_ids(context))
+        answer_parts: List[str] = []
+        answer_metadata: Dict[str, Any] = {'session_id': session.session_id, 'turn_id': turn_id}
+        failed = False
+        
+        try:
+            # 1. 検索（話題が続いていれば参照するやり取りの検索結果を再利用・再順位付け）
+            try:
+                with span("search"):
+                    search_results, search_strategy, query_embedding, retrieval, decision = (
+                        await self._retrieve_for_session(question, context, session, turns)
+                    )
+                answer_metadata['retrieval'] = decision
+                yield {
+                    "type": "sources",
+                    "turn_id": turn_id,
+                    "sources": search_results,
+                    "search_strategy": search_strategy,
+                    "retrieval": decision
+                }
+                
+                # LLMを呼ぶ時間が残っていなければ呼ばずに縮退する
+                if deadline.remaining() < config.DEADLINE_MIN_LLM_SECONDS:
+                    raise DeadlineExceeded("llm_budget")
+                
+                # 2. 回答生成（断片ごとに送信）
+                async for delta in self._stream_answer(
+                    question, search_results, session.history_messages(turns), answer_metadata
+                ):
+                    answer_parts.append(delta)
+                    yield {"type": "delta", "content": delta}
+                
+                if answer_metadata.get('error'):
+                    confidence = 0.0
+                elif search_results:
+                    confidence = self._calculate_confidence(search_results, search_strategy)
+                else:
+                    confidence = 0.1  # 検索結果なしの回答
+            
+            except DeadlineExceeded as e:
+                record_deadline_exceeded(e)
+                if answer_parts:
+                    # 生成の途中で期限を過ぎた場合はそこまでの回答を返す
+                    answer_metadata.update({'degraded': 'deadline', 'deadline_stage': e.stage, 'truncated': True})
+                    confidence = self._calculate_confidence(search_results, search_strategy)
+                else:
+                    answer, confidence, degraded = self._degraded_answer(search_results, search_strategy, e.stage)
+                    answer_metadata.update(degraded)
+                    answer_parts.append(answer)
+                    yield {"type": "delta", "content": answer}
+        
+        except Exception as e:
+            logger.error(f"会話の質問処理に失敗しました: {e}")
+            failed = True
+            search_results, confidence = [], 0.0
+            answer_parts = ["申し訳ございませんが、システムエラーが発生しました。しばらく待ってから再度お試しください。"]
+        
+        # 3. レスポンス作成（done の回答が最終的な回答）
+        answer = "".join(answer_parts).strip()
+        processing_time = time.time() - start_time
+        response = AnswerResponse(
+            answer=answer,
+            confidence=confidence,
+            sources=search_results,
+            processing_time=processing_time,
+            metadata=answer_metadata,
+            timings=finish_request(timer)
+        )
+        
+        if not failed:
+            session.add_turn(ConversationTurn(
+                turn_id, question, answer, query_embedding, search_results, search_strategy, retrieval
+            ))
+        
+        logger.info(
+            f"会話の質問処理完了: {processing_time:.2f}秒, 信頼度: {confidence:.2f}, "
+            f"検索: {answer_metadata.get('retrieval', 'error')}"
+        )
+        yield {"type": "done", "response": response}
+    
+    async def _retrieve_for_session(
+        self,
+        question: str,
+        context: Dict[str, Any],
+        session: ChatSession,
+        turns: List[ConversationTurn]
+    ) -> tuple[List[SearchResult], str, Optional[List[float]], Optional[CachedRetrieval], str]:
+        """
+        会話中の質問の検索結果を取得
+        
+        参照するやり取りの検索結果ごとに、検索した質問とのクエリ埋め込みの
+        類似度を求めて検索方法を決める。
+        
+        - SESSION_REUSE_SIMILARITY 以上: 最も近い検索結果をそのまま再利用
+        - SESSION_RERANK_SIMILARITY 以上: 参照する検索結果をまとめて新しい質問との
+          類似度で並べ替え、上位 SESSION_RERANK_TOP_K 件を使う（検索はしない）
+        - それ未満: 通常どおり検索
+        
+        比較の基準は再利用した質問ではなく検索した質問とし、話題が少しずつ
+        ずれていく場合に古い検索結果を使い続けないようにする。
+        インデックスの切り替え・更新より前の検索結果は再利用・並べ替えに使わない。
+        
+        Returns:
+            (検索結果, 検索戦略, クエリ埋め込み, 元の検索結果,
+             検索方法 "reused" / "reranked" / "searched")
+        
+        Raises:
+            DeadlineExceeded: 処理期限までに検索が完了しなかった
+        """
+        query_embedding = session.cached_embedding(question)
+        if query_embedding is None:
+            # 検索エンジンは直前のクエリの埋め込みを保持するため、検索時に再計算しない
+            query_embedding = await run_with_deadline(
+                asyncio.to_thread(self.search_engine.encode_query, question),
+                "embed"
+            )
+            session.cache_embedding(question, query_embedding)
+        
+        # 削除・更新されたドキュメントを返さないよう、現在のインデックスで検索した結果のみ使う
+        index_token = get_index_registry().current_token()
+        
+        # 再利用したやり取りは同じ検索結果を指すため、重複を除いて比較する
+        retrievals: List[CachedRetrieval] = []
+        for turn in turns:
+            retrieval = turn.retrieval
+            if retrieval is None or retrieval.index_token != index_token:
+                continue
+            if all(retrieval is not seen for seen in retrievals):
+                retrievals.append(retrieval)
+        
+        best, similarity = None, 0.0
+        for retrieval in retrievals:
+            retrieval_similarity = cosine_similarity(query_embedding, retrieval.anchor_embedding)
+            if retrieval_similarity > similarity:
+                best, similarity = retrieval, retrieval_similarity
+        
+        if best is not None and similarity >= config.SESSION_REUSE_SIMILARITY:
+            FOLLOWUP_RETRIEVAL.inc("reused")
+            logger.info(f"前回の検索結果を再利用します: {len(best.results)}件 (類似度: {similarity:.3f})")
+            return best.results, best.strategy, query_embedding, best, "reused"
+        
+        if best is not None and similarity >= config.SESSION_RERANK_SIMILARITY:
+            reranked = await self._rerank_cached_results(query_embedding, retrievals)
+            if reranked:
+                FOLLOWUP_RETRIEVAL.inc("reranked")
+                logger.info(
+                    f"会話中の検索結果を並べ替えて使います: {len(reranked)}件 "
+                    f"(候補 {sum(len(retrieval.results) for retrieval in retrievals)}件, 類似度: {similarity:.3f})"
+                )
+                return reranked, best.strategy, query_embedding, best, "reranked"
+        
+        search_results, strategy = await self._search_knowledge_base(question, context)
+        retrieval = (
+            CachedRetrieval(query_embedding, search_results, strategy, index_token)
+            if search_results else None
+        )
+        FOLLOWUP_RETRIEVAL.inc("searched")
+        return search_results, strategy, query_embedding, retrieval, "searched"
+    
+    async def _rerank_cached_results(
+        self,
+        query_embedding: List[float],
+        retrievals: List[CachedRetrieval]
+    ) -> List[SearchResult]:
+        """
+        会話中の検索結果を新しい質問とのドキュメント埋め込みの類似度で並べ替え
+        
+        スコアは検索時の値のまま残し、新しい質問との類似度は
+        metadata['followup_similarity'] に記録する（保持している検索結果は変更しない）。
+        
+        Returns:
+            上位 SESSION_RERANK_TOP_K 件の検索結果（埋め込みがなければ空）
+        """
+        candidates: Dict[str, SearchResult] = {}
+        for retrieval in retrievals:
+            for result in retrieval.results:
+                key = (result.metadata or {}).get('doc_id') or f"{result.source}\n{result.content}"
+                candidates.setdefault(key, result)
+        
+        pool = list(candidates.values())
+        if any(result.embedding is None for result in pool):
+            # 語彙検索のみでヒットした結果はベクトルDBに保存済みの埋め込みを使う
+            await run_with_deadline(asyncio.to_thread(self.search_engine.attach_embeddings, pool), "search")
+        
+        scored = [
+            (cosine_similarity(query_embedding, result.embedding), result)
+            for result in pool
+            if result.embedding is not None
+        ]
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [
+            result.model_copy(update={'metadata': {**(result.metadata or {}), 'followup_similarity': similarity}})
+            for similarity, result in scored[:config.SESSION_RERANK_TOP_K]
+        ]
+    
+    async def _stream_answer(
+        self,
+        question: str,
+        search_results: List[SearchResult],
+        history: List[Dict[str, str]],
+        answer_metadata: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        """
+        直近のやり取りを含めて回答を生成し、断片ごとに返す
+        
+        生成に失敗した場合は answer_metadata['error'] を設定する。
+        
+        Raises:
+            DeadlineExceeded: 処理期限までに回答を生成できなかった
+        """
+        yielded = False
+        try:
+            if search_results:
+                prompt, token_usage = self._prepare_answer_prompt(question, search_results)
+                kind, max_tokens = "answer", config.ANSWER_MAX_TOKENS
+            else:
+                prompt, token_usage = prompts.generate_no_results_prompt(question), None
+                kind, max_tokens = "no_results", 400
+            
+            messages = [
+                {"role": "system", "content": prompts.SYSTEM_ROLE},
+                *history,
+                {"role": "user", "content": prompt}
+            ]
+            
+            usage = None
+            with span("llm"), LLM_REQUEST_SECONDS.time(kind):
+                stream = await run_with_deadline(
+                    self.async_openai_client.chat.completions.create(
+                        model=config.OPENAI_MODEL,
+                        messages=messages,
+                        temperature=0.3,
+                        max_tokens=max_tokens,
+                        stream=True,
+                        stream_options={"include_usage": True}
+                    ),
+                    "llm"
+                )
+                try:
+                    async for chunk in iterate_with_deadline(stream, "llm"):
+                        if chunk.usage is not None:
+                            usage = chunk.usage
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            yielded = True
+                            yield chunk.choices[0].delta.content
+                finally:
+                    await stream.close()
+            
+            if token_usage is not None:
+                self._add_history_tokens(token_usage, history)
+                if usage is not None:
+                    token_usage['api_prompt_tokens'] = usage.prompt_tokens
+                    token_usage['completion_tokens'] = usage.completion_tokens
+                token_usage['max_completion_tokens'] = max_tokens
+                self._record_token_usage(token_usage)
+                answer_metadata['tokens'] = token_usage
+            elif usage is not None:
+                LLM_TOKENS.inc("prompt", amount=usage.prompt_tokens)
+                LLM_TOKENS.inc("completion", amount=usage.completion_tokens)
+            
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"回答の逐次生成に失敗しました: {e}")
+            answer_metadata['error'] = 'generation'
+            if not yielded:
+                yield "回答の生成中にエラーが発生しました。"
+    
     async def _search_knowledge_base(
         self, 
         question: str, 
         context: Dict[str, Any]
     ) -> tuple[List[SearchResult], str]:
-        """ナレッジベースを検索"""
+        """
+        ナレッジベースを検索
+        
+        検索（埋め込み・ベクトルDBへの問い合わせ）はブロックするため
+        スレッドで実行し、処理期限を過ぎたら待たずに打ち切る。
+        
+        Raises:
+            DeadlineExceeded: 処理期限までに検索が完了しなかった
+        """
         try:
-            # スマート検索を実行
-            search_results, strategy = self.search_engine.smart_search(
-                query=question,
-                context=context
+            # スマート検索を実行（計測器・処理期限のコンテキストはスレッドに引き継がれる）
+            search_results, strategy = await run_with_deadline(
+                asyncio.to_thread(self.search_engine.smart_search, query=question, context=context),
+                "search"
             )
             
             logger.info(f"検索完了: {len(search_results)}件 (戦略: {strategy})")
@@ -147,6 +542,8 @@ class SupportAgent:
             
             return search_results, strategy
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"ナレッジベース検索に失敗しました: {e}")
             return [], "error"
@@ -155,79 +552,238 @@ class SupportAgent:
         self, 
         question: str, 
         search_results: List[SearchResult],
-        search_strategy: str
-    ) -> tuple[str, float]:
-        """検索結果を基に回答を生成"""
+        search_strategy: str,
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> tuple[str, float, Optional[Dict[str, Any]]]:
+        """
+        検索結果を基に回答を生成
+        
+        Args:
+            history: 会話のやり取り（LLMのメッセージ形式、単発の質問はNone）
+        
+        Returns:
+            (回答, 信頼度, トークン数などの詳細)
+        
+        Raises:
+            DeadlineExceeded: 処理期限までに回答を生成できなかった
+        """
         try:
-            # 検索結果をソース別に分類
-            faq_results = [r for r in search_results if r.metadata.get('type') == 'faq']
-            manual_results = [r for r in search_results if r.metadata.get('type') == 'manual']
-            
-            # プロンプトを選択
-            if faq_results and manual_results:
-                # 複数ソース統合プロンプト
-                prompt = prompts.generate_multi_source_prompt(
-                    question=question,
-                    faq_results=faq_results,
-                    manual_results=manual_results
+            prompt, token_usage = self._prepare_answer_prompt(question, search_results)
+            history = history or []
+            if history:
+                self._add_history_tokens(token_usage, history)
+            
+            # OpenAIで回答生成（処理期限を過ぎたら取り消す）
+            with span("llm"), LLM_REQUEST_SECONDS.time("answer"):
+                response = await run_with_deadline(
+                    self.async_openai_client.chat.completions.create(
+                        model=config.OPENAI_MODEL,
+                        messages=[
+                            {"role": "system", "content": prompts.SYSTEM_ROLE},
+                            *history,
+                            {"role": "user", "content": prompt}
+                        ],
+                        temperature=0.3,
+                        max_tokens=config.ANSWER_MAX_TOKENS
+                    ),
+                    "llm"
                 )
-            elif faq_results:
-                # FAQ専用プロンプト
-                prompt = prompts.generate_faq_prompt(question, faq_results)
-            elif manual_results:
-                # マニュアル専用プロンプト
-                prompt = prompts.generate_manual_prompt(question, manual_results)
-            else:
-                # 結果なしプロンプト
-                prompt = prompts.generate_no_results_prompt(question)
-            
-            # OpenAIで回答生成
-            response = self.openai_client.chat.completions.create(
-                model=config.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": prompts.SYSTEM_ROLE},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=800
-            )
             
             answer = response.choices[0].message.content.strip()
             
+            # APIが返した実際のトークン数を記録
+            if response.usage is not None:
+                token_usage['api_prompt_tokens'] = response.usage.prompt_tokens
+                token_usage['completion_tokens'] = response.usage.completion_tokens
+            token_usage['max_completion_tokens'] = config.ANSWER_MAX_TOKENS
+            self._record_token_usage(token_usage)
+            
             # 信頼度を計算
             confidence = self._calculate_confidence(search_results, search_strategy)
             
-            logger.info(f"回答生成完了: {len(answer)}文字, 信頼度: {confidence:.2f}")
-            return answer, confidence
+            logger.info(
+                f"回答生成完了: {len(answer)}文字, 信頼度: {confidence:.2f}, "
+                f"プロンプト {token_usage['prompt_tokens']}トークン "
+                f"(検索結果 {token_usage['context_tokens']}/{token_usage['context_budget']})"
+            )
+            return answer, confidence, {'tokens': token_usage}
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"回答生成に失敗しました: {e}")
-            return "回答の生成中にエラーが発生しました。", 0.0
+            return "回答の生成中にエラーが発生しました。", 0.0, None
+    
+    def _prepare_answer_prompt(
+        self,
+        question: str,
+        search_results: List[SearchResult]
+    ) -> tuple[str, Dict[str, Any]]:
+        """
+        検索結果を多様化・圧縮してトークン予算内の回答生成用プロンプトを構築
+        
+        Returns:
+            (プロンプト, トークン数の内訳)
+        """
+        # 内容の重複した検索結果を除外
+        with span("mmr"):
+            prompt_results = self._diversify_results(search_results)
+        
+        # 質問に関係する文だけを残して検索結果を圧縮
+        with span("compress"):
+            prompt_results, compressed_count = self._compress_results(question, prompt_results)
+        
+        # トークン予算内でプロンプトを構築
+        with span("prompt"):
+            prompt, token_usage = prompts.build_answer_prompt(question, prompt_results)
+        token_usage['results_compressed'] = compressed_count
+        return prompt, token_usage
+    
+    def _add_history_tokens(self, token_usage: Dict[str, Any], history: List[Dict[str, str]]):
+        """会話のやり取りのトークン数をプロンプトのトークン数に加える"""
+        counter = get_token_counter()
+        token_usage['history_tokens'] = sum(counter.count(message['content']) for message in history)
+        token_usage['prompt_tokens'] += token_usage['history_tokens']
+    
+    def _diversify_results(self, search_results: List[SearchResult]) -> List[SearchResult]:
+        """MMRで関連性を保ちつつ重複の少ない検索結果を選択"""
+        if not config.MMR_ENABLED or len(search_results) <= 1:
+            return search_results
+        
+        try:
+            self.search_engine.attach_embeddings(search_results)
+            selected = mmr_select(search_results)
+            
+            if len(selected) < len(search_results):
+                logger.info(f"検索結果を多様化しました: {len(search_results)}件 -> {len(selected)}件")
+            return selected
+            
+        except Exception as e:
+            logger.error(f"検索結果の多様化に失敗しました: {e}")
+            return search_results
+    
+    def _compress_results(
+        self,
+        question: str,
+        search_results: List[SearchResult]
+    ) -> tuple[List[SearchResult], int]:
+        """
+        抽出型圧縮で検索結果の内容を質問に関係する文に絞る
+        
+        元の検索結果（レスポンスのsources）は変更せず、プロンプト用の
+        コピーの内容だけを置き換える。完全一致の結果は圧縮しない。
+        
+        Returns:
+            (プロンプト用の検索結果, 圧縮した件数)
+        """
+        if not config.COMPRESSION_ENABLED or not search_results:
+            return search_results, 0
+        
+        try:
+            self.search_engine.attach_embeddings(search_results)
+            query_embedding = None
+            
+            compressed_results = []
+            original_chars = compressed_chars = 0
+            for result in search_results:
+                if result.sentence_data is None or (result.metadata or {}).get('match_type') == 'exact':
+                    compressed_results.append(result)
+                    continue
+                
+                if query_embedding is None:
+                    query_embedding = self.search_engine.encode_query(question)
+                
+                content = compress_content(result, query_embedding)
+                if content is None:
+                    compressed_results.append(result)
+                    continue
+                
+                original_chars += len(result.content)
+                compressed_chars += len(content)
+                compressed_results.append(result.model_copy(update={'content': content}))
+            
+            compressed_count = sum(
+                1 for original, result in zip(search_results, compressed_results) if original is not result
+            )
+            if compressed_count:
+                logger.info(
+                    f"検索結果を圧縮しました: {compressed_count}件, "
+                    f"{original_chars}文字 -> {compressed_chars}文字"
+                )
+            return compressed_results, compressed_count
+            
+        except Exception as e:
+            logger.error(f"検索結果の圧縮に失敗しました: {e}")
+            return search_results, 0
     
     async def _generate_no_results_answer(self, question: str) -> tuple[str, float]:
-        """検索結果がない場合の回答を生成"""
+        """
+        検索結果がない場合の回答を生成
+        
+        Raises:
+            DeadlineExceeded: 処理期限までに回答を生成できなかった
+        """
         try:
             prompt = prompts.generate_no_results_prompt(question)
             
-            response = self.openai_client.chat.completions.create(
-                model=config.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": prompts.SYSTEM_ROLE},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=400
-            )
+            with LLM_REQUEST_SECONDS.time("no_results"):
+                response = await run_with_deadline(
+                    self.async_openai_client.chat.completions.create(
+                        model=config.OPENAI_MODEL,
+                        messages=[
+                            {"role": "system", "content": prompts.SYSTEM_ROLE},
+                            {"role": "user", "content": prompt}
+                        ],
+                        temperature=0.3,
+                        max_tokens=400
+                    ),
+                    "llm"
+                )
             
             answer = response.choices[0].message.content.strip()
+            if response.usage is not None:
+                LLM_TOKENS.inc("prompt", amount=response.usage.prompt_tokens)
+                LLM_TOKENS.inc("completion", amount=response.usage.completion_tokens)
             
             logger.info("検索結果なし回答を生成しました")
             return answer, 0.1  # 低い信頼度
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"検索結果なし回答の生成に失敗しました: {e}")
             return prompts.generate_no_results_prompt(question), 0.0
     
+    def _degraded_answer(
+        self,
+        search_results: List[SearchResult],
+        search_strategy: str,
+        stage: str
+    ) -> tuple[str, float, Dict[str, Any]]:
+        """
+        処理期限までにLLMで回答できない場合の回答
+        
+        検索結果に含まれる最上位のFAQの回答をそのまま返す。
+        FAQがない場合は参照先の確認を促す定型文を返す。
+        
+        Returns:
+            (回答, 信頼度, 縮退の詳細)
+        """
+        metadata = {'degraded': 'deadline', 'deadline_stage': stage}
+        
+        for result in search_results:
+            result_metadata = result.metadata or {}
+            if result_metadata.get('type') == 'faq' and result_metadata.get('answer'):
+                metadata['degraded_source'] = result.source
+                confidence = self._calculate_confidence([result], search_strategy)
+                return result_metadata['answer'], confidence, metadata
+        
+        if search_results:
+            answer = "回答の生成が時間内に完了しませんでした。以下の参照先をご確認ください。"
+        else:
+            answer = "申し訳ございませんが、時間内に回答できませんでした。しばらく待ってから再度お試しください。"
+        return answer, 0.0, metadata
+    
     def _calculate_confidence(
         self, 
         search_results: List[SearchResult],
@@ -241,16 +797,24 @@ class SupportAgent:
         max_score = max(result.score for result in search_results)
         avg_score = sum(result.score for result in search_results) / len(search_results)
         
-        # 結果数による調整
-        result_count_factor = min(len(search_results) / 3.0, 1.0)
+        # 結果数による調整（完全一致は1件で十分）
+        if search_strategy == "exact_match":
+            result_count_factor = 1.0
+        else:
+            result_count_factor = min(len(search_results) / 3.0, 1.0)
         
-        # 検索戦略による調整
-        strategy_factor = {
+        # 検索戦略による調整（辞書で追加された戦略は基本戦略の値を使う）
+        strategy_factors = {
+            "exact_match": 1.0,
             "faq_focus": 0.9,
             "manual_focus": 0.8,
             "balanced": 0.85,
             "error": 0.3
-        }.get(search_strategy, 0.7)
+        }
+        strategy_factor = strategy_factors.get(
+            search_strategy,
+            strategy_factors.get(self.search_engine.get_strategy_focus(search_strategy), 0.7)
+        )
         
         # 信頼度を計算
         confidence = (max_score * 0.6 + avg_score * 0.4) * result_count_factor * strategy_factor
@@ -296,6 +860,46 @@ class SupportAgent:
                 "error": str(e)
             }
     
+    def reload_keyword_dictionaries(self) -> Dict[str, Any]:
+        """検索戦略のキーワード辞書を読み込み直す"""
+        classifier = self.search_engine.keyword_classifier
+        reloaded = classifier.reload(force=True)
+        return {
+            "reloaded": reloaded,
+            **classifier.get_summary()
+        }
+    
+    def _record_token_usage(self, token_usage: Dict[str, Any]):
+        """リクエストごとのトークン数を集計"""
+        stats = self.token_stats
+        stats['requests'] += 1
+        stats['prompt_tokens'] += token_usage.get('api_prompt_tokens', token_usage['prompt_tokens'])
+        stats['context_tokens'] += token_usage['context_tokens']
+        stats['context_tokens_original'] += token_usage['context_tokens_original']
+        stats['completion_tokens'] += token_usage.get('completion_tokens', 0)
+        stats['results_truncated'] += token_usage['results_truncated']
+        stats['results_dropped'] += token_usage['results_dropped']
+        
+        LLM_TOKENS.inc("prompt", amount=token_usage.get('api_prompt_tokens', token_usage['prompt_tokens']))
+        LLM_TOKENS.inc("completion", amount=token_usage.get('completion_tokens', 0))
+    
+    def get_token_stats(self) -> Dict[str, Any]:
+        """トークン数の統計を取得"""
+        stats = dict(self.token_stats)
+        requests = stats['requests']
+        stats['avg_prompt_tokens'] = stats['prompt_tokens'] / requests if requests else 0.0
+        stats['avg_completion_tokens'] = stats['completion_tokens'] / requests if requests else 0.0
+        stats['context_budget'] = config.PROMPT_CONTEXT_TOKEN_BUDGET
+        return stats
+    
+    def get_search_stats(self) -> Dict[str, Any]:
+        """検索の統計情報を取得"""
+        try:
+            return self.search_engine.get_stats()
+        except Exception as e:
+            logger.error(f"検索統計の取得に失敗しました: {e}")
+            return {}
+    
     async def process_batch_questions(
         self, 
         questions: List[str]
@@ -3,22 +3,41 @@ FastAPIベースのREST API (/ask等)
 RESTful APIエンドポイントの実装
 """
 
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import ValidationError
+from starlette.requests import HTTPConnection
 import uvicorn
 import asyncio
+import time
+from contextlib import aclosing, nullcontext
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import traceback
 
+import orjson
+
 from .configs import config
 from .custom_logger import get_module_logger
 from .models import (
     QuestionRequest, AnswerResponse, ErrorResponse, 
     SystemStatus, ConfigUpdate
 )
+from .admission import AdmissionRejected, get_admission_controller
 from .agent import get_support_agent
+from .deadline import TIMEOUT_HEADER, Deadline, resolve_timeout
+from .http_compression import CompressionMiddleware
+from .index_registry import get_index_registry
+from .metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    HTTP_IN_FLIGHT, HTTP_REQUEST_SECONDS, HTTP_REQUESTS, REQUESTS_CANCELLED, WS_CONNECTIONS,
+    get_metrics_registry
+)
+from .responses import ORJSONResponse, cacheable_response, dumps, make_etag, not_modified
+from .server import PreforkServer
+from .sessions import ChatSession, get_session_store
+from .timing import format_server_timing, get_latency_recorder
 
 logger = get_module_logger("api")
 
@@ -40,6 +59,76 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# レスポンス圧縮（/batch-ask・/stats など大きなJSONの転送量を削減）
+if config.HTTP_COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+
+# 受付制御の対象パス
+ADMISSION_PATHS = frozenset(path.strip() for path in config.ADMISSION_PATHS.split(",") if path.strip())
+
+
+def _client_key(request: HTTPConnection) -> str:
+    """レート制限用のクライアント識別子"""
+    if config.RATE_LIMIT_CLIENT_HEADER:
+        value = request.headers.get(config.RATE_LIMIT_CLIENT_HEADER)
+        if value:
+            # X-Forwarded-For は先頭が元のクライアント
+            return value.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    """
+    重い処理（/ask など）の同時処理数とクライアント別のレートを制限
+    
+    待ち行列が満杯・待ち時間の見積もりが上限を超える場合は 503、
+    レート超過は 429 を Retry-After 付きですぐに返す
+    """
+    if request.url.path not in ADMISSION_PATHS:
+        return await call_next(request)
+    
+    # 待ち行列で待った時間も処理期限に含める
+    request.state.received_at = time.monotonic()
+    
+    controller = get_admission_controller()
+    try:
+        admitted_at = await controller.acquire(_client_key(request))
+    except AdmissionRejected as e:
+        error = ErrorResponse(error=e.message, error_code=e.reason)
+        return JSONResponse(
+            status_code=e.status_code,
+            content=error.model_dump(mode="json"),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    
+    try:
+        return await call_next(request)
+    finally:
+        controller.release(admitted_at)
+
+
+# リクエストのメトリクス
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """エンドポイントごとのリクエスト数と処理時間を記録"""
+    start = time.perf_counter()
+    status = 500
+    HTTP_IN_FLIGHT.inc()
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec()
+        # パスはルートのテンプレートを使う（未定義のパスはまとめる）
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        HTTP_REQUESTS.inc(request.method, path, str(status))
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, request.method, path)
+
+
 # グローバル変数
 support_agent = None
 startup_time = datetime.now()
@@ -89,15 +178,58 @@ async def root():
     }
 
 
-@app.post("/ask", response_model=AnswerResponse)
+async def _wait_for_disconnect(http_request: Request):
+    """クライアントが切断するまで待つ（本文の読み込み後に呼ぶ）"""
+    while True:
+        message = await http_request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def _run_until_disconnected(http_request: Request, deadline: Deadline, coro):
+    """
+    クライアントが切断したら処理を取り消す
+    
+    切断を検知したら処理期限を取り消して（スレッドで実行中の検索も
+    次の段階で打ち切られる）タスクを中止する。
+    
+    Returns:
+        処理結果（切断した場合はNone）
+    """
+    task = asyncio.ensure_future(coro)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(http_request))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if task.done():
+            return task.result()
+        
+        deadline.cancel()
+        task.cancel()
+        REQUESTS_CANCELLED.inc()
+        logger.info("クライアントが切断したため処理を中止しました")
+        return None
+    finally:
+        for pending in (task, watcher):
+            if not pending.done():
+                pending.cancel()
+
+
+@app.post("/ask", response_model=AnswerResponse, response_class=ORJSONResponse)
 async def ask_question(
     request: QuestionRequest,
+    http_request: Request,
     agent = Depends(get_agent)
 ):
     """
     質問回答エンドポイント
     
     メインのAPIエンドポイント：質問を受けて回答を返す
+    処理段階ごとの所要時間を Server-Timing ヘッダーで返す
+    処理期限は X-Request-Timeout ヘッダー（秒）または context の timeout_seconds で指定できる
+    context に session_id・previous_turn_ids を指定すると会話の続きとして扱い、
+    参照したやり取りの検索結果を再利用する（回答の metadata の turn_id を次の質問で指定する）
+    会話はワーカープロセスごとに保持するため、複数ワーカーではスティッキールーティングが必要
+    回答はエージェントが生成した検証済みのモデルのため、再検証せずにorjsonで返す
     """
     try:
         logger.info(f"質問受付: '{request.question}'")
@@ -115,11 +247,31 @@ async def ask_question(
                 detail="質問が長すぎます（1000文字以内）"
             )
         
-        # エージェントで質問を処理
-        response = await agent.process_question(request)
+        # 処理期限（リクエストの受付時点から数える）
+        deadline = Deadline(
+            resolve_timeout(http_request.headers.get(TIMEOUT_HEADER), request.context),
+            started_at=getattr(http_request.state, "received_at", None)
+        )
+        
+        # 会話の続きであればセッションを取得（処理中は破棄しない）
+        store = get_session_store()
+        session = store.get_for_context(request.context or {})
+        
+        # エージェントで質問を処理（クライアントが切断したら中止）
+        with store.in_use(session) if session is not None else nullcontext():
+            response = await _run_until_disconnected(
+                http_request, deadline, agent.process_question(request, deadline=deadline, session=session)
+            )
+        if response is None:
+            # 応答は届かないが、アクセスログ・メトリクス用に 499 とする
+            return Response(status_code=499)
+        
+        headers = {}
+        if response.timings:
+            headers["Server-Timing"] = format_server_timing(response.timings)
         
         logger.info(f"回答完了（信頼度: {response.confidence:.2f}）")
-        return response
+        return ORJSONResponse(response, headers=headers)
         
     except HTTPException:
         raise
@@ -134,10 +286,10 @@ async def ask_question(
             sources=[],
             processing_time=0.0
         )
-        return error_response
+        return ORJSONResponse(error_response)
 
 
-@app.post("/batch-ask", response_model=List[AnswerResponse])
+@app.post("/batch-ask", response_model=List[AnswerResponse], response_class=ORJSONResponse)
 async def batch_ask_questions(
     questions: List[str],
     background_tasks: BackgroundTasks,
@@ -168,7 +320,7 @@ async def batch_ask_questions(
         responses = await agent.process_batch_questions(questions)
         
         logger.info(f"複数回答完了: {len(responses)}件")
-        return responses
+        return ORJSONResponse(responses)
         
     except HTTPException:
         raise
@@ -180,6 +332,137 @@ async def batch_ask_questions(
         )
 
 
+async def _send_event(websocket: WebSocket, event: Dict[str, Any]):
+    """会話のイベントをJSONで送信"""
+    await websocket.send_text(dumps(event).decode("utf-8"))
+
+
+async def _answer_over_websocket(
+    websocket: WebSocket,
+    agent,
+    session: ChatSession,
+    question_request: QuestionRequest,
+    received_at: float
+):
+    """
+    1つの質問を処理し、検索結果・回答の断片・最終的な回答を順に送信
+    
+    /ask と同じ受付制御（同時処理数・レート制限）と処理期限を適用する。
+    送信中にクライアントが切断した場合は処理期限を取り消して打ち切る。
+    """
+    controller = get_admission_controller()
+    try:
+        admitted_at = await controller.acquire(_client_key(websocket))
+    except AdmissionRejected as e:
+        await _send_event(websocket, {
+            "type": "error",
+            "error": e.message,
+            "error_code": e.reason,
+            "retry_after": e.retry_after
+        })
+        return
+    
+    deadline = Deadline(resolve_timeout(context=question_request.context), started_at=received_at)
+    try:
+        with get_session_store().in_use(session):
+            async with aclosing(agent.stream_question(question_request, session, deadline)) as events:
+                async for event in events:
+                    await _send_event(websocket, event)
+    except WebSocketDisconnect:
+        deadline.cancel()
+        REQUESTS_CANCELLED.inc()
+        raise
+    finally:
+        controller.release(admitted_at)
+
+
+@app.websocket("/ws/chat")
+async def chat_websocket(websocket: WebSocket, session_id: Optional[str] = None):
+    """
+    会話エンドポイント（WebSocket）
+    
+    接続ごとに会話セッションを割り当て（session_id を指定すると再開）、
+    直近のやり取り・クエリ埋め込み・検索結果をサーバー側で保持する。
+    話題が続いている追加質問では前回の検索結果を再利用・再順位付けする。
+    
+    クライアントからのメッセージ:
+        {"question": "...", "context": {...}}  質問（QuestionRequest と同じ形式、
+                                               context の previous_turn_ids で参照するやり取りを指定できる）
+        {"type": "reset"}                      会話の内容を消去
+    
+    サーバーからのメッセージ:
+        {"type": "session", ...}  セッションの概要（接続時・消去後）
+        {"type": "sources", ...}  回答に使う検索結果と検索方法（reused / reranked / searched）
+        {"type": "delta", ...}    回答の断片
+        {"type": "done", ...}     最終的な回答（response に AnswerResponse）
+        {"type": "error", ...}    不正なメッセージ・受付制御による拒否
+    """
+    await websocket.accept()
+    if support_agent is None:
+        await _send_event(websocket, {
+            "type": "error",
+            "error": "サポートエージェントが初期化されていません",
+            "error_code": "not_ready"
+        })
+        await websocket.close(code=1013)
+        return
+    
+    store = get_session_store()
+    session, resumed = store.get_or_create(session_id)
+    WS_CONNECTIONS.inc()
+    logger.info(f"会話を開始しました: {session.session_id} (再開: {resumed})")
+    
+    try:
+        await _send_event(websocket, {"type": "session", "resumed": resumed, **session.summary()})
+        
+        while True:
+            raw_message = await websocket.receive_text()
+            received_at = time.monotonic()
+            store.keep_alive(session)
+            
+            try:
+                message = orjson.loads(raw_message)
+                if not isinstance(message, dict):
+                    raise ValueError("JSONオブジェクトではありません")
+            except ValueError:
+                await _send_event(websocket, {
+                    "type": "error",
+                    "error": "メッセージはJSONオブジェクトで送信してください",
+                    "error_code": "invalid_message"
+                })
+                continue
+            
+            if message.get("type") == "reset":
+                session.reset()
+                await _send_event(websocket, {"type": "session", "resumed": False, **session.summary()})
+                continue
+            
+            try:
+                question_request = QuestionRequest.model_validate(message)
+            except ValidationError as e:
+                await _send_event(websocket, {
+                    "type": "error",
+                    "error": "質問の形式が正しくありません",
+                    "error_code": "invalid_request",
+                    "details": e.errors(include_url=False, include_context=False)
+                })
+                continue
+            
+            await _answer_over_websocket(websocket, support_agent, session, question_request, received_at)
+            store.keep_alive(session)
+    
+    except WebSocketDisconnect:
+        logger.info(f"会話の接続が切断されました: {session.session_id} ({len(session.turns)}往復)")
+    except Exception as e:
+        logger.error(f"会話の処理中にエラーが発生しました: {e}")
+        try:
+            await websocket.close(code=1011)
+        except RuntimeError:
+            pass  # 既に切断されている
+    finally:
+        WS_CONNECTIONS.dec()
+
+
 @app.get("/health", response_model=SystemStatus)
 async def health_check(agent = Depends(get_agent)):
     """
@@ -237,6 +520,21 @@ async def get_statistics(agent = Depends(get_agent)):
         agent_status = agent.get_system_status()
         stats.update(agent_status)
         
+        # 検索統計（FAQ完全一致のヒット率など）
+        stats["search_stats"] = agent.get_search_stats()
+        
+        # トークン数の統計
+        stats["token_stats"] = agent.get_token_stats()
+        
+        # 受付制御（待ち行列の長さ・拒否数）
+        stats["admission_stats"] = get_admission_controller().get_stats()
+        
+        # 処理段階ごとの所要時間の分布（p50/p95/p99）
+        stats["latency_stats"] = get_latency_recorder().get_stats()
+        
+        # 会話セッション（/ws/chat）
+        stats["session_stats"] = get_session_store().get_stats()
+        
         return stats
         
     except Exception as e:
@@ -247,6 +545,94 @@ async def get_statistics(agent = Depends(get_agent)):
         )
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    メトリクスエンドポイント
+    
+    Prometheusのテキスト形式でカウンター・ヒストグラムを返す
+    （/stats と異なり外部APIの疎通確認は行わない）
+    複数ワーカーでは応答したワーカーの値のみを返す（support_bot_worker_start_time_seconds の
+    pid で区別し、ワーカーごとにスクレイプするか pid を除いて合算する）
+    """
+    return PlainTextResponse(
+        get_metrics_registry().render(),
+        media_type=METRICS_CONTENT_TYPE
+    )
+
+
+@app.get("/index/status")
+async def get_index_status(request: Request):
+    """
+    インデックス状態エンドポイント
+    
+    アクティブなコレクション・履歴・最新のバージョンを返す。
+    ETagが一致する場合（インデックスが更新されていない場合）は304を返す
+    """
+    try:
+        registry = get_index_registry()
+        alias_state = registry.read()
+        version_state = registry.read_version()
+        active, version = registry.current_token()
+        
+        etag = make_etag(
+            "index_status", active, version,
+            alias_state.get("updated_at"), version_state.get("updated_at")
+        )
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+        
+        changed_ids = version_state.get("changed_ids")
+        status = {
+            "alias": registry.alias,
+            "active_collection": active,
+            "history": alias_state.get("history", []),
+            "activated_at": alias_state.get("updated_at"),
+            "version": version,
+            "version_updated_at": version_state.get("updated_at"),
+            "changed_documents": len(changed_ids) if changed_ids is not None else None,
+            "changed_files": version_state.get("changed_files", [])
+        }
+        return cacheable_response(status, etag)
+        
+    except Exception as e:
+        logger.error(f"インデックス状態の取得中にエラーが発生しました: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="インデックス状態の取得処理中にエラーが発生しました"
+        )
+
+
+@app.get("/manual/outline")
+async def get_manual_outline(request: Request, agent = Depends(get_agent)):
+    """
+    マニュアル目次エンドポイント
+    
+    インデックスのバージョンをETagとし、更新されていなければ
+    目次を取得し直さずに304を返す
+    """
+    try:
+        etag = make_etag("manual_outline", *get_index_registry().current_token())
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
+        
+        outline = await asyncio.to_thread(agent.search_engine.manual_engine.get_manual_outline)
+        content = {"sections": outline, "total": len(outline)}
+        if not outline:
+            # 取得に失敗した場合に空の目次をキャッシュさせない
+            return ORJSONResponse(content)
+        return cacheable_response(content, etag)
+        
+    except Exception as e:
+        logger.error(f"マニュアル目次の取得中にエラーが発生しました: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="マニュアル目次の取得処理中にエラーが発生しました"
+        )
+
+
 @app.post("/config")
 async def update_config(
     config_update: ConfigUpdate,
@@ -291,6 +677,37 @@ async def update_config(
         )
 
 
+@app.post("/admin/keywords/reload")
+async def reload_keyword_dictionaries(agent = Depends(get_agent)):
+    """
+    キーワード辞書再読み込みエンドポイント
+    
+    検索戦略の分類に使うキーワード辞書を再起動なしで反映する
+    """
+    try:
+        result = agent.reload_keyword_dictionaries()
+        if not result["reloaded"]:
+            raise HTTPException(
+                status_code=422,
+                detail="キーワード辞書の読み込みに失敗しました。辞書ファイルを確認してください"
+            )
+        
+        logger.info(f"キーワード辞書を再読み込みしました: {result['keyword_count']}キーワード")
+        return {
+            **result,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"キーワード辞書の再読み込み中にエラーが発生しました: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="キーワード辞書の再読み込み処理中にエラーが発生しました"
+        )
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """グローバル例外ハンドラー"""
@@ -329,5 +746,49 @@ def run_server():
         raise
 
 
+def preload_shared_resources():
+    """
+    ワーカー間で共有するリソースを読み込み（フォーク前に呼ぶ）
+    
+    ネットワーク接続を持たないもの（埋め込みモデル・語彙インデックス・
+    完全一致テーブル・キーワード辞書・クロスエンコーダー）のみ読み込む。
+    """
+    from tool import (
+        get_embedding_model, get_lexical_search_engine, get_faq_exact_matcher,
+        get_keyword_classifier, get_reranker
+    )
+    
+    get_embedding_model()
+    get_lexical_search_engine()
+    if config.FAQ_EXACT_MATCH_ENABLED:
+        get_faq_exact_matcher()
+    get_keyword_classifier()
+    get_reranker()
+
+
+def run_production_server(workers: Optional[int] = None) -> int:
+    """
+    本番サーバーを起動（マルチワーカー、自動リロードなし）
+    
+    モデルとインデックスを読み込んでからワーカーをフォークする。
+    メトリクス・統計はワーカーごとに集計される。受付制御（同時処理数・
+    待ち行列・レート制限）と会話セッションもワーカーごとのため、
+    サーバー全体の上限は設定値の WEB_WORKERS 倍になる。
+    
+    Args:
+        workers: ワーカー数（省略時は WEB_WORKERS）
+    
+    Returns:
+        終了コード
+    """
+    try:
+        server = PreforkServer(app, workers=workers, preload=preload_shared_resources)
+        return server.run()
+        
+    except Exception as e:
+        logger.error(f"本番サーバーの起動に失敗しました: {e}")
+        raise
+
+
 if __name__ == "__main__":
     run_server()
\ No newline at end of file
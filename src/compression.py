@@ -0,0 +1,123 @@
+"""
+検索結果の抽出型圧縮
+質問との類似度が高い文だけを残してプロンプトを短くする
+"""
+
+import base64
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .configs import config
+from .custom_logger import get_module_logger
+from .models import SearchResult
+from .tokenizer import split_sentences
+
+logger = get_module_logger("compression")
+
+# 本文の開始を示す見出し（これより前は圧縮せずに残す）
+BODY_MARKERS = ("内容: ", "回答: ")
+
+GAP_MARK = "…"
+
+
+def split_compressible(document: str) -> Tuple[str, List[str]]:
+    """
+    ドキュメントを見出し部分と本文の文に分割
+    
+    インデックス作成時と検索時で同じ分割になるよう、両方から使う。
+    
+    Returns:
+        (見出し部分, 本文の文のリスト)
+    """
+    positions = [document.find(marker) + len(marker) for marker in BODY_MARKERS if marker in document]
+    start = min(positions) if positions else 0
+    return document[:start], split_sentences(document[start:])
+
+
+def encode_sentence_embeddings(embeddings: Sequence[Sequence[float]]) -> str:
+    """文の埋め込み行列をメタデータ用の文字列（float16のbase64）に変換"""
+    array = np.asarray(embeddings, dtype=np.float16)
+    return base64.b64encode(array.tobytes()).decode("ascii")
+
+
+def decode_sentence_embeddings(encoded: str, sentence_count: int) -> np.ndarray:
+    """メタデータの文字列から文の埋め込み行列を復元"""
+    array = np.frombuffer(base64.b64decode(encoded), dtype=np.float16)
+    return array.reshape(sentence_count, -1).astype(np.float32)
+
+
+def attach_sentence_data(result: SearchResult, document: str, metadata: Optional[Dict[str, Any]]):
+    """
+    ベクトルDBのメタデータに格納された文の埋め込みを検索結果に設定
+    
+    格納時と文の分割結果が一致しない場合（分割規則の変更など）は設定しない。
+    """
+    if not metadata or not metadata.get('sentence_embeddings'):
+        return
+    
+    _, sentences = split_compressible(document)
+    if len(sentences) != metadata.get('sentence_count'):
+        return
+    
+    result.set_sentence_data(sentences, metadata['sentence_embeddings'])
+
+
+def compress_content(
+    result: SearchResult,
+    query_embedding: Sequence[float],
+    ratio: Optional[float] = None
+) -> Optional[str]:
+    """
+    質問との類似度が高い文を選んで内容を圧縮
+    
+    文の埋め込みはインデックス作成時に計算済みのものを使う。
+    元の文の順序は保ち、間を省略した箇所には「…」を入れる。
+    
+    Args:
+        result: 検索結果（文の埋め込みを保持しているもの）
+        query_embedding: 質問の埋め込み
+        ratio: 残す文の割合
+    
+    Returns:
+        圧縮した内容。圧縮しない場合（短い・文の埋め込みがない）はNone
+    """
+    ratio = config.COMPRESSION_RATIO if ratio is None else ratio
+    sentence_data = result.sentence_data
+    if sentence_data is None:
+        return None
+    
+    sentences, encoded = sentence_data
+    if len(sentences) < config.COMPRESSION_MIN_SENTENCES:
+        return None
+    
+    keep = max(config.COMPRESSION_MIN_KEEP, math.ceil(len(sentences) * ratio))
+    if keep >= len(sentences):
+        return None
+    
+    # 検索結果の内容は本文で終わる（見出し部分は検索エンジンごとに整形済み）
+    body = "".join(sentences)
+    if not result.content.endswith(body):
+        return None
+    head = result.content[:len(result.content) - len(body)]
+    
+    embeddings = decode_sentence_embeddings(encoded, len(sentences))
+    query = np.asarray(query_embedding, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1) * (np.linalg.norm(query) or 1.0)
+    norms[norms == 0] = 1.0
+    similarities = (embeddings @ query) / norms
+    
+    selected = np.sort(np.argpartition(-similarities, keep - 1)[:keep])
+    
+    parts = []
+    previous = -1
+    for index in selected.tolist():
+        if index != previous + 1:
+            parts.append(GAP_MARK)
+        parts.append(sentences[index])
+        previous = index
+    if previous != len(sentences) - 1:
+        parts.append(GAP_MARK)
+    
+    return head + "".join(parts)
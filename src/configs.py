@@ -31,6 +31,52 @@ class Config:
     APP_HOST: str = os.getenv("APP_HOST", "localhost")
     APP_PORT: int = int(os.getenv("APP_PORT", "8080"))
     
+    # 本番サーバー設定（ワーカー数・ワーカーの入れ替え・終了待ち）
+    WEB_WORKERS: int = int(os.getenv("WEB_WORKERS", str(os.cpu_count() or 1)))
+    WORKER_MAX_REQUESTS: int = int(os.getenv("WORKER_MAX_REQUESTS", "5000"))
+    WORKER_MAX_REQUESTS_JITTER: int = int(os.getenv("WORKER_MAX_REQUESTS_JITTER", "500"))
+    WORKER_BOOT_TIMEOUT: float = float(os.getenv("WORKER_BOOT_TIMEOUT", "10"))
+    GRACEFUL_SHUTDOWN_TIMEOUT: float = float(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "30"))
+    SERVER_BACKLOG: int = int(os.getenv("SERVER_BACKLOG", "2048"))
+    
+    # 受付制御設定（/ask の同時処理数・待ち行列・クライアント別のレート制限）
+    # いずれもワーカープロセスごとの上限（本番サーバーでは全体で WEB_WORKERS 倍になるため、
+    # 全体の上限を保つにはワーカー数で割った値を設定する）
+    ADMISSION_PATHS: str = os.getenv("ADMISSION_PATHS", "/ask,/batch-ask")
+    ADMISSION_MAX_CONCURRENT: int = int(os.getenv("ADMISSION_MAX_CONCURRENT", "8"))
+    ADMISSION_MAX_QUEUE: int = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+    ADMISSION_MAX_WAIT_SECONDS: float = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "10"))
+    RATE_LIMIT_PER_MINUTE: float = float(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
+    RATE_LIMIT_BURST: int = int(os.getenv("RATE_LIMIT_BURST", "10"))
+    RATE_LIMIT_MAX_CLIENTS: int = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000"))
+    # クライアントを識別するヘッダー（空の場合は接続元アドレス。プロキシ配下では X-Forwarded-For など）
+    RATE_LIMIT_CLIENT_HEADER: str = os.getenv("RATE_LIMIT_CLIENT_HEADER", "")
+    
+    # 処理期限設定（ヘッダー・context で指定がない場合の期限、LLMを呼ぶのに必要な残り時間）
+    REQUEST_DEADLINE_SECONDS: float = float(os.getenv("REQUEST_DEADLINE_SECONDS", "25"))
+    REQUEST_DEADLINE_MAX_SECONDS: float = float(os.getenv("REQUEST_DEADLINE_MAX_SECONDS", "60"))
+    DEADLINE_MIN_LLM_SECONDS: float = float(os.getenv("DEADLINE_MIN_LLM_SECONDS", "3"))
+    
+    # レスポンス圧縮設定（brotli がインストールされていれば br、なければ gzip）
+    HTTP_COMPRESSION_ENABLED: bool = os.getenv("HTTP_COMPRESSION_ENABLED", "true").lower() == "true"
+    HTTP_COMPRESSION_MIN_BYTES: int = int(os.getenv("HTTP_COMPRESSION_MIN_BYTES", "1024"))
+    HTTP_GZIP_LEVEL: int = int(os.getenv("HTTP_GZIP_LEVEL", "6"))
+    HTTP_BROTLI_QUALITY: int = int(os.getenv("HTTP_BROTLI_QUALITY", "4"))
+    
+    # 会話セッション設定（/ws/chat・/ask の会話のサーバー側の状態）
+    # セッションはワーカープロセスごとに保持する（複数ワーカーで /ask の会話を続けるには
+    # session_id ごとに同じワーカーへ振り分けるスティッキールーティングが必要）
+    SESSION_MAX_SESSIONS: int = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))
+    SESSION_IDLE_SECONDS: float = float(os.getenv("SESSION_IDLE_SECONDS", "1800"))
+    SESSION_MAX_TURNS: int = int(os.getenv("SESSION_MAX_TURNS", "10"))
+    SESSION_PROMPT_TURNS: int = int(os.getenv("SESSION_PROMPT_TURNS", "2"))
+    SESSION_EMBEDDING_CACHE_SIZE: int = int(os.getenv("SESSION_EMBEDDING_CACHE_SIZE", "32"))
+    # 参照するやり取りで検索した質問との類似度がこれ以上なら、話題が続いているとみなして検索結果を再利用
+    SESSION_REUSE_SIMILARITY: float = float(os.getenv("SESSION_REUSE_SIMILARITY", "0.85"))
+    # 類似度がこれ以上（再利用の閾値未満）なら、検索せずに会話中の検索結果を新しい質問で並べ替えて使う
+    SESSION_RERANK_SIMILARITY: float = float(os.getenv("SESSION_RERANK_SIMILARITY", "0.6"))
+    SESSION_RERANK_TOP_K: int = int(os.getenv("SESSION_RERANK_TOP_K", "3"))
+    
     # ログレベル
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
     
@@ -46,6 +92,96 @@ class Config:
     MAX_SEARCH_RESULTS: int = int(os.getenv("MAX_SEARCH_RESULTS", "5"))
     SIMILARITY_THRESHOLD: float = float(os.getenv("SIMILARITY_THRESHOLD", "0.7"))
     
+    # プロンプトのトークン予算設定
+    PROMPT_CONTEXT_TOKEN_BUDGET: int = int(os.getenv("PROMPT_CONTEXT_TOKEN_BUDGET", "1500"))
+    PROMPT_MIN_RESULT_TOKENS: int = int(os.getenv("PROMPT_MIN_RESULT_TOKENS", "50"))
+    ANSWER_MAX_TOKENS: int = int(os.getenv("ANSWER_MAX_TOKENS", "800"))
+    
+    # 検索結果の多様化（MMR）設定
+    MMR_ENABLED: bool = os.getenv("MMR_ENABLED", "true").lower() == "true"
+    MMR_LAMBDA: float = float(os.getenv("MMR_LAMBDA", "0.7"))
+    MMR_MAX_RESULTS: int = int(os.getenv("MMR_MAX_RESULTS", "4"))
+    MMR_DUPLICATE_THRESHOLD: float = float(os.getenv("MMR_DUPLICATE_THRESHOLD", "0.92"))
+    
+    # 検索結果の抽出型圧縮設定
+    COMPRESSION_ENABLED: bool = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_RATIO: float = float(os.getenv("COMPRESSION_RATIO", "0.4"))
+    COMPRESSION_MIN_SENTENCES: int = int(os.getenv("COMPRESSION_MIN_SENTENCES", "4"))
+    COMPRESSION_MIN_KEEP: int = int(os.getenv("COMPRESSION_MIN_KEEP", "2"))
+    
+    # 処理時間の計測設定（段階別のパーセンタイルを計算する直近のリクエスト数）
+    TIMING_WINDOW_SIZE: int = int(os.getenv("TIMING_WINDOW_SIZE", "1000"))
+    
+    # インデックス作成パイプライン設定
+    INDEX_BATCH_SIZE: int = int(os.getenv("INDEX_BATCH_SIZE", "256"))
+    INDEX_QUEUE_SIZE: int = int(os.getenv("INDEX_QUEUE_SIZE", "4"))
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+    FAQ_CSV_CHUNK_SIZE: int = int(os.getenv("FAQ_CSV_CHUNK_SIZE", "20000"))
+    
+    # FAQ近似重複の集約設定
+    FAQ_DEDUP_ENABLED: bool = os.getenv("FAQ_DEDUP_ENABLED", "true").lower() == "true"
+    FAQ_DEDUP_THRESHOLD: float = float(os.getenv("FAQ_DEDUP_THRESHOLD", "0.95"))
+    FAQ_DEDUP_LSH_BITS: int = int(os.getenv("FAQ_DEDUP_LSH_BITS", "12"))
+    FAQ_DEDUP_LSH_TABLES: int = int(os.getenv("FAQ_DEDUP_LSH_TABLES", "6"))
+    FAQ_DEDUP_REPORT_FILE: Path = DATA_DIR / "faq_dedup_report.json"
+    
+    # 語彙検索（BM25）設定
+    LEXICAL_INDEX_DIR: Path = Path(os.getenv("LEXICAL_INDEX_DIR", str(DATA_DIR / "lexical")))
+    LEXICAL_NGRAM_SIZES: tuple = tuple(int(n) for n in os.getenv("LEXICAL_NGRAM_SIZES", "2,3").split(","))
+    LEXICAL_MIN_SCORE: float = float(os.getenv("LEXICAL_MIN_SCORE", "0.3"))
+    LEXICAL_SCORE_SATURATION: float = float(os.getenv("LEXICAL_SCORE_SATURATION", "5.0"))
+    BM25_K1: float = float(os.getenv("BM25_K1", "1.2"))
+    BM25_B: float = float(os.getenv("BM25_B", "0.75"))
+    
+    # 検索深度の自動調整設定
+    ADAPTIVE_K_ENABLED: bool = os.getenv("ADAPTIVE_K_ENABLED", "true").lower() == "true"
+    ADAPTIVE_PROBE_K: int = int(os.getenv("ADAPTIVE_PROBE_K", "3"))
+    ADAPTIVE_MIN_K: int = int(os.getenv("ADAPTIVE_MIN_K", "1"))
+    ADAPTIVE_MAX_K: int = int(os.getenv("ADAPTIVE_MAX_K", "6"))
+    ADAPTIVE_EXPAND_K: int = int(os.getenv("ADAPTIVE_EXPAND_K", "2"))
+    ADAPTIVE_MARGIN: float = float(os.getenv("ADAPTIVE_MARGIN", "0.15"))
+    ADAPTIVE_FLAT_SPREAD: float = float(os.getenv("ADAPTIVE_FLAT_SPREAD", "0.03"))
+    ADAPTIVE_SKIP_RATIO: float = float(os.getenv("ADAPTIVE_SKIP_RATIO", "0.6"))
+    
+    # 再順位付け（クロスエンコーダー）設定
+    # 検索戦略・検索深度で選んだ候補を並べ替えて上位 RERANK_TOP_N 件に絞る。
+    # 候補を RERANK_CANDIDATES 件まで広げるのは、検索深度の調整が無効で
+    # バランス型の戦略の場合のみ（FAQ/マニュアル重視の配分と検索深度は維持する）
+    RERANK_ENABLED: bool = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+    RERANK_MODEL: str = os.getenv("RERANK_MODEL", "hotchpotch/japanese-reranker-cross-encoder-xsmall-v1")
+    RERANK_MAX_LENGTH: int = int(os.getenv("RERANK_MAX_LENGTH", "512"))
+    RERANK_CANDIDATES: int = int(os.getenv("RERANK_CANDIDATES", "10"))
+    RERANK_TOP_N: int = int(os.getenv("RERANK_TOP_N", "3"))
+    RERANK_BATCH_SIZE: int = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+    RERANK_LATENCY_BUDGET_MS: float = float(os.getenv("RERANK_LATENCY_BUDGET_MS", "150"))
+    RERANK_CACHE_SIZE: int = int(os.getenv("RERANK_CACHE_SIZE", "4096"))
+    
+    # FAQ完全一致検索設定
+    FAQ_EXACT_MATCH_ENABLED: bool = os.getenv("FAQ_EXACT_MATCH_ENABLED", "true").lower() == "true"
+    FAQ_EXACT_INDEX_DIR: Path = Path(os.getenv("FAQ_EXACT_INDEX_DIR", str(DATA_DIR / "faq_exact")))
+    
+    # 検索戦略のキーワード辞書設定
+    KEYWORD_DICT_DIR: Path = Path(os.getenv("KEYWORD_DICT_DIR", str(DATA_DIR / "keywords")))
+    KEYWORD_RELOAD_INTERVAL: float = float(os.getenv("KEYWORD_RELOAD_INTERVAL", "5.0"))
+    
+    # ハイブリッド検索設定（dense: 密ベクトルのみ, hybrid: 密ベクトル + BM25 をRRFで統合）
+    SEARCH_MODE: str = os.getenv("SEARCH_MODE", "hybrid")
+    RRF_K: int = int(os.getenv("RRF_K", "60"))
+    HYBRID_WEIGHT_FAQ_DENSE: float = float(os.getenv("HYBRID_WEIGHT_FAQ_DENSE", "1.0"))
+    HYBRID_WEIGHT_FAQ_LEXICAL: float = float(os.getenv("HYBRID_WEIGHT_FAQ_LEXICAL", "1.0"))
+    HYBRID_WEIGHT_MANUAL_DENSE: float = float(os.getenv("HYBRID_WEIGHT_MANUAL_DENSE", "1.0"))
+    HYBRID_WEIGHT_MANUAL_LEXICAL: float = float(os.getenv("HYBRID_WEIGHT_MANUAL_LEXICAL", "0.8"))
+    
+    # ブルー/グリーン構築設定
+    INDEX_ALIAS_FILE: Path = Path(os.getenv("INDEX_ALIAS_FILE", str(DATA_DIR / "index_alias.json")))
+    INDEX_KEEP_VERSIONS: int = int(os.getenv("INDEX_KEEP_VERSIONS", "2"))
+    INDEX_VALIDATION_SAMPLES: int = int(os.getenv("INDEX_VALIDATION_SAMPLES", "5"))
+    
+    # 監視モード設定
+    INDEX_VERSION_FILE: Path = Path(os.getenv("INDEX_VERSION_FILE", str(DATA_DIR / "index_version.json")))
+    INDEX_WATCH_INTERVAL: float = float(os.getenv("INDEX_WATCH_INTERVAL", "2.0"))
+    INDEX_WATCH_DEBOUNCE: float = float(os.getenv("INDEX_WATCH_DEBOUNCE", "5.0"))
+    
     @classmethod
     def validate(cls) -> bool:
         """設定の妥当性をチェック"""
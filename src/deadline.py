@@ -0,0 +1,175 @@
+"""
+リクエストの処理期限
+リクエスト全体の期限を検索（埋め込み・ベクトル検索）とLLM呼び出しに伝える
+"""
+
+import asyncio
+import contextvars
+import math
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Dict, Optional, TypeVar
+
+from .configs import config
+from .custom_logger import get_module_logger
+from .metrics import DEADLINE_EXCEEDED
+
+logger = get_module_logger("deadline")
+
+T = TypeVar("T")
+
+# 処理期限（秒）を指定するリクエストヘッダー
+TIMEOUT_HEADER = "X-Request-Timeout"
+
+# QuestionRequest.context で処理期限（秒）を指定するキー
+TIMEOUT_CONTEXT_KEY = "timeout_seconds"
+
+# 処理中のリクエストの期限（リクエストごとのコンテキストで保持）
+_current_deadline: contextvars.ContextVar[Optional["Deadline"]] = contextvars.ContextVar(
+    "current_deadline", default=None
+)
+
+
+class DeadlineExceeded(Exception):
+    """処理期限を超過した（または処理が取り消された）"""
+    
+    def __init__(self, stage: str):
+        super().__init__(f"処理期限を超過しました ({stage})")
+        self.stage = stage
+
+
+class Deadline:
+    """
+    1リクエスト分の処理期限
+    
+    検索はスレッドで実行されるため、期限の確認は時刻の比較と
+    取り消しフラグの参照だけで行う（ロック不要）。クライアントの切断時は
+    cancel() で期限切れとして扱い、以降の処理を打ち切らせる。
+    """
+    
+    def __init__(self, timeout: float, started_at: Optional[float] = None):
+        self.timeout = timeout
+        self.expires_at = (time.monotonic() if started_at is None else started_at) + timeout
+        self.cancelled = False
+    
+    def remaining(self) -> float:
+        """残り時間（秒）"""
+        if self.cancelled:
+            return 0.0
+        return max(0.0, self.expires_at - time.monotonic())
+    
+    @property
+    def expired(self) -> bool:
+        return self.cancelled or time.monotonic() >= self.expires_at
+    
+    def cancel(self):
+        """処理を取り消す（以降は期限切れとして扱う）"""
+        self.cancelled = True
+    
+    def check(self, stage: str):
+        """
+        期限を確認
+        
+        Raises:
+            DeadlineExceeded: 期限切れまたは取り消し済み
+        """
+        if self.expired:
+            raise DeadlineExceeded(stage)
+
+
+def resolve_timeout(
+    header_value: Optional[str] = None,
+    context: Optional[Dict[str, Any]] = None
+) -> float:
+    """
+    リクエストの処理期限（秒）を決定
+    
+    ヘッダー、QuestionRequest.context の順に参照し、指定がなければ
+    REQUEST_DEADLINE_SECONDS を使う。REQUEST_DEADLINE_MAX_SECONDS を上限とする。
+    """
+    candidates = (
+        (TIMEOUT_HEADER, header_value),
+        (TIMEOUT_CONTEXT_KEY, (context or {}).get(TIMEOUT_CONTEXT_KEY))
+    )
+    for name, value in candidates:
+        if value is None:
+            continue
+        try:
+            timeout = float(value)
+        except (TypeError, ValueError):
+            logger.warning(f"処理期限の指定が不正です ({name}: {value!r})。既定値を使います")
+            continue
+        if not math.isfinite(timeout) or timeout <= 0:
+            logger.warning(f"処理期限の指定が不正です ({name}: {value!r})。既定値を使います")
+            continue
+        return min(timeout, config.REQUEST_DEADLINE_MAX_SECONDS)
+    
+    return config.REQUEST_DEADLINE_SECONDS
+
+
+def set_deadline(deadline: Optional[Deadline]):
+    """現在のコンテキストに処理期限を設定"""
+    _current_deadline.set(deadline)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """現在のコンテキストの処理期限（期限なしならNone）"""
+    return _current_deadline.get()
+
+
+def check_deadline(stage: str):
+    """
+    現在のコンテキストの処理期限を確認
+    
+    期限が設定されていない場合（スクリプトからの呼び出しなど）は何もしない。
+    
+    Raises:
+        DeadlineExceeded: 期限切れまたは取り消し済み
+    """
+    deadline = _current_deadline.get()
+    if deadline is not None:
+        deadline.check(stage)
+
+
+def remaining_seconds() -> Optional[float]:
+    """現在のコンテキストの処理期限までの残り時間（期限なしならNone）"""
+    deadline = _current_deadline.get()
+    return None if deadline is None else deadline.remaining()
+
+
+async def run_with_deadline(awaitable: Awaitable[T], stage: str) -> T:
+    """
+    処理期限までに完了しなければ取り消す
+    
+    Raises:
+        DeadlineExceeded: 期限までに完了しなかった
+    """
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return await awaitable
+    
+    try:
+        return await asyncio.wait_for(awaitable, timeout=deadline.remaining())
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(stage) from None
+
+
+async def iterate_with_deadline(iterable: AsyncIterable[T], stage: str) -> AsyncIterator[T]:
+    """
+    非同期イテレーター（LLMのストリーミング応答など）の各要素を処理期限までに受け取る
+    
+    Raises:
+        DeadlineExceeded: 期限までに次の要素を受け取れなかった
+    """
+    iterator = iterable.__aiter__()
+    while True:
+        try:
+            item = await run_with_deadline(iterator.__anext__(), stage)
+        except StopAsyncIteration:
+            return
+        yield item
+
+
+def record_deadline_exceeded(error: DeadlineExceeded):
+    """期限超過を記録"""
+    DEADLINE_EXCEEDED.inc(error.stage)
+    logger.warning(f"{error}。縮退した回答を返します")
@@ -0,0 +1,152 @@
+"""
+HTTPレスポンスの圧縮
+Accept-Encoding に応じて一定サイズ以上のレスポンスを brotli または gzip で圧縮する
+"""
+
+import gzip
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .configs import config
+from .custom_logger import get_module_logger
+from .metrics import HTTP_RESPONSE_BYTES
+
+logger = get_module_logger("http_compression")
+
+try:
+    import brotli
+except ImportError:  # brotli は任意依存（未インストールなら gzip のみ）
+    brotli = None
+
+# 圧縮の対象とするContent-Type（画像などの圧縮済みの形式は除く）
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml")
+
+
+def supported_encodings() -> tuple:
+    """利用できる圧縮方式（優先順）"""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Accept-Encoding から圧縮方式を選択
+    
+    q=0 で拒否された方式は使わない。同じ q 値なら brotli を優先する。
+    
+    Returns:
+        "br"、"gzip" または None（圧縮しない）
+    """
+    if not accept_encoding:
+        return None
+    
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name] = weight
+    
+    best, best_weight = None, 0.0
+    for encoding in supported_encodings():
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """本文を指定の方式で圧縮"""
+    if encoding == "br":
+        return brotli.compress(body, quality=config.HTTP_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=config.HTTP_GZIP_LEVEL, mtime=0)
+
+
+def _is_compressible(headers: Headers) -> bool:
+    """圧縮の対象となるレスポンスか"""
+    if "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "")
+    return content_type.startswith(COMPRESSIBLE_TYPES) or "+json" in content_type
+
+
+class CompressionMiddleware:
+    """
+    レスポンス圧縮のASGIミドルウェア
+    
+    本文が1回で送られるレスポンス（JSONResponse など）のうち、
+    minimum_size バイト以上のものを圧縮する。本文を分割して送る
+    ストリーミングのレスポンスは、逐次の送信を妨げないよう圧縮しない。
+    圧縮前後のバイト数は support_bot_http_response_bytes_total に記録する。
+    """
+    
+    def __init__(self, app: ASGIApp, minimum_size: Optional[int] = None):
+        self.app = app
+        self.minimum_size = config.HTTP_COMPRESSION_MIN_BYTES if minimum_size is None else minimum_size
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        
+        start_message: Optional[Message] = None
+        
+        async def send_compressed(message: Message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                # 本文を見てから圧縮するか決めるため、ヘッダーの送信を遅らせる
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+            
+            start, start_message = start_message, None
+            headers = MutableHeaders(scope=start)
+            body = message.get("body", b"")
+            
+            if not _is_compressible(headers):
+                await send(start)
+                await send(message)
+                return
+            
+            headers.add_vary_header("Accept-Encoding")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                await send(start)
+                await send(message)
+                return
+            
+            try:
+                compressed = compress(body, encoding)
+            except Exception as e:
+                logger.error(f"レスポンスの圧縮に失敗しました ({encoding}): {e}")
+                compressed = body
+            
+            if len(compressed) >= len(body):
+                await send(start)
+                await send(message)
+                return
+            
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            HTTP_RESPONSE_BYTES.inc(encoding, "original", amount=len(body))
+            HTTP_RESPONSE_BYTES.inc(encoding, "compressed", amount=len(compressed))
+            
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+        
+        await self.app(scope, receive, send_compressed)
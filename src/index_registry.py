@@ -0,0 +1,304 @@
+"""
+インデックスのバージョン管理（ブルー/グリーン切り替え）
+エイリアスファイルで検索対象のコレクションを指し示す
+"""
+
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from .configs import config
+from .custom_logger import get_module_logger
+
+logger = get_module_logger("index_registry")
+
+
+class IndexRegistry:
+    """
+    コレクションのエイリアス管理クラス
+    
+    エイリアスファイル（JSON）の形式:
+        {
+            "alias": "support_bot",
+            "active": "support_bot__v20240101120000",
+            "history": ["support_bot__v20231231120000", ...],
+            "updated_at": "2024-01-01T12:00:00"
+        }
+    
+    history には過去にアクティブだったバージョンが新しい順に並び、
+    ロールバックとガベージコレクションに使用する。
+    
+    インクリメンタル更新はバージョンファイルで通知する:
+        {
+            "version": 12,
+            "collection": "support_bot__v20240101120000",
+            "changed_ids": ["faq_...", ...],
+            "changed_files": ["data/faq.csv"],
+            "updated_at": "2024-01-01T12:05:00"
+        }
+    """
+    
+    VERSION_SEPARATOR = "__v"
+    
+    def __init__(
+        self,
+        alias_file: Optional[Path] = None,
+        alias: Optional[str] = None,
+        version_file: Optional[Path] = None
+    ):
+        self.alias_file = Path(alias_file or config.INDEX_ALIAS_FILE)
+        self.version_file = Path(version_file or config.INDEX_VERSION_FILE)
+        self.alias = alias or config.CHROMA_COLLECTION_NAME
+        self._lock = threading.Lock()
+        self._file_cache: Dict[Path, tuple] = {}
+        self._listeners: List[Callable[[Optional[Set[str]]], None]] = []
+        self._seen_token = None
+    
+    def _read_json(self, path: Path) -> Dict[str, Any]:
+        """JSONファイルを読み込み（変更がなければキャッシュを返す）"""
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return {}
+        
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._file_cache.get(path)
+            if cached and cached[0] == stat_key:
+                return cached[1]
+            
+            try:
+                state = json.loads(path.read_text(encoding='utf-8'))
+            except (OSError, ValueError) as e:
+                logger.error(f"インデックス状態ファイルの読み込みに失敗しました: {path}: {e}")
+                return cached[1] if cached else {}
+            
+            self._file_cache[path] = (stat_key, state)
+            return state
+    
+    def read(self) -> Dict[str, Any]:
+        """エイリアスファイルを読み込み"""
+        return self._read_json(self.alias_file)
+    
+    def read_version(self) -> Dict[str, Any]:
+        """バージョンファイルを読み込み"""
+        return self._read_json(self.version_file)
+    
+    def resolve_collection_name(self) -> str:
+        """検索対象のコレクション名を解決（エイリアス未設定時は既定名）"""
+        return self.read().get("active") or self.alias
+    
+    def current_token(self) -> Tuple[str, int]:
+        """
+        インデックスの内容を識別する値（アクティブなコレクション, バージョン）
+        
+        どちらかが変われば検索対象のドキュメントが変わっている。
+        """
+        return self.resolve_collection_name(), int(self.read_version().get("version", 0))
+    
+    def new_version_name(self) -> str:
+        """新しいバージョンのコレクション名を生成"""
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        return f"{self.alias}{self.VERSION_SEPARATOR}{timestamp}"
+    
+    def activate(self, collection_name: str, legacy_exists: bool = True) -> Optional[str]:
+        """
+        エイリアスを指定コレクションに切り替え
+        
+        エイリアスファイルがまだない場合（初回のブルー/グリーン構築）は、
+        それまで検索対象だったバージョンなしのコレクション（エイリアス名）を
+        履歴に残し、直後のロールバックで戻せるようにする。
+        
+        Args:
+            collection_name: 新たにアクティブにするコレクション名
+            legacy_exists: バージョンなしのコレクションが存在するか（存在しなければ履歴に残さない）
+        
+        Returns:
+            直前までアクティブだったコレクション名
+        """
+        state = dict(self.read())
+        previous = state.get("active")
+        if previous is None and legacy_exists:
+            previous = self.alias
+        history = [name for name in state.get("history", []) if name != collection_name]
+        
+        if previous and previous != collection_name:
+            history.insert(0, previous)
+        
+        self._write({
+            "alias": self.alias,
+            "active": collection_name,
+            "history": history,
+            "updated_at": datetime.now().isoformat()
+        })
+        
+        logger.info(f"エイリアス '{self.alias}' を切り替えました: {previous} -> {collection_name}")
+        return previous
+    
+    def rollback(self) -> Optional[str]:
+        """
+        直前のバージョンにロールバック
+        
+        Returns:
+            ロールバック後のコレクション名（履歴がない場合はNone）
+        """
+        state = dict(self.read())
+        history = list(state.get("history", []))
+        if not history:
+            logger.warning("ロールバック可能なバージョンがありません")
+            return None
+        
+        target = history.pop(0)
+        current = state.get("active")
+        
+        # ロールバックで外れたバージョンは履歴の末尾に回す（GC対象）
+        if current:
+            history.append(current)
+        
+        self._write({
+            "alias": self.alias,
+            "active": target,
+            "history": history,
+            "updated_at": datetime.now().isoformat()
+        })
+        
+        logger.info(f"エイリアス '{self.alias}' をロールバックしました: {current} -> {target}")
+        return target
+    
+    def collect_garbage(self, keep: Optional[int] = None) -> List[str]:
+        """
+        保持数を超えた古いバージョンを履歴から外す
+        
+        Args:
+            keep: アクティブ以外に保持するバージョン数
+        
+        Returns:
+            削除対象となったコレクション名のリスト
+        """
+        keep = config.INDEX_KEEP_VERSIONS if keep is None else keep
+        state = dict(self.read())
+        history = list(state.get("history", []))
+        if len(history) <= keep:
+            return []
+        
+        expired = history[keep:]
+        state["history"] = history[:keep]
+        self._write(state)
+        return expired
+    
+    def bump_version(
+        self,
+        changed_ids: Optional[List[str]],
+        changed_files: Optional[List[str]] = None
+    ) -> int:
+        """
+        インデックスの更新をバージョンファイルで通知
+        
+        Args:
+            changed_ids: 追加・削除されたドキュメントID（Noneは全件更新）
+            changed_files: 更新のきっかけとなったファイル
+        
+        Returns:
+            新しいバージョン番号
+        """
+        version = int(self.read_version().get("version", 0)) + 1
+        _atomic_write_json(self.version_file, {
+            "version": version,
+            "collection": self.resolve_collection_name(),
+            "changed_ids": sorted(changed_ids) if changed_ids is not None else None,
+            "changed_files": changed_files or [],
+            "updated_at": datetime.now().isoformat()
+        })
+        
+        changed_count = len(changed_ids) if changed_ids is not None else "全"
+        logger.info(f"インデックスのバージョンを更新しました: v{version} ({changed_count}件の変更)")
+        return version
+    
+    def add_listener(self, callback: Callable[[Optional[Set[str]]], None]):
+        """
+        インデックス更新時のコールバックを登録
+        
+        コールバックには変更されたドキュメントIDの集合が渡される。
+        コレクションの切り替えや更新の取りこぼしがあった場合は
+        None（全件無効化）が渡される。
+        """
+        self._listeners.append(callback)
+    
+    def check_for_updates(self) -> bool:
+        """
+        エイリアス/バージョンファイルの変更を確認し、登録済みのコールバックに通知
+        
+        Returns:
+            変更があったかどうか
+        """
+        active = self.resolve_collection_name()
+        version_state = self.read_version()
+        version = int(version_state.get("version", 0))
+        token = (active, version)
+        
+        with self._lock:
+            previous = self._seen_token
+            if token == previous:
+                return False
+            self._seen_token = token
+        
+        # 初回は基準点の記録のみ
+        if previous is None:
+            return False
+        
+        previous_active, previous_version = previous
+        raw_changed_ids = version_state.get("changed_ids")
+        if active != previous_active or version != previous_version + 1 or raw_changed_ids is None:
+            changed_ids = None
+        else:
+            changed_ids = set(raw_changed_ids)
+        
+        for callback in list(self._listeners):
+            try:
+                callback(changed_ids)
+            except Exception as e:
+                logger.error(f"インデックス更新コールバックの実行に失敗しました: {e}")
+        
+        logger.info(f"インデックスの更新を検知しました (コレクション: {active}, バージョン: v{version})")
+        return True
+    
+    def _write(self, state: Dict[str, Any]):
+        """エイリアスファイルをアトミックに書き込み"""
+        _atomic_write_json(self.alias_file, state)
+
+
+def _atomic_write_json(path: Path, state: Dict[str, Any]):
+    """JSONファイルをアトミックに書き込み"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    
+    fd, tmp_path = tempfile.mkstemp(
+        dir=path.parent,
+        prefix=f".{path.name}.",
+        suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        # 同一ファイルシステム内のrenameはアトミック
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+# グローバルインスタンス
+_index_registry = None
+
+def get_index_registry() -> IndexRegistry:
+    """インデックスレジストリのグローバルインスタンスを取得"""
+    global _index_registry
+    if _index_registry is None:
+        _index_registry = IndexRegistry()
+    return _index_registry
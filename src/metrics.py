@@ -0,0 +1,354 @@
+"""
+Prometheus形式のメトリクス
+カウンター・ゲージ・ヒストグラムを記録し、/metrics でテキスト形式に変換する
+"""
+
+import bisect
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .custom_logger import get_module_logger
+
+logger = get_module_logger("metrics")
+
+# 処理時間（秒）のバケット
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 件数（バッチサイズなど）のバケット
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape_label_value(value: str) -> str:
+    """ラベル値をテキスト形式用にエスケープ"""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    """数値をテキスト形式に変換"""
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """ラベルを {name="value",...} の形式に変換"""
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape_label_value(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    """
+    メトリクスの基底クラス
+    
+    記録はスレッドごとの領域（シャード）に対して行い、ロックを取らない。
+    各シャードに書き込むのは所有するスレッドだけなので、更新が競合しない。
+    出力時に全シャードを合算する。
+    """
+    
+    TYPE = ""
+    
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._shards_lock = threading.Lock()
+    
+    def _shard(self) -> dict:
+        """現在のスレッドのシャードを取得（初回のみ登録でロックを取る）"""
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            self._local.shard = shard
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+    
+    def _label_key(self, label_values: Tuple[str, ...]) -> Tuple[str, ...]:
+        """ラベル値の数を確認"""
+        if len(label_values) != len(self.labelnames):
+            raise ValueError(f"{self.name}: ラベル {self.labelnames} に対して値が {label_values} です")
+        return label_values
+    
+    def _snapshot_shards(self) -> List[dict]:
+        """全シャードの複製（出力用）"""
+        with self._shards_lock:
+            shards = list(self._shards)
+        return [dict(shard) for shard in shards]
+    
+    def render(self) -> List[str]:
+        """テキスト形式の行を生成"""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.TYPE}"]
+        lines.extend(self._render_samples())
+        return lines
+    
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """単調増加するカウンター"""
+    
+    TYPE = "counter"
+    
+    def inc(self, *label_values: str, amount: float = 1.0):
+        """カウンターを増やす"""
+        shard = self._shard()
+        key = self._label_key(label_values)
+        shard[key] = shard.get(key, 0.0) + amount
+    
+    def _totals(self) -> Dict[Tuple[str, ...], float]:
+        totals: Dict[Tuple[str, ...], float] = {}
+        for shard in self._snapshot_shards():
+            for key, value in shard.items():
+                totals[key] = totals.get(key, 0.0) + value
+        return totals
+    
+    def _render_samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._totals().items())
+        ]
+
+
+class Gauge(Counter):
+    """増減する値（処理中のリクエスト数など）"""
+    
+    TYPE = "gauge"
+    
+    def dec(self, *label_values: str, amount: float = 1.0):
+        """値を減らす"""
+        self.inc(*label_values, amount=-amount)
+    
+    @contextmanager
+    def track(self, *label_values: str) -> Iterator[None]:
+        """処理中の間だけ値を1増やす"""
+        self.inc(*label_values)
+        try:
+            yield
+        finally:
+            self.dec(*label_values)
+
+
+class Histogram(_Metric):
+    """
+    バケット別の度数を持つヒストグラム
+    
+    シャードにはバケットごとの（累積でない）度数と合計値を保持し、
+    出力時に累積度数に変換する。件数は度数の合計から求める。
+    """
+    
+    TYPE = "histogram"
+    
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+    
+    def observe(self, value: float, *label_values: str):
+        """値を記録"""
+        shard = self._shard()
+        key = self._label_key(label_values)
+        data = shard.get(key)
+        if data is None:
+            # [バケット別の度数（最後は+Inf）, 合計値]
+            data = shard[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        data[0][bisect.bisect_left(self.buckets, value)] += 1
+        data[1] += value
+    
+    @contextmanager
+    def time(self, *label_values: str) -> Iterator[None]:
+        """ブロックの処理時間（秒）を記録"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+    
+    def _render_samples(self) -> List[str]:
+        totals: Dict[Tuple[str, ...], list] = {}
+        for shard in self._snapshot_shards():
+            for key, (counts, total) in shard.items():
+                merged = totals.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+                for index, count in enumerate(list(counts)):
+                    merged[0][index] += count
+                merged[1] += total
+        
+        lines = []
+        bounds = self.buckets + (math.inf,)
+        for key, (counts, total) in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ("le",), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+# 値を集計しているプロセス（pid, 起動時刻）。フォークしたワーカーでは起動時に更新する
+_process_info: Tuple[int, float] = (os.getpid(), time.time())
+
+
+def _reset_process_info():
+    global _process_info
+    _process_info = (os.getpid(), time.time())
+
+
+os.register_at_fork(after_in_child=_reset_process_info)
+
+
+class MetricsRegistry:
+    """
+    メトリクスの登録と出力
+    
+    値はプロセス内でのみ集計する。複数ワーカーではスクレイプごとに異なる
+    ワーカーが応答しうるため、出力の先頭に応答したワーカーの pid と起動時刻
+    （support_bot_worker_start_time_seconds）を含める。
+    """
+    
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+    
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"メトリクス '{metric.name}' は登録済みです")
+            self._metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        """カウンターを登録"""
+        return self._register(Counter(name, help_text, labelnames))
+    
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """ゲージを登録"""
+        return self._register(Gauge(name, help_text, labelnames))
+    
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Optional[Sequence[float]] = None
+    ) -> Histogram:
+        """ヒストグラムを登録"""
+        return self._register(Histogram(name, help_text, labelnames, buckets or LATENCY_BUCKETS))
+    
+    def render(self) -> str:
+        """全メトリクスをPrometheusのテキスト形式に変換"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        
+        pid, started_at = _process_info
+        lines = [
+            "# HELP support_bot_worker_start_time_seconds 応答したワーカープロセスの起動時刻（値はワーカーごとの集計）",
+            "# TYPE support_bot_worker_start_time_seconds gauge",
+            f'support_bot_worker_start_time_seconds{{pid="{pid}"}} {_format_value(started_at)}'
+        ]
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                logger.error(f"メトリクス '{metric.name}' の出力に失敗しました: {e}")
+        return "\n".join(lines) + "\n"
+
+
+# グローバルインスタンス
+_metrics_registry = MetricsRegistry()
+
+def get_metrics_registry() -> MetricsRegistry:
+    """メトリクスのグローバルインスタンスを取得"""
+    return _metrics_registry
+
+
+# HTTP
+HTTP_REQUESTS = _metrics_registry.counter(
+    "support_bot_http_requests_total", "HTTPリクエスト数", ("method", "path", "status")
+)
+HTTP_REQUEST_SECONDS = _metrics_registry.histogram(
+    "support_bot_http_request_duration_seconds", "HTTPリクエストの処理時間", ("method", "path")
+)
+HTTP_IN_FLIGHT = _metrics_registry.gauge(
+    "support_bot_http_requests_in_flight", "処理中のHTTPリクエスト数"
+)
+ADMISSION_REJECTED = _metrics_registry.counter(
+    "support_bot_admission_rejected_total", "受付制御で拒否したリクエスト数", ("reason",)
+)
+DEADLINE_EXCEEDED = _metrics_registry.counter(
+    "support_bot_deadline_exceeded_total", "処理期限の超過で縮退したリクエスト数", ("stage",)
+)
+REQUESTS_CANCELLED = _metrics_registry.counter(
+    "support_bot_requests_cancelled_total", "クライアントの切断で中止したリクエスト数"
+)
+HTTP_RESPONSE_BYTES = _metrics_registry.counter(
+    "support_bot_http_response_bytes_total", "圧縮したレスポンスの圧縮前後のバイト数", ("encoding", "stage")
+)
+HTTP_NOT_MODIFIED = _metrics_registry.counter(
+    "support_bot_http_not_modified_total", "ETagの一致で304を返したリクエスト数", ("path",)
+)
+
+# 会話（/ws/chat・/ask の会話セッション）
+WS_CONNECTIONS = _metrics_registry.gauge(
+    "support_bot_ws_connections", "接続中のWebSocket数"
+)
+CHAT_SESSIONS = _metrics_registry.gauge(
+    "support_bot_chat_sessions", "保持している会話セッション数"
+)
+SESSION_EVICTIONS = _metrics_registry.counter(
+    "support_bot_session_evictions_total", "破棄した会話セッション数", ("reason",)
+)
+FOLLOWUP_RETRIEVAL = _metrics_registry.counter(
+    "support_bot_followup_retrieval_total", "会話中の質問の検索方法（再利用・再順位付け・検索）", ("decision",)
+)
+
+# 埋め込み
+EMBEDDING_CALLS = _metrics_registry.counter(
+    "support_bot_embedding_calls_total", "埋め込みモデルの呼び出し回数", ("caller",)
+)
+EMBEDDING_BATCH_SIZE = _metrics_registry.histogram(
+    "support_bot_embedding_batch_size", "埋め込みモデル1回あたりのテキスト数", ("caller",), SIZE_BUCKETS
+)
+
+# ベクトルDB・語彙インデックス
+VECTOR_QUERY_SECONDS = _metrics_registry.histogram(
+    "support_bot_vector_query_duration_seconds", "ベクトルDBの検索時間", ("source",)
+)
+LEXICAL_QUERY_SECONDS = _metrics_registry.histogram(
+    "support_bot_lexical_query_duration_seconds", "語彙インデックスの検索時間", ("source",)
+)
+
+# LLM
+LLM_REQUEST_SECONDS = _metrics_registry.histogram(
+    "support_bot_llm_request_duration_seconds", "LLM APIの呼び出し時間", ("kind",)
+)
+LLM_TOKENS = _metrics_registry.counter(
+    "support_bot_llm_tokens_total", "LLM APIのトークン数", ("type",)
+)
+
+# キャッシュ（ヒット率は hits / lookups で求める）
+CACHE_LOOKUPS = _metrics_registry.counter(
+    "support_bot_cache_lookups_total", "キャッシュの参照回数", ("cache",)
+)
+CACHE_HITS = _metrics_registry.counter(
+    "support_bot_cache_hits_total", "キャッシュのヒット回数", ("cache",)
+)
@@ -0,0 +1,87 @@
+"""
+最大周辺関連性（MMR）による検索結果の多様化
+内容の重複した検索結果をプロンプトに入れる前に取り除く
+"""
+
+from typing import List, Optional
+
+import numpy as np
+
+from .configs import config
+from .custom_logger import get_module_logger
+from .models import SearchResult
+
+logger = get_module_logger("mmr")
+
+
+def mmr_select(
+    results: List[SearchResult],
+    lambda_mult: Optional[float] = None,
+    max_results: Optional[int] = None,
+    duplicate_threshold: Optional[float] = None
+) -> List[SearchResult]:
+    """
+    MMRで関連性と多様性のバランスを取りながら検索結果を選択
+    
+    各ステップで λ × 関連性 − (1 − λ) × 選択済みとの最大類似度 が
+    最大の候補を選ぶ。関連性には検索スコアを、類似度には検索時に
+    取得した埋め込みのコサイン類似度を使う。選択済みとの類似度が
+    duplicate_threshold 以上の候補は重複として除外する。
+    埋め込みのない結果は他との類似度を0として扱う。
+    
+    Args:
+        results: 検索結果（検索エンジンの順位順）
+        lambda_mult: 関連性の重み（1.0で検索順のまま、0.0で多様性のみ）
+        max_results: 選択する最大件数
+        duplicate_threshold: 重複とみなす類似度
+    
+    Returns:
+        選択された検索結果（選択順）
+    """
+    lambda_mult = config.MMR_LAMBDA if lambda_mult is None else lambda_mult
+    max_results = max_results or config.MMR_MAX_RESULTS
+    duplicate_threshold = (
+        config.MMR_DUPLICATE_THRESHOLD if duplicate_threshold is None else duplicate_threshold
+    )
+    
+    if len(results) <= 1:
+        return results[:max_results]
+    
+    similarities = _similarity_matrix(results)
+    relevance = np.array([result.score for result in results], dtype=np.float32)
+    
+    count = len(results)
+    selected: List[int] = []
+    candidates = np.ones(count, dtype=bool)
+    max_similarity = np.zeros(count, dtype=np.float32)
+    
+    while candidates.any() and len(selected) < max_results:
+        mmr_scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_similarity
+        mmr_scores[~candidates] = -np.inf
+        best = int(np.argmax(mmr_scores))
+        
+        selected.append(best)
+        candidates[best] = False
+        max_similarity = np.maximum(max_similarity, similarities[best])
+        
+        # 選択済みとほぼ同じ内容の候補を除外
+        candidates &= max_similarity < duplicate_threshold
+    
+    return [results[index] for index in selected]
+
+
+def _similarity_matrix(results: List[SearchResult]) -> np.ndarray:
+    """検索結果間のコサイン類似度行列（埋め込みがない行は0）"""
+    dimension = next((len(result.embedding) for result in results if result.embedding is not None), 0)
+    vectors = np.zeros((len(results), dimension), dtype=np.float32)
+    for index, result in enumerate(results):
+        if result.embedding is not None:
+            vectors[index] = result.embedding
+    
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors /= norms
+    
+    similarities = vectors @ vectors.T
+    np.fill_diagonal(similarities, 0.0)
+    return similarities
@@ -3,9 +3,10 @@
 APIの入出力とデータ構造を定義
 """
 
+from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field
+from typing import List, Optional, Dict, Any, Tuple
+from pydantic import BaseModel, Field, PrivateAttr
 
 
 class QuestionRequest(BaseModel):
@@ -20,6 +21,65 @@ class SearchResult(BaseModel):
     source: str = Field(..., description="ソース（FAQ、マニュアルなど）")
     score: float = Field(..., description="類似度スコア", ge=0.0, le=1.0)
     metadata: Optional[Dict[str, Any]] = Field(None, description="追加のメタデータ")
+    
+    # 検索時に取得したドキュメントの埋め込み（レスポンスには含めない）
+    _embedding: Optional[List[float]] = PrivateAttr(default=None)
+    
+    @property
+    def embedding(self) -> Optional[List[float]]:
+        """ドキュメントの埋め込み（未取得の場合はNone）"""
+        return self._embedding
+    
+    def set_embedding(self, embedding: Optional[List[float]]):
+        """ドキュメントの埋め込みを設定"""
+        self._embedding = embedding
+    
+    # 本文の文とその埋め込み（インデックス作成時に計算済みのもの）
+    _sentence_data: Optional[Tuple[List[str], str]] = PrivateAttr(default=None)
+    
+    @property
+    def sentence_data(self) -> Optional[Tuple[List[str], str]]:
+        """(本文の文のリスト, エンコード済みの文の埋め込み)"""
+        return self._sentence_data
+    
+    def set_sentence_data(self, sentences: List[str], encoded_embeddings: str):
+        """本文の文とその埋め込みを設定"""
+        self._sentence_data = (sentences, encoded_embeddings)
+
+
+@dataclass(slots=True)
+class SearchHit:
+    """
+    検索処理の内部で使う軽量な検索結果
+    
+    リトリーバーの候補の多くは融合・閾値・件数の絞り込みで捨てられるため、
+    検証付きの SearchResult や整形済みの内容・メタデータの辞書は作らず、
+    ベクトルDB（語彙インデックス）の値を参照で保持する。
+    APIに返す最終結果だけを各エンジンの to_search_result で変換する。
+    """
+    doc_type: str                               # faq / manual
+    doc_id: Optional[str]
+    score: float                                # 類似度スコア（0-1）
+    distance: float
+    document: str
+    metadata: Dict[str, Any]                    # 保存されたメタデータ（変更しない）
+    embedding: Optional[List[float]] = None
+    rrf_score: Optional[float] = None
+    rerank_score: Optional[float] = None
+    
+    @property
+    def key(self) -> str:
+        """同一ドキュメントを識別するキー"""
+        return self.doc_id or f"{self.doc_type}\n{self.document}"
+    
+    def ranking_metadata(self) -> Dict[str, float]:
+        """融合・再順位付けのスコア（SearchResult のメタデータに含める）"""
+        metadata = {}
+        if self.rrf_score is not None:
+            metadata['rrf_score'] = self.rrf_score
+        if self.rerank_score is not None:
+            metadata['rerank_score'] = self.rerank_score
+        return metadata
 
 
 class AnswerResponse(BaseModel):
@@ -29,6 +89,8 @@ class AnswerResponse(BaseModel):
     sources: List[SearchResult] = Field(default_factory=list, description="参照した情報源")
     timestamp: datetime = Field(default_factory=datetime.now, description="回答生成時刻")
     processing_time: Optional[float] = Field(None, description="処理時間（秒）")
+    metadata: Optional[Dict[str, Any]] = Field(None, description="処理の詳細（トークン数など）")
+    timings: Optional[Dict[str, float]] = Field(None, description="処理段階ごとの所要時間（ミリ秒）")
 
 
 class ErrorResponse(BaseModel):
@@ -3,8 +3,52 @@ AIプロンプトテンプレート集
 回答生成用のプロンプト定義
 """
 
-from typing import List, Dict, Any
+import string
+from typing import List, Dict, Any, Optional, Tuple
+
+from .configs import config
 from .models import SearchResult
+from .timing import span
+from .tokenizer import get_token_counter
+
+
+class CompiledTemplate:
+    """
+    事前に分割したプロンプトテンプレート
+    
+    str.format 形式のテンプレートを読み込み時に一度だけ解析し、
+    定数部分と差し込み項目の並びとして保持する。生成時は解析を
+    行わず、定数部分と値を連結するだけで済む。
+    """
+    
+    def __init__(self, template: str):
+        self.template = template
+        self.literals: List[str] = []
+        self.fields: List[str] = []
+        
+        for literal, field, format_spec, conversion in string.Formatter().parse(template):
+            self.literals.append(literal)
+            if field is not None:
+                if format_spec or conversion:
+                    raise ValueError(f"書式指定付きの項目には対応していません: {field}")
+                self.fields.append(field)
+        
+        # 定数部分は常に「項目数 + 1」個（末尾が項目の場合は空文字）
+        if len(self.literals) == len(self.fields):
+            self.literals.append("")
+    
+    @property
+    def prefix(self) -> str:
+        """最初の差し込み項目より前の、リクエスト間で不変な部分"""
+        return self.literals[0]
+    
+    def render(self, **values: str) -> str:
+        """値を差し込んでプロンプトを生成"""
+        parts = [self.literals[0]]
+        for field, literal in zip(self.fields, self.literals[1:]):
+            parts.append(values[field])
+            parts.append(literal)
+        return "".join(parts)
 
 
 class PromptTemplates:
@@ -31,34 +75,31 @@ class PromptTemplates:
 - 機密情報に関わる質問には回答を控える
 """
 
+    # 回答テンプレートは、プロバイダーのプロンプトキャッシュが効くよう
+    # 不変の指示を先頭に、検索結果と質問を末尾に配置する
+    
     # FAQ専用の回答テンプレート
     FAQ_ANSWER_TEMPLATE = """
-以下の質問に対して、検索結果の情報を基に回答してください。
-
-ユーザーの質問：
-{question}
-
-関連する検索結果：
-{search_results}
+末尾のユーザーの質問に対して、検索結果の情報を基に回答してください。
 
 回答の要件：
 1. 質問に直接答える内容を最初に書いてください
-2. 上記の検索結果がある場合はそれらの情報を参考にしてください
+2. 下記の検索結果がある場合はそれらの情報を参考にしてください
 3. 検索結果にない情報は推測せず、「情報が見つかりません」と伝えてください
 4. 機密性の高い内容については適切に配慮してください
 
+関連する検索結果：
+{search_results}
+
+ユーザーの質問：
+{question}
+
 回答をお願いします：
 """
 
     # マニュアル専用の回答テンプレート
     MANUAL_ANSWER_TEMPLATE = """
-以下のマニュアル検索結果を基に、ユーザーの質問に回答してください。
-
-ユーザーの質問：
-{question}
-
-参照するマニュアル情報：
-{search_results}
+下記のマニュアル検索結果を基に、末尾のユーザーの質問に回答してください。
 
 回答の要件：
 1. マニュアルの内容を整理して説明してください
@@ -66,6 +107,12 @@ class PromptTemplates:
 3. 重要なポイントがあれば強調してください
 4. 不明な点があれば担当者への問い合わせを案内してください
 
+参照するマニュアル情報：
+{search_results}
+
+ユーザーの質問：
+{question}
+
 回答をお願いします：
 """
 
@@ -87,10 +134,12 @@ class PromptTemplates:
 
     # 複数ソースの統合回答テンプレート
     MULTI_SOURCE_TEMPLATE = """
-以下の質問についてFAQとマニュアルの両方から関連情報が見つかりました。
+末尾のユーザーの質問についてFAQとマニュアルの両方から関連情報が見つかりました。
 
-ユーザーの質問：
-{question}
+回答の要件：
+1. FAQとマニュアルの情報を総合して包括的に回答してください
+2. 検索結果がある場合はそれらの詳細な情報を活用してください
+3. 両方の情報を統合して、より包括的で有用な回答を作成してください
 
 FAQ情報：
 {faq_results}
@@ -98,36 +147,186 @@ FAQ情報：
 マニュアル情報：
 {manual_results}
 
-回答の要件：
-1. FAQとマニュアルの情報を総合して包括的に回答してください
-2. 検索結果がある場合はそれらの詳細な情報を活用してください
-3. 両方の情報を統合して、より包括的で有用な回答を作成してください
+ユーザーの質問：
+{question}
 
 総合した回答をお願いします：
 """
+    
+    # 読み込み時に一度だけ解析したテンプレート
+    FAQ_ANSWER = CompiledTemplate(FAQ_ANSWER_TEMPLATE)
+    MANUAL_ANSWER = CompiledTemplate(MANUAL_ANSWER_TEMPLATE)
+    NO_RESULTS = CompiledTemplate(NO_RESULTS_TEMPLATE)
+    MULTI_SOURCE = CompiledTemplate(MULTI_SOURCE_TEMPLATE)
 
     @classmethod
-    def format_search_results(cls, results: List[SearchResult]) -> str:
-        """検索結果を読みやすい形式に整形"""
+    def format_search_results(
+        cls,
+        results: List[SearchResult],
+        contents: Optional[List[str]] = None
+    ) -> str:
+        """
+        検索結果を読みやすい形式に整形
+        
+        Args:
+            results: 検索結果
+            contents: 各結果の内容として使うテキスト（省略時は result.content）
+        """
         if not results:
             return "参照する情報が見つかりませんでした"
         
+        if contents is None:
+            contents = [result.content for result in results]
+        
         formatted_results = []
-        for i, result in enumerate(results, 1):
-            formatted_result = f"""
-結果 {i}（類似度: {result.score:.2f}）
-ソース: {result.source}
-内容: {result.content}
+        for i, (result, content) in enumerate(zip(results, contents), 1):
+            formatted_result = f"""{cls._format_result_header(i, result)}
+内容: {content}
 """
             formatted_results.append(formatted_result)
         
         return "\n".join(formatted_results)
 
+    @staticmethod
+    def _format_result_header(index: int, result: SearchResult) -> str:
+        """検索結果の見出し部分"""
+        return f"""
+結果 {index}（類似度: {result.score:.2f}）
+ソース: {result.source}"""
+
+    @classmethod
+    def allocate_context(
+        cls,
+        results: List[SearchResult],
+        budget: Optional[int] = None
+    ) -> Tuple[List[SearchResult], List[str], Dict[str, Any]]:
+        """
+        検索結果にトークン予算を順位に応じて配分し、内容を切り詰め
+        
+        順位 r（0始まり）の結果には 1 / (r + 1) の重みで予算を配分する。
+        配分より短い結果は全文を使い、余った予算を残りの結果に
+        配分し直す。配分が PROMPT_MIN_RESULT_TOKENS に満たない結果は
+        プロンプトに含めない。切り詰めは文の区切りで行う。
+        
+        Args:
+            results: 検索結果（順位順）
+            budget: 検索結果全体のトークン予算
+        
+        Returns:
+            (使用する結果, 切り詰めた内容, トークン数の内訳)
+        """
+        counter = get_token_counter()
+        budget = config.PROMPT_CONTEXT_TOKEN_BUDGET if budget is None else budget
+        
+        headers = [counter.count(cls._format_result_header(i, result)) for i, result in enumerate(results, 1)]
+        costs = [counter.count(result.content) for result in results]
+        weights = [1.0 / (rank + 1) for rank in range(len(results))]
+        
+        # 見出しの分を差し引いた予算を、全文が収まる結果から順に確定
+        remaining_budget = max(budget - sum(headers), 0)
+        remaining = list(range(len(results)))
+        allocation: Dict[int, int] = {}
+        while remaining:
+            total_weight = sum(weights[i] for i in remaining)
+            shares = {i: remaining_budget * weights[i] / total_weight for i in remaining}
+            satisfied = [i for i in remaining if costs[i] <= shares[i]]
+            if not satisfied:
+                for i in remaining:
+                    allocation[i] = int(shares[i])
+                break
+            for i in satisfied:
+                allocation[i] = costs[i]
+                remaining_budget -= costs[i]
+                remaining.remove(i)
+        
+        used_results, contents = [], []
+        truncated = dropped = 0
+        for i, result in enumerate(results):
+            if allocation[i] >= costs[i]:
+                content = result.content
+            elif allocation[i] >= config.PROMPT_MIN_RESULT_TOKENS:
+                content = counter.truncate(result.content, allocation[i])
+                truncated += 1
+            else:
+                dropped += 1
+                continue
+            used_results.append(result)
+            contents.append(content)
+        
+        stats = {
+            'context_budget': budget,
+            'context_tokens_original': sum(costs),
+            'context_tokens': sum(counter.count(content) for content in contents),
+            'results_used': len(used_results),
+            'results_truncated': truncated,
+            'results_dropped': dropped
+        }
+        return used_results, contents, stats
+
+    @classmethod
+    def build_answer_prompt(
+        cls,
+        question: str,
+        results: List[SearchResult],
+        budget: Optional[int] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        トークン予算内に収めた回答生成用のプロンプトを構築
+        
+        検索結果のソース（FAQ/マニュアル）に応じてテンプレートを選択する。
+        
+        Args:
+            question: ユーザーの質問
+            results: 検索結果（順位順）
+            budget: 検索結果全体のトークン予算
+        
+        Returns:
+            (プロンプト, トークン数の内訳)
+        """
+        # トークン数の計測と切り詰め
+        with span("prompt.allocate"):
+            used_results, contents, stats = cls.allocate_context(results, budget)
+        
+        # ソース別に分類（順位は保持）
+        faq_pairs = [(r, c) for r, c in zip(used_results, contents) if r.metadata.get('type') == 'faq']
+        manual_pairs = [(r, c) for r, c in zip(used_results, contents) if r.metadata.get('type') == 'manual']
+        faq_text = cls.format_search_results([r for r, _ in faq_pairs], [c for _, c in faq_pairs])
+        manual_text = cls.format_search_results([r for r, _ in manual_pairs], [c for _, c in manual_pairs])
+        
+        if faq_pairs and manual_pairs:
+            # 複数ソース統合プロンプト
+            prompt = cls.MULTI_SOURCE.render(
+                question=question,
+                faq_results=faq_text,
+                manual_results=manual_text
+            )
+        elif faq_pairs:
+            # FAQ専用プロンプト
+            prompt = cls.FAQ_ANSWER.render(
+                question=question,
+                search_results=faq_text
+            )
+        elif manual_pairs:
+            # マニュアル専用プロンプト
+            prompt = cls.MANUAL_ANSWER.render(
+                question=question,
+                search_results=manual_text
+            )
+        else:
+            # 結果なしプロンプト
+            prompt = cls.generate_no_results_prompt(question)
+        
+        counter = get_token_counter()
+        stats['system_tokens'] = counter.count(cls.SYSTEM_ROLE)
+        stats['prompt_tokens'] = stats['system_tokens'] + counter.count(prompt)
+        stats['tokenizer'] = 'tiktoken' if counter.is_exact else 'estimate'
+        return prompt, stats
+
     @classmethod
     def generate_faq_prompt(cls, question: str, results: List[SearchResult]) -> str:
         """FAQ回答用のプロンプトを生成"""
         search_results_text = cls.format_search_results(results)
-        return cls.FAQ_ANSWER_TEMPLATE.format(
+        return cls.FAQ_ANSWER.render(
             question=question,
             search_results=search_results_text
         )
@@ -136,7 +335,7 @@ FAQ情報：
     def generate_manual_prompt(cls, question: str, results: List[SearchResult]) -> str:
         """マニュアル回答用のプロンプトを生成"""
         search_results_text = cls.format_search_results(results)
-        return cls.MANUAL_ANSWER_TEMPLATE.format(
+        return cls.MANUAL_ANSWER.render(
             question=question,
             search_results=search_results_text
         )
@@ -144,7 +343,7 @@ FAQ情報：
     @classmethod
     def generate_no_results_prompt(cls, question: str) -> str:
         """検索結果なしの場合のプロンプトを生成"""
-        return cls.NO_RESULTS_TEMPLATE.format(question=question)
+        return cls.NO_RESULTS.render(question=question)
 
     @classmethod
     def generate_multi_source_prompt(
@@ -157,12 +356,30 @@ FAQ情報：
         faq_text = cls.format_search_results(faq_results)
         manual_text = cls.format_search_results(manual_results)
         
-        return cls.MULTI_SOURCE_TEMPLATE.format(
+        return cls.MULTI_SOURCE.render(
             question=question,
             faq_results=faq_text,
             manual_results=manual_text
         )
 
+    @classmethod
+    def stable_prefix_report(cls) -> Dict[str, Dict[str, int]]:
+        """
+        テンプレートごとの不変プレフィックス（システムロール + 最初の
+        差し込み項目より前の部分）の長さ
+        """
+        counter = get_token_counter()
+        system_tokens = counter.count(cls.SYSTEM_ROLE)
+        
+        report = {}
+        for name in ('FAQ_ANSWER', 'MANUAL_ANSWER', 'MULTI_SOURCE', 'NO_RESULTS'):
+            prefix = getattr(cls, name).prefix
+            report[name] = {
+                'prefix_chars': len(cls.SYSTEM_ROLE) + len(prefix),
+                'prefix_tokens': system_tokens + counter.count(prefix)
+            }
+        return report
+
 
 # グローバルインスタンス
 prompts = PromptTemplates()
\ No newline at end of file
@@ -0,0 +1,89 @@
+"""
+高速なJSONレスポンス
+orjsonでPydanticモデルを直接シリアライズし、レスポンスモデルの再検証を省く。
+参照系のエンドポイント向けにETagによる条件付きリクエストも扱う
+"""
+
+import hashlib
+from typing import Any, Optional
+
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from .metrics import HTTP_NOT_MODIFIED
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj: Any) -> Any:
+    """orjsonが直接扱えない値の変換"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"JSONに変換できない型です: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    値をJSONのバイト列に変換
+    
+    Pydanticモデル（リストに含まれるものも）はそのまま渡せる。
+    メタデータに含まれるnumpyの数値もそのまま変換する。
+    """
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    orjsonでシリアライズするレスポンス
+    
+    エンドポイントからこのレスポンスを直接返すと、FastAPIによる
+    response_model での再検証と jsonable_encoder による変換を経由しない。
+    内部で生成した（検証済みの）モデルを返す場合にのみ使う。
+    """
+    
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    レスポンスの内容を決める値の組からETagを生成
+    
+    圧縮の有無で本文のバイト列が変わるため、弱いETag（W/）とする。
+    """
+    digest = hashlib.sha1("\n".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match のいずれかがETagと一致するか（弱い比較）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """
+    クライアントのキャッシュが最新なら304を返す
+    
+    Returns:
+        304レスポンス、またはNone（本文を生成して返す必要がある）
+    """
+    if not etag_matches(request.headers.get("if-none-match"), etag):
+        return None
+    
+    HTTP_NOT_MODIFIED.inc(request.url.path)
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def cacheable_response(content: Any, etag: str) -> ORJSONResponse:
+    """ETag付きのレスポンス（クライアントは毎回 If-None-Match で再検証する）"""
+    return ORJSONResponse(content, headers={"ETag": etag, "Cache-Control": "no-cache"})
@@ -0,0 +1,206 @@
+"""
+本番用のマルチワーカーサーバー
+モデルとインデックスを読み込んでからワーカーをフォークし、メモリを共有する
+"""
+
+import gc
+import os
+import random
+import signal
+import socket
+import time
+from typing import Callable, Dict, Optional
+
+import uvicorn
+
+from .configs import config
+from .custom_logger import get_module_logger
+
+logger = get_module_logger("server")
+
+# ワーカーが起動に失敗した場合の終了コード
+WORKER_BOOT_FAILURE = 3
+
+
+class PreforkServer:
+    """
+    プリフォーク型のサーバー
+    
+    親プロセスで重いリソース（埋め込みモデル・インデックス）を読み込み、
+    待ち受けソケットを作成してからワーカーをフォークする。読み込み済みの
+    メモリはワーカー間でコピーオンライト共有される。外部への接続
+    （ベクトルDB・OpenAI）はワーカーの起動処理で各自が行う。
+    
+    - ワーカーは WORKER_MAX_REQUESTS（+ ジッター）件処理すると終了し、
+      親プロセスが新しいワーカーを起動する（メモリ増加の抑制）
+    - SIGTERM / SIGINT を受けるとワーカーに SIGTERM を送り、処理中の
+      リクエストの完了を待ってから終了する（猶予を過ぎたら強制終了）
+    - 起動直後に異常終了したワーカーがあれば再起動を繰り返さず停止する
+    """
+    
+    POLL_INTERVAL = 0.2
+    
+    def __init__(
+        self,
+        app,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        workers: Optional[int] = None,
+        preload: Optional[Callable[[], None]] = None
+    ):
+        self.app = app
+        self.host = host or config.APP_HOST
+        self.port = port or config.APP_PORT
+        self.workers = max(1, workers or config.WEB_WORKERS)
+        self.preload = preload
+        self.socket: Optional[socket.socket] = None
+        self._children: Dict[int, float] = {}
+        self._stopping = False
+        self._stop_deadline: Optional[float] = None
+        self._exit_code = 0
+    
+    def run(self) -> int:
+        """サーバーを起動し、終了するまでワーカーを管理"""
+        # フォーク後のトークナイザーの並列処理によるデッドロックを防ぐ
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+        
+        if self.preload is not None:
+            start = time.perf_counter()
+            self.preload()
+            logger.info(f"共有リソースを読み込みました ({time.perf_counter() - start:.1f}秒)")
+        
+        # 読み込み済みのオブジェクトをGCの対象外にし、ワーカーでのページ複製を減らす
+        gc.collect()
+        gc.freeze()
+        
+        self.socket = self._bind()
+        logger.info(f"本番サーバーを起動中: {self.host}:{self.port} (ワーカー数: {self.workers})")
+        
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        
+        try:
+            for _ in range(self.workers):
+                self._spawn_worker()
+            
+            while self._children:
+                self._reap_workers()
+                if self._stopping:
+                    self._stop_workers()
+                time.sleep(self.POLL_INTERVAL)
+        finally:
+            self.socket.close()
+        
+        logger.info("本番サーバーを終了しました")
+        return self._exit_code
+    
+    def _bind(self) -> socket.socket:
+        """ワーカーで共有する待ち受けソケットを作成"""
+        family = socket.AF_INET6 if ":" in self.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(config.SERVER_BACKLOG)
+        sock.set_inheritable(True)
+        return sock
+    
+    def _spawn_worker(self):
+        """ワーカーをフォーク"""
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1
+            try:
+                exit_code = self._run_worker()
+            except SystemExit as e:
+                # uvicornは起動処理（lifespan）の失敗時に sys.exit する
+                exit_code = e.code if isinstance(e.code, int) else 1
+            except BaseException as e:
+                logger.error(f"ワーカーが異常終了しました: {e}")
+            finally:
+                os._exit(exit_code)
+        
+        self._children[pid] = time.monotonic()
+        logger.info(f"ワーカーを起動しました (pid: {pid})")
+    
+    def _run_worker(self) -> int:
+        """ワーカープロセスでuvicornを実行"""
+        # 親プロセスのシグナルハンドラーを解除（uvicornが自身のハンドラーを設定する）
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        random.seed()
+        
+        # 全ワーカーが同時に入れ替わらないようジッターを加える
+        max_requests = None
+        if config.WORKER_MAX_REQUESTS > 0:
+            max_requests = config.WORKER_MAX_REQUESTS + random.randint(0, config.WORKER_MAX_REQUESTS_JITTER)
+        
+        server = uvicorn.Server(uvicorn.Config(
+            self.app,
+            lifespan="on",
+            log_level=config.LOG_LEVEL.lower(),
+            limit_max_requests=max_requests,
+            timeout_graceful_shutdown=int(config.GRACEFUL_SHUTDOWN_TIMEOUT),
+            backlog=config.SERVER_BACKLOG
+        ))
+        server.run(sockets=[self.socket])
+        
+        return 0 if server.started else WORKER_BOOT_FAILURE
+    
+    def _reap_workers(self):
+        """終了したワーカーを回収し、必要なら再起動"""
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self._children.clear()
+                return
+            if pid == 0:
+                return
+            
+            started = self._children.pop(pid, None)
+            if started is None:
+                continue
+            
+            exit_code = os.waitstatus_to_exitcode(status)
+            uptime = time.monotonic() - started
+            if self._stopping:
+                logger.info(f"ワーカーが終了しました (pid: {pid}, 終了コード: {exit_code})")
+                continue
+            
+            if exit_code == WORKER_BOOT_FAILURE or (exit_code != 0 and uptime < config.WORKER_BOOT_TIMEOUT):
+                logger.error(f"ワーカーの起動に失敗しました (pid: {pid}, 終了コード: {exit_code})。サーバーを停止します")
+                self._exit_code = 1
+                self._stopping = True
+                continue
+            
+            if exit_code == 0:
+                logger.info(f"ワーカーを入れ替えます (pid: {pid}, 稼働 {uptime:.0f}秒)")
+            else:
+                logger.warning(f"ワーカーが異常終了したため再起動します (pid: {pid}, 終了コード: {exit_code})")
+            self._spawn_worker()
+    
+    def _handle_stop(self, signum, frame):
+        """終了シグナルを受けたら停止を開始"""
+        if not self._stopping:
+            logger.info(f"終了シグナルを受信しました ({signal.Signals(signum).name})。処理中のリクエストの完了を待ちます")
+        self._stopping = True
+    
+    def _stop_workers(self):
+        """ワーカーに終了を通知し、猶予を過ぎたら強制終了"""
+        now = time.monotonic()
+        if self._stop_deadline is None:
+            # uvicornの終了待ちより少し長く待つ
+            self._stop_deadline = now + config.GRACEFUL_SHUTDOWN_TIMEOUT + 5
+            self._signal_workers(signal.SIGTERM)
+        elif now > self._stop_deadline:
+            logger.warning(f"終了しないワーカーを強制終了します: {list(self._children)}")
+            self._signal_workers(signal.SIGKILL)
+            self._stop_deadline = now + config.GRACEFUL_SHUTDOWN_TIMEOUT
+    
+    def _signal_workers(self, signum: int):
+        """全ワーカーにシグナルを送信"""
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
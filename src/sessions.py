@@ -0,0 +1,374 @@
+"""
+会話セッションの管理
+会話ごとに直近のやり取り・クエリ埋め込み・検索結果をサーバー側で保持する
+（/ws/chat の接続、または context に session_id・previous_turn_ids を指定した /ask）
+"""
+
+import secrets
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .configs import config
+from .custom_logger import get_module_logger
+from .metrics import CHAT_SESSIONS, SESSION_EVICTIONS
+from .models import SearchResult
+
+logger = get_module_logger("sessions")
+
+# やり取りのID（"<セッションID>:<連番>"）の区切り文字（セッションIDには含まれない）
+TURN_ID_SEPARATOR = ":"
+
+
+@dataclass(slots=True)
+class CachedRetrieval:
+    """会話中に検索した結果（追加質問での再利用・再順位付けの元）"""
+    anchor_embedding: List[float]               # 検索した質問のクエリ埋め込み
+    results: List[SearchResult]
+    strategy: str
+    index_token: Tuple[str, int]                # 検索時のインデックス（コレクション, バージョン）
+
+
+@dataclass(slots=True)
+class ConversationTurn:
+    """会話の1往復"""
+    turn_id: str
+    question: str
+    answer: str
+    query_embedding: Optional[List[float]]
+    sources: List[SearchResult]
+    search_strategy: str
+    retrieval: Optional[CachedRetrieval] = None  # 回答に使った検索結果の元（再利用した場合は元の検索）
+    created_at: float = field(default_factory=time.time)
+
+
+def session_id_of(turn_id: str) -> Optional[str]:
+    """やり取りのIDからセッションIDを取得（形式が異なればNone）"""
+    session_id, separator, _ = turn_id.rpartition(TURN_ID_SEPARATOR)
+    return session_id if separator and session_id else None
+
+
+def previous_turn_ids(context: Dict[str, Any]) -> Optional[List[str]]:
+    """context の previous_turn_ids（指定がない・リストでない場合はNone）"""
+    turn_ids = context.get("previous_turn_ids")
+    if not isinstance(turn_ids, list):
+        return None
+    return [turn_id for turn_id in turn_ids if isinstance(turn_id, str)]
+
+
+def cosine_similarity(a: Optional[List[float]], b: Optional[List[float]]) -> float:
+    """埋め込みのコサイン類似度（どちらかがない場合は0）"""
+    if a is None or b is None:
+        return 0.0
+    a_vec = np.asarray(a, dtype=np.float32)
+    b_vec = np.asarray(b, dtype=np.float32)
+    norm = float(np.linalg.norm(a_vec) * np.linalg.norm(b_vec))
+    if norm == 0.0:
+        return 0.0
+    return float(np.dot(a_vec, b_vec) / norm)
+
+
+class ChatSession:
+    """
+    1つの会話のサーバー側の状態
+    
+    直近 SESSION_MAX_TURNS 件のやり取りと、質問文ごとのクエリ埋め込み
+    （SESSION_EMBEDDING_CACHE_SIZE 件まで）を保持する。各やり取りには
+    回答に使った検索結果の元（CachedRetrieval）を残し、追加質問では
+    参照するやり取りの検索結果を再利用・再順位付けする。
+    """
+    
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.created_at = time.time()
+        self.last_active = time.monotonic()
+        self.turns: Deque[ConversationTurn] = deque(maxlen=config.SESSION_MAX_TURNS)
+        self._embeddings: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._turn_sequence = 0
+        self.active_requests = 0
+    
+    @property
+    def busy(self) -> bool:
+        """回答を処理中か"""
+        return self.active_requests > 0
+    
+    @contextmanager
+    def in_use(self):
+        """
+        処理中の間はアイドル時間による破棄の対象外にする
+        
+        保管中のセッションは SessionStore.in_use を使う（終了時に利用順も更新する）。
+        """
+        self.active_requests += 1
+        try:
+            yield self
+        finally:
+            self.active_requests -= 1
+            self.touch()
+    
+    def touch(self):
+        """最終利用時刻を更新"""
+        self.last_active = time.monotonic()
+    
+    def idle_seconds(self) -> float:
+        """最後に利用されてからの経過時間（秒）"""
+        return time.monotonic() - self.last_active
+    
+    def cached_embedding(self, question: str) -> Optional[List[float]]:
+        """同じ質問文のクエリ埋め込み（未計算ならNone）"""
+        embedding = self._embeddings.get(question)
+        if embedding is not None:
+            self._embeddings.move_to_end(question)
+        return embedding
+    
+    def cache_embedding(self, question: str, embedding: List[float]):
+        """クエリ埋め込みを保持（上限を超えたら古いものから破棄）"""
+        self._embeddings[question] = embedding
+        self._embeddings.move_to_end(question)
+        while len(self._embeddings) > config.SESSION_EMBEDDING_CACHE_SIZE:
+            self._embeddings.popitem(last=False)
+    
+    def new_turn_id(self) -> str:
+        """次のやり取りのIDを発行（消去後も重複しない）"""
+        self._turn_sequence += 1
+        return f"{self.session_id}{TURN_ID_SEPARATOR}{self._turn_sequence}"
+    
+    def add_turn(self, turn: ConversationTurn):
+        """やり取りを記録"""
+        self.turns.append(turn)
+    
+    def referenced_turns(self, turn_ids: Optional[List[str]] = None) -> List[ConversationTurn]:
+        """
+        質問が参照するやり取り（古い順）
+        
+        Args:
+            turn_ids: 参照するやり取りのID（省略時は直近 SESSION_PROMPT_TURNS 件）。
+                      破棄済み・他のセッションのIDは無視する
+        """
+        if turn_ids is None:
+            if config.SESSION_PROMPT_TURNS <= 0:
+                return []
+            return list(self.turns)[-config.SESSION_PROMPT_TURNS:]
+        
+        wanted = set(turn_ids)
+        return [turn for turn in self.turns if turn.turn_id in wanted]
+    
+    def history_messages(self, turns: Optional[List[ConversationTurn]] = None) -> List[Dict[str, str]]:
+        """
+        やり取りをLLMのメッセージ形式に変換（古い順）
+        
+        プロンプトのトークン数を抑えるため、最大 SESSION_PROMPT_TURNS 件とする。
+        """
+        turns = self.referenced_turns() if turns is None else turns
+        if config.SESSION_PROMPT_TURNS <= 0:
+            return []
+        
+        messages = []
+        for turn in turns[-config.SESSION_PROMPT_TURNS:]:
+            messages.append({"role": "user", "content": turn.question})
+            messages.append({"role": "assistant", "content": turn.answer})
+        return messages
+    
+    def reset(self):
+        """会話の内容を消去（セッションIDは維持）"""
+        self.turns.clear()
+        self._embeddings.clear()
+    
+    def summary(self) -> Dict[str, Any]:
+        """クライアントに返すセッションの概要"""
+        return {
+            "session_id": self.session_id,
+            "turns": len(self.turns),
+            "last_turn_id": self.turns[-1].turn_id if self.turns else None,
+            "idle_timeout_seconds": config.SESSION_IDLE_SECONDS
+        }
+
+
+class SessionStore:
+    """
+    会話セッションの保管
+    
+    最大 max_sessions 件を保持し、超えた場合は最も長く使われていない
+    セッションから破棄する（処理中のセッションは除く）。idle_seconds 以上
+    使われていないセッションは参照・作成のたびに破棄する。接続が切れても
+    アイドル時間内であれば同じセッションIDで再開できる。
+    
+    セッションはワーカープロセスごとのメモリに保持し、ワーカー間では
+    共有しない。複数ワーカー（WEB_WORKERS）で /ask の会話を続ける場合は、
+    ロードバランサーで session_id ごとに同じワーカーへ振り分ける必要がある
+    （別のワーカーに届いた質問は新しい会話として扱われる）。/ws/chat は
+    接続が1つのワーカーに固定されるため影響を受けない。
+    
+    イベントループのスレッドからのみ呼び出す前提でロックは取らない。
+    """
+    
+    def __init__(self, max_sessions: Optional[int] = None, idle_seconds: Optional[float] = None):
+        self.max_sessions = max_sessions or config.SESSION_MAX_SESSIONS
+        self.idle_seconds = idle_seconds or config.SESSION_IDLE_SECONDS
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self.stats = {
+            'created': 0,
+            'resumed': 0,
+            'evicted': {
+                'idle': 0,
+                'capacity': 0
+            }
+        }
+    
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        """セッションを取得（存在しない・期限切れならNone）"""
+        self.evict_idle()
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        session.touch()
+        self._sessions.move_to_end(session_id)
+        return session
+    
+    def create(self) -> ChatSession:
+        """新しいセッションを作成"""
+        self.evict_idle()
+        session = ChatSession(secrets.token_urlsafe(16))
+        self._sessions[session.session_id] = session
+        self.stats['created'] += 1
+        CHAT_SESSIONS.inc()
+        self._enforce_capacity()
+        return session
+    
+    def keep_alive(self, session: ChatSession):
+        """接続中のセッションの利用を記録（破棄されていれば登録し直す）"""
+        session.touch()
+        if session.session_id not in self._sessions:
+            self._sessions[session.session_id] = session
+            CHAT_SESSIONS.inc()
+            self._enforce_capacity()
+        self._sessions.move_to_end(session.session_id)
+    
+    @contextmanager
+    def in_use(self, session: ChatSession):
+        """
+        セッションを処理中にする（終了時に最近使ったものとして記録）
+        
+        アイドル時間による破棄は保管順が最終利用順であることを前提とするため、
+        処理の終了時に最終利用時刻とあわせて保管順も更新する。
+        """
+        try:
+            with session.in_use():
+                yield session
+        finally:
+            self.keep_alive(session)
+    
+    def get_or_create(self, session_id: Optional[str] = None) -> Tuple[ChatSession, bool]:
+        """
+        指定のセッションを再開、なければ新しく作成
+        
+        Returns:
+            (セッション, 再開したかどうか)
+        """
+        if session_id:
+            session = self.get(session_id)
+            if session is not None:
+                self.stats['resumed'] += 1
+                return session, True
+        return self.create(), False
+    
+    def get_for_context(self, context: Dict[str, Any]) -> Optional[ChatSession]:
+        """
+        /ask の context で指定された会話のセッションを取得
+        
+        context に session_id または previous_turn_ids があれば会話の続きとして
+        扱う。session_id を省略した場合はやり取りのIDからセッションを特定し、
+        該当するセッションがない（期限切れ・未指定）場合は新しく作成する。
+        
+        Returns:
+            セッション（会話として扱わない場合はNone）
+        """
+        turn_ids = previous_turn_ids(context)
+        if "session_id" not in context and turn_ids is None:
+            return None
+        
+        session_id = context.get("session_id")
+        if not isinstance(session_id, str) or not session_id:
+            session_id = next(filter(None, map(session_id_of, turn_ids or [])), None)
+        session, _ = self.get_or_create(session_id)
+        return session
+    
+    def remove(self, session_id: str):
+        """セッションを破棄"""
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            CHAT_SESSIONS.dec()
+    
+    def evict_idle(self) -> int:
+        """
+        アイドル時間を超えたセッションを破棄
+        
+        処理中のセッションは破棄しない。
+        
+        Returns:
+            破棄した件数
+        """
+        # 最終利用の古い順に並んでいるため、期限内のものが見つかれば打ち切る
+        expired = []
+        for session in self._sessions.values():
+            if session.idle_seconds() < self.idle_seconds:
+                break
+            if not session.busy:
+                expired.append(session)
+        for session in expired:
+            del self._sessions[session.session_id]
+            self._evicted(session, 'idle')
+        return len(expired)
+    
+    def _enforce_capacity(self):
+        """
+        上限を超えた分を最も長く使われていないものから破棄
+        
+        処理中のセッションと追加したばかりのセッション（末尾）は破棄しない
+        （ほかがすべて処理中なら一時的に上限を超える）。
+        """
+        excess = len(self._sessions) - self.max_sessions
+        if excess <= 0:
+            return
+        evicted = []
+        for session in islice(self._sessions.values(), len(self._sessions) - 1):
+            if len(evicted) >= excess:
+                break
+            if not session.busy:
+                evicted.append(session)
+        for session in evicted:
+            del self._sessions[session.session_id]
+            self._evicted(session, 'capacity')
+    
+    def _evicted(self, session: ChatSession, reason: str):
+        self.stats['evicted'][reason] += 1
+        SESSION_EVICTIONS.inc(reason)
+        CHAT_SESSIONS.dec()
+        logger.info(f"会話セッションを破棄しました ({reason}): {session.session_id} ({len(session.turns)}往復)")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """セッションの統計を取得"""
+        return {
+            'active': len(self._sessions),
+            'max_sessions': self.max_sessions,
+            'idle_timeout_seconds': self.idle_seconds,
+            'created': self.stats['created'],
+            'resumed': self.stats['resumed'],
+            'evicted': dict(self.stats['evicted'])
+        }
+
+
+# グローバルインスタンス
+_session_store = None
+
+def get_session_store() -> SessionStore:
+    """会話セッションのグローバルインスタンスを取得"""
+    global _session_store
+    if _session_store is None:
+        _session_store = SessionStore()
+    return _session_store
@@ -0,0 +1,173 @@
+"""
+処理段階ごとの所要時間の計測
+リクエスト単位で各段階（埋め込み・検索・プロンプト構築・LLM）の時間を集計する
+"""
+
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, Optional
+
+import numpy as np
+
+from .configs import config
+from .custom_logger import get_module_logger
+
+logger = get_module_logger("timing")
+
+# 処理中のリクエストの計測器（リクエストごとのコンテキストで保持）
+_current_timer: contextvars.ContextVar[Optional["RequestTimer"]] = contextvars.ContextVar(
+    "current_timer", default=None
+)
+
+
+class RequestTimer:
+    """
+    1リクエスト分の段階別所要時間
+    
+    検索はスレッドプールで並行実行されるため、記録はロックで保護する。
+    同じ段階を複数回通った場合（プローブと追加検索など）は合計する。
+    """
+    
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans: Dict[str, float] = {}
+        self._lock = threading.Lock()
+    
+    def record(self, name: str, elapsed_ms: float):
+        """段階の所要時間（ミリ秒）を加算"""
+        with self._lock:
+            self.spans[name] = self.spans.get(name, 0.0) + elapsed_ms
+    
+    def elapsed_ms(self) -> float:
+        """計測開始からの経過時間（ミリ秒）"""
+        return (time.perf_counter() - self.start) * 1000
+    
+    def summary(self) -> Dict[str, float]:
+        """段階別の所要時間（ミリ秒, 記録順）と全体の時間"""
+        with self._lock:
+            timings = {name: round(elapsed, 2) for name, elapsed in self.spans.items()}
+        timings['total'] = round(self.elapsed_ms(), 2)
+        return timings
+
+
+def start_request() -> RequestTimer:
+    """現在のコンテキストでリクエストの計測を開始"""
+    timer = RequestTimer()
+    _current_timer.set(timer)
+    return timer
+
+
+def current_timer() -> Optional[RequestTimer]:
+    """現在のコンテキストの計測器（計測中でなければNone）"""
+    return _current_timer.get()
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    処理段階の所要時間を計測
+    
+    計測中のリクエストがない場合（スクリプトからの呼び出しなど）は
+    何も記録しない。
+    
+    Args:
+        name: 段階名（Server-Timingのメトリクス名にも使う）
+    """
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.record(name, (time.perf_counter() - start) * 1000)
+
+
+def bind_context(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    現在のコンテキスト（計測器を含む）で関数を実行するラッパー
+    
+    スレッドプールのワーカーにはコンテキストが引き継がれないため、
+    submit する関数をこれで包む。
+    """
+    context = contextvars.copy_context()
+    
+    def run(*args, **kwargs):
+        return context.run(func, *args, **kwargs)
+    
+    return run
+
+
+def format_server_timing(timings: Dict[str, float]) -> str:
+    """段階別の所要時間をServer-Timingヘッダーの値に変換"""
+    return ", ".join(f"{name};dur={elapsed:.1f}" for name, elapsed in timings.items())
+
+
+class LatencyRecorder:
+    """
+    段階別の所要時間の直近の分布を保持
+    
+    段階ごとに直近 window_size 件のリクエストの所要時間を保持し、
+    統計の取得時にパーセンタイルを計算する。
+    """
+    
+    PERCENTILES = (50, 95, 99)
+    
+    def __init__(self, window_size: Optional[int] = None):
+        self.window_size = window_size or config.TIMING_WINDOW_SIZE
+        self._samples: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, timings: Dict[str, float]):
+        """1リクエスト分の段階別所要時間を記録"""
+        with self._lock:
+            for name, elapsed in timings.items():
+                samples = self._samples.get(name)
+                if samples is None:
+                    samples = self._samples[name] = deque(maxlen=self.window_size)
+                samples.append(elapsed)
+                self._counts[name] = self._counts.get(name, 0) + 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """段階別のパーセンタイル（ミリ秒）"""
+        with self._lock:
+            snapshot = {name: list(samples) for name, samples in self._samples.items()}
+            counts = dict(self._counts)
+        
+        stats = {}
+        for name, samples in snapshot.items():
+            values = np.percentile(samples, self.PERCENTILES)
+            stats[name] = {
+                'count': counts[name],
+                'window': len(samples),
+                **{f"p{p}": round(float(value), 2) for p, value in zip(self.PERCENTILES, values)},
+                'mean': round(float(np.mean(samples)), 2)
+            }
+        return {'window_size': self.window_size, 'stages': stats}
+
+
+def finish_request(timer: RequestTimer) -> Dict[str, float]:
+    """リクエストの計測を終了し、段階別の所要時間を分布に記録"""
+    timings = timer.summary()
+    try:
+        get_latency_recorder().observe(timings)
+    except Exception as e:
+        logger.error(f"所要時間の記録に失敗しました: {e}")
+    return timings
+
+
+# グローバルインスタンス
+_latency_recorder = None
+
+def get_latency_recorder() -> LatencyRecorder:
+    """所要時間の分布のグローバルインスタンスを取得"""
+    global _latency_recorder
+    if _latency_recorder is None:
+        _latency_recorder = LatencyRecorder()
+    return _latency_recorder
@@ -0,0 +1,136 @@
+"""
+トークン数の計測
+プロンプトの予算管理用にローカルのトークナイザーでトークン数を数える
+"""
+
+import math
+import re
+from typing import List, Optional
+
+from .configs import config
+from .custom_logger import get_module_logger
+
+logger = get_module_logger("tokenizer")
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken は langchain-openai 経由の任意依存
+    tiktoken = None
+
+# 文の区切り（句点・感嘆符・疑問符・改行の直後）
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[。！？!?\n])|(?<=\.)(?=\s)")
+
+TRUNCATION_MARK = "…"
+
+
+class TokenCounter:
+    """
+    トークン数の計測クラス
+    
+    tiktoken が利用できればモデルに対応するエンコーディングを使い、
+    利用できない場合（未インストール・オフライン環境）は文字種から
+    トークン数を概算する（ASCIIは約4文字、それ以外は1文字で1トークン）。
+    """
+    
+    def __init__(self, model: Optional[str] = None):
+        self.model = model or config.OPENAI_MODEL
+        self.encoding = self._load_encoding()
+    
+    def _load_encoding(self):
+        """モデルに対応するエンコーディングを読み込み"""
+        if tiktoken is None:
+            logger.warning("tiktoken が見つからないため、トークン数を概算します")
+            return None
+        
+        try:
+            return tiktoken.encoding_for_model(self.model)
+        except KeyError:
+            pass
+        except Exception as e:
+            logger.warning(f"トークナイザーの読み込みに失敗したため、トークン数を概算します: {e}")
+            return None
+        
+        try:
+            return tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            logger.warning(f"トークナイザーの読み込みに失敗したため、トークン数を概算します: {e}")
+            return None
+    
+    @property
+    def is_exact(self) -> bool:
+        """トークナイザーによる正確な計測かどうか"""
+        return self.encoding is not None
+    
+    def count(self, text: str) -> int:
+        """テキストのトークン数"""
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        
+        ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+        return math.ceil(ascii_chars / 4) + (len(text) - ascii_chars)
+    
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """
+        トークン数の上限に収まるよう文の区切りで切り詰め
+        
+        先頭の文だけで上限を超える場合は、その文を途中で切る。
+        
+        Args:
+            text: 対象テキスト
+            max_tokens: トークン数の上限
+        
+        Returns:
+            切り詰めたテキスト（切り詰めた場合は末尾に「…」を付ける）
+        """
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        
+        budget = max_tokens - self.count(TRUNCATION_MARK)
+        kept: List[str] = []
+        used = 0
+        for sentence in split_sentences(text):
+            tokens = self.count(sentence)
+            if used + tokens > budget:
+                break
+            kept.append(sentence)
+            used += tokens
+        
+        if kept:
+            return "".join(kept).rstrip() + TRUNCATION_MARK
+        
+        return self._truncate_tokens(text, budget) + TRUNCATION_MARK
+    
+    def _truncate_tokens(self, text: str, max_tokens: int) -> str:
+        """文の途中でトークン数の上限まで切り詰め"""
+        if max_tokens <= 0:
+            return ""
+        if self.encoding is not None:
+            return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:max_tokens])
+        
+        # 概算の場合は1文字ずつ数える
+        used = 0
+        for index, ch in enumerate(text):
+            used += 0.25 if ord(ch) < 128 else 1
+            if used > max_tokens:
+                return text[:index]
+        return text
+
+
+def split_sentences(text: str) -> List[str]:
+    """テキストを文に分割（区切り文字は直前の文に含める）"""
+    return [sentence for sentence in _SENTENCE_BOUNDARY.split(text) if sentence]
+
+
+# グローバルインスタンス
+_token_counter = None
+
+def get_token_counter() -> TokenCounter:
+    """トークン計測のグローバルインスタンスを取得"""
+    global _token_counter
+    if _token_counter is None:
+        _token_counter = TokenCounter()
+    return _token_counter
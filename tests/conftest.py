@@ -0,0 +1,12 @@
+"""
+テスト共通の設定
+"""
+
+import sys
+from pathlib import Path
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+
+# tool は src を経由して自身を参照するため、src から読み込む（tool を先に読み込むと循環インポートになる）
+import src  # noqa: E402,F401
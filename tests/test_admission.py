@@ -0,0 +1,219 @@
+"""
+受付制御（TokenBucketLimiter・AdmissionController）のテスト
+"""
+
+import asyncio
+
+import pytest
+
+import src.admission as admission_module
+from src.admission import AdmissionController, AdmissionRejected, TokenBucketLimiter
+
+
+class FakeClock:
+    """time.monotonic の代わりに進める時計"""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(admission_module.time, "monotonic", clock.monotonic)
+    return clock
+
+
+def make_controller(**kwargs):
+    controller = AdmissionController(**kwargs)
+    # レート制限は個別にテストする
+    controller.rate_limiter = TokenBucketLimiter(rate_per_minute=0)
+    return controller
+
+
+def test_token_bucket_allows_burst_then_refills(clock):
+    """burst 件まで連続で受け付け、補充されれば再び受け付ける"""
+    limiter = TokenBucketLimiter(rate_per_minute=60, burst=2, max_clients=10)
+    
+    assert limiter.acquire("a") == 0.0
+    assert limiter.acquire("a") == 0.0
+    assert limiter.acquire("a") == pytest.approx(1.0)
+    # 別のクライアントは影響を受けない
+    assert limiter.acquire("b") == 0.0
+    
+    clock.now += 1.0
+    assert limiter.acquire("a") == 0.0
+    assert limiter.acquire("a") == pytest.approx(1.0)
+
+
+def test_token_bucket_evicts_oldest_client(clock):
+    """クライアント数が上限を超えたら最も古いものを破棄する"""
+    limiter = TokenBucketLimiter(rate_per_minute=60, burst=1, max_clients=2)
+    
+    limiter.acquire("a")
+    limiter.acquire("b")
+    limiter.acquire("c")
+    
+    assert list(limiter._buckets) == ["b", "c"]
+    # 破棄されたクライアントは満杯のバケットから再開する
+    assert limiter.acquire("a") == 0.0
+
+
+def test_token_bucket_disabled():
+    """レートが0なら制限しない"""
+    limiter = TokenBucketLimiter(rate_per_minute=0, burst=1)
+    
+    assert not limiter.enabled
+    assert all(limiter.acquire("a") == 0.0 for _ in range(5))
+
+
+def test_rate_limited_request_is_rejected(clock):
+    """レート制限を超えたリクエストは429で拒否する"""
+    controller = make_controller(max_concurrent=1)
+    controller.rate_limiter = TokenBucketLimiter(rate_per_minute=60, burst=1)
+    
+    async def scenario():
+        controller.release(await controller.acquire("a"))
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await controller.acquire("a")
+        return excinfo.value
+    
+    rejected = asyncio.run(scenario())
+    assert rejected.status_code == 429
+    assert rejected.reason == "rate_limited"
+    assert rejected.retry_after == 1
+
+
+def test_release_hands_slot_to_waiter_in_order():
+    """枠は解放時に待っているリクエストへ到着順に引き継ぐ"""
+    controller = make_controller(max_concurrent=1, max_queue=2, max_wait=5)
+    order = []
+    
+    async def request(name):
+        admitted_at = await controller.acquire(name)
+        order.append(name)
+        await asyncio.sleep(0)
+        controller.release(admitted_at)
+    
+    async def scenario():
+        admitted_at = await controller.acquire("first")
+        tasks = [asyncio.create_task(request(name)) for name in ("second", "third")]
+        await asyncio.sleep(0)
+        assert controller.get_stats()["queue_depth"] == 2
+        
+        controller.release(admitted_at)
+        # 引き継ぎの間も処理中の件数は上限を超えない
+        assert controller.active == 1
+        await asyncio.gather(*tasks)
+    
+    asyncio.run(scenario())
+    assert order == ["second", "third"]
+    assert controller.active == 0
+    assert controller.get_stats()["admitted"] == 3
+
+
+def test_queue_full_is_rejected_immediately():
+    """待ち行列が満杯なら待たせずに503で拒否する"""
+    controller = make_controller(max_concurrent=1, max_queue=1, max_wait=5)
+    
+    async def scenario():
+        admitted_at = await controller.acquire("first")
+        waiting = asyncio.create_task(controller.acquire("second"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await controller.acquire("third")
+        controller.release(admitted_at)
+        controller.release(await waiting)
+        return excinfo.value
+    
+    rejected = asyncio.run(scenario())
+    assert rejected.status_code == 503
+    assert rejected.reason == "queue_full"
+    assert controller.active == 0
+
+
+def test_queue_timeout_removes_waiter():
+    """待ち時間を超えたリクエストは拒否して待ち行列から外す"""
+    controller = make_controller(max_concurrent=1, max_queue=1, max_wait=0.01)
+    
+    async def scenario():
+        admitted_at = await controller.acquire("first")
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await controller.acquire("second")
+        assert controller.get_stats()["queue_depth"] == 0
+        controller.release(admitted_at)
+        return excinfo.value
+    
+    rejected = asyncio.run(scenario())
+    assert rejected.reason == "queue_timeout"
+    assert controller.active == 0
+
+
+def test_slot_granted_at_timeout_is_kept(monkeypatch):
+    """タイムアウトと同時に枠を譲り受けた場合は拒否せずに処理する"""
+    controller = make_controller(max_concurrent=1, max_queue=1, max_wait=5)
+    
+    async def scenario():
+        admitted_at = await controller.acquire("first")
+        
+        async def wait_for_granted_at_timeout(awaitable, timeout):
+            # 待機の期限切れと同じタイミングで枠が解放される
+            controller.release(admitted_at)
+            awaitable.cancel()
+            raise asyncio.TimeoutError
+        
+        monkeypatch.setattr(admission_module.asyncio, "wait_for", wait_for_granted_at_timeout)
+        second_admitted_at = await controller.acquire("second")
+        monkeypatch.undo()
+        
+        assert controller.active == 1
+        controller.release(second_admitted_at)
+    
+    asyncio.run(scenario())
+    assert controller.active == 0
+    assert controller.get_stats()["rejected"]["queue_timeout"] == 0
+
+
+def test_cancelled_waiter_does_not_leak_granted_slot():
+    """枠を譲り受けた直後に取り消されても枠は失われない"""
+    controller = make_controller(max_concurrent=1, max_queue=1, max_wait=5)
+    
+    async def scenario():
+        admitted_at = await controller.acquire("first")
+        waiting = asyncio.create_task(controller.acquire("second"))
+        await asyncio.sleep(0)
+        
+        # 枠を引き継いだが、再開する前にクライアントが切断した
+        controller.release(admitted_at)
+        waiting.cancel()
+        try:
+            # 待機が完了済みなら取り消しより結果が優先される場合がある（呼び出し元が枠を返す）
+            controller.release(await waiting)
+        except asyncio.CancelledError:
+            pass
+    
+    asyncio.run(scenario())
+    assert controller.active == 0
+    assert controller.get_stats()["queue_depth"] == 0
+
+
+def test_cancelled_waiter_leaves_queue():
+    """待機中に取り消されたリクエストは待ち行列から外れ、枠を受け取らない"""
+    controller = make_controller(max_concurrent=1, max_queue=1, max_wait=5)
+    
+    async def scenario():
+        admitted_at = await controller.acquire("first")
+        waiting = asyncio.create_task(controller.acquire("second"))
+        await asyncio.sleep(0)
+        
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert controller.get_stats()["queue_depth"] == 0
+        controller.release(admitted_at)
+    
+    asyncio.run(scenario())
+    assert controller.active == 0
@@ -0,0 +1,75 @@
+"""
+FAQ CSVの列指向の読み込み（iter_faq_chunks）のテスト
+"""
+
+import pandas as pd
+
+from scripts.bench_faq_loading import load_legacy
+from scripts.create_index import iter_faq_chunks
+
+FIELDS = ('question', 'answer', 'index')
+
+
+def _write_csv(path, rows):
+    pd.DataFrame(rows, columns=['question', 'answer']).to_csv(path, index=False, encoding='utf-8')
+
+
+def _load_columnar(path, chunk_size):
+    return [doc for chunk in iter_faq_chunks(path, chunk_size=chunk_size) for doc in chunk]
+
+
+def _comparable(doc):
+    return (doc['content'], *(doc['metadata'][field] for field in FIELDS))
+
+
+def test_columnar_matches_per_row_path_on_filled_rows(tmp_path):
+    """空欄のない行は従来の行ごとの経路と同じドキュメントになる（チャンク境界をまたいでも同じ）"""
+    path = tmp_path / "faq.csv"
+    _write_csv(path, [
+        ("パスワードを忘れました", "ログイン画面から再設定できます。"),
+        ("", "質問が空欄の行"),
+        ("有給申請の締め切りは？", ""),
+        ("経費精算の方法", "ポータルの「経費」から申請します。"),
+        ("   ", "空白だけの質問"),
+        ("VPNに接続できない", "情報システム部に連絡してください。"),
+    ])
+    
+    legacy = load_legacy(path)
+    columnar = _load_columnar(path, chunk_size=2)
+    
+    kept_indexes = {doc['metadata']['index'] for doc in columnar}
+    assert kept_indexes == {0, 3, 5}
+    assert [_comparable(doc) for doc in columnar] == [
+        _comparable(doc) for doc in legacy if doc['metadata']['index'] in kept_indexes
+    ]
+
+
+def test_columnar_drops_rows_the_per_row_path_indexed_as_nan(tmp_path):
+    """従来の経路が "nan" として索引していた空欄の行は除外する"""
+    path = tmp_path / "faq.csv"
+    _write_csv(path, [
+        ("パスワードを忘れました", "ログイン画面から再設定できます。"),
+        ("", "質問が空欄の行"),
+        ("有給申請の締め切りは？", ""),
+    ])
+    
+    legacy = {doc['metadata']['index']: doc for doc in load_legacy(path)}
+    assert legacy[1]['metadata']['question'] == "nan"
+    assert legacy[2]['metadata']['answer'] == "nan"
+    
+    columnar = _load_columnar(path, chunk_size=10)
+    assert [doc['metadata']['index'] for doc in columnar] == [0]
+    assert all("nan" not in doc['content'] for doc in columnar)
+
+
+def test_columnar_strips_whitespace_and_collapses_identical_rows(tmp_path):
+    """前後の空白を除き、完全に同一の行は1件にまとめる"""
+    path = tmp_path / "faq.csv"
+    _write_csv(path, [
+        (" 会議室の予約 ", "予約システムから行います。 "),
+        ("会議室の予約", "予約システムから行います。"),
+    ])
+    
+    columnar = _load_columnar(path, chunk_size=1)
+    assert len(columnar) == 1
+    assert columnar[0]['content'] == "質問: 会議室の予約\n回答: 予約システムから行います。"
@@ -0,0 +1,104 @@
+"""
+会話中の追加質問の検索結果の再利用（SupportAgent._retrieve_for_session）のテスト
+"""
+
+import asyncio
+
+import pytest
+
+import src.agent as agent_module
+from src.agent import SupportAgent
+from src.index_registry import IndexRegistry
+from src.models import SearchResult
+from src.sessions import ChatSession, ConversationTurn
+
+
+class FakeSearchEngine:
+    """質問によらず同じ埋め込みを返し、検索回数を数える検索エンジン"""
+    
+    def __init__(self):
+        self.searches = 0
+    
+    def encode_query(self, query):
+        return [1.0, 0.0]
+    
+    def smart_search(self, query, context=None):
+        self.searches += 1
+        result = SearchResult(
+            content=f"検索{self.searches}",
+            source="FAQ",
+            score=0.9,
+            metadata={"doc_id": f"faq_{self.searches}"}
+        )
+        result.set_embedding([1.0, 0.0])
+        return [result], "general"
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    registry = IndexRegistry(
+        alias_file=tmp_path / "index_alias.json",
+        alias="support_bot",
+        version_file=tmp_path / "index_version.json"
+    )
+    monkeypatch.setattr(agent_module, "get_index_registry", lambda: registry)
+    return registry
+
+
+@pytest.fixture
+def agent():
+    agent = SupportAgent.__new__(SupportAgent)
+    agent.search_engine = FakeSearchEngine()
+    return agent
+
+
+def ask(agent, session, question):
+    """質問の検索結果を取得し、やり取りとして記録"""
+    turns = session.referenced_turns()
+    results, strategy, embedding, retrieval, decision = asyncio.run(
+        agent._retrieve_for_session(question, {}, session, turns)
+    )
+    session.add_turn(ConversationTurn(
+        turn_id=session.new_turn_id(),
+        question=question,
+        answer="回答",
+        query_embedding=embedding,
+        sources=results,
+        search_strategy=strategy,
+        retrieval=retrieval
+    ))
+    return results, decision
+
+
+def test_followup_reuses_results_from_same_index(registry, agent):
+    """インデックスが変わらなければ近い質問の検索結果を再利用する"""
+    session = ChatSession("session")
+    
+    first, decision = ask(agent, session, "パスワードを忘れた")
+    assert decision == "searched"
+    
+    second, decision = ask(agent, session, "パスワードを忘れました")
+    assert decision == "reused"
+    assert second == first
+    assert agent.search_engine.searches == 1
+
+
+@pytest.mark.parametrize("update", [
+    lambda registry: registry.bump_version(["faq_1"]),
+    lambda registry: registry.activate("support_bot__v2")
+])
+def test_followup_searches_again_after_index_update(registry, agent, update):
+    """インデックスの更新・切り替え後は以前の検索結果を再利用・並べ替えしない"""
+    session = ChatSession("session")
+    ask(agent, session, "パスワードを忘れた")
+    
+    update(registry)
+    
+    results, decision = ask(agent, session, "パスワードを忘れました")
+    assert decision == "searched"
+    assert results[0].content == "検索2"
+    assert agent.search_engine.searches == 2
+    
+    # 更新後の検索結果は再利用できる
+    _, decision = ask(agent, session, "パスワードを忘れました")
+    assert decision == "reused"
@@ -0,0 +1,97 @@
+"""
+インデックスのバージョン管理（IndexRegistry）のテスト
+"""
+
+import pytest
+
+from src.index_registry import IndexRegistry
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return IndexRegistry(
+        alias_file=tmp_path / "index_alias.json",
+        alias="support_bot",
+        version_file=tmp_path / "index_version.json"
+    )
+
+
+def test_first_activation_keeps_legacy_collection_for_rollback(registry):
+    """初回の切り替えではバージョンなしのコレクションを履歴に残す"""
+    previous = registry.activate("support_bot__v1")
+    
+    assert previous == "support_bot"
+    assert registry.read()["history"] == ["support_bot"]
+    assert registry.rollback() == "support_bot"
+    assert registry.resolve_collection_name() == "support_bot"
+
+
+def test_first_activation_without_legacy_collection(registry):
+    """バージョンなしのコレクションが存在しなければ履歴に残さない"""
+    assert registry.activate("support_bot__v1", legacy_exists=False) is None
+    assert registry.read()["history"] == []
+    assert registry.rollback() is None
+
+
+def test_activate_pushes_previous_versions_newest_first(registry):
+    """切り替え前のバージョンが新しい順に履歴に並ぶ"""
+    for name in ("support_bot__v1", "support_bot__v2", "support_bot__v3"):
+        registry.activate(name)
+    
+    state = registry.read()
+    assert state["active"] == "support_bot__v3"
+    assert state["history"] == ["support_bot__v2", "support_bot__v1", "support_bot"]
+
+
+def test_reactivating_history_entry_removes_it_from_history(registry):
+    """履歴にあるバージョンを再度アクティブにすると履歴から外れる"""
+    registry.activate("support_bot__v1")
+    registry.activate("support_bot__v2")
+    registry.activate("support_bot__v1")
+    
+    state = registry.read()
+    assert state["active"] == "support_bot__v1"
+    assert state["history"] == ["support_bot__v2", "support_bot"]
+
+
+def test_rollback_moves_current_to_end_of_history(registry):
+    """ロールバックで外れたバージョンは履歴の末尾（GC対象）に回る"""
+    registry.activate("support_bot__v1")
+    registry.activate("support_bot__v2")
+    
+    assert registry.rollback() == "support_bot__v1"
+    state = registry.read()
+    assert state["active"] == "support_bot__v1"
+    assert state["history"] == ["support_bot", "support_bot__v2"]
+
+
+def test_collect_garbage_expires_versions_beyond_keep(registry):
+    """保持数を超えた古いバージョンが削除対象になる"""
+    for name in ("support_bot__v1", "support_bot__v2", "support_bot__v3"):
+        registry.activate(name)
+    
+    assert registry.collect_garbage(keep=1) == ["support_bot__v1", "support_bot"]
+    assert registry.read()["history"] == ["support_bot__v2"]
+    assert registry.collect_garbage(keep=1) == []
+
+
+def test_collect_garbage_never_expires_active(registry):
+    """アクティブなバージョンは保持数0でも削除対象にならない"""
+    registry.activate("support_bot__v1")
+    
+    assert registry.collect_garbage(keep=0) == ["support_bot"]
+    assert registry.resolve_collection_name() == "support_bot__v1"
+
+
+def test_check_for_updates_passes_changed_ids(registry):
+    """連続したバージョンの更新では変更されたIDだけを通知する"""
+    notified = []
+    registry.add_listener(notified.append)
+    
+    assert registry.check_for_updates() is False  # 初回は基準点の記録のみ
+    registry.bump_version(["faq_1", "faq_2"])
+    assert registry.check_for_updates() is True
+    registry.activate("support_bot__v1")
+    assert registry.check_for_updates() is True
+    
+    assert notified == [{"faq_1", "faq_2"}, None]
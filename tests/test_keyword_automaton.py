@@ -0,0 +1,64 @@
+"""
+Aho-Corasick法による複数パターン照合（AhoCorasickAutomaton）のテスト
+"""
+
+from collections import Counter
+
+import pytest
+
+from tool.keyword_classifier import AhoCorasickAutomaton
+
+
+def brute_force(patterns, text):
+    """すべての位置で全パターンを比較した出現（パターン番号ごとの回数）"""
+    return Counter(
+        pattern_id
+        for pattern_id, pattern in enumerate(patterns)
+        for start in range(len(text))
+        if text.startswith(pattern, start)
+    )
+
+
+def test_overlapping_patterns_sharing_suffixes():
+    """接尾辞を共有するパターンは失敗遷移の出力も含めてすべて見つかる"""
+    patterns = ["he", "she", "his", "hers"]
+    automaton = AhoCorasickAutomaton(patterns)
+    
+    assert Counter(automaton.find_all("ushers")) == Counter({0: 1, 1: 1, 3: 1})
+
+
+def test_pattern_contained_in_another():
+    """他のパターンの途中に含まれるパターンも見つかる"""
+    patterns = ["ログイン", "グイ", "イン", "ログ"]
+    automaton = AhoCorasickAutomaton(patterns)
+    
+    assert Counter(automaton.find_all("ログインできない")) == Counter({0: 1, 1: 1, 2: 1, 3: 1})
+
+
+def test_repeated_and_self_overlapping_occurrences():
+    """重なり合う出現は出現回数分返す"""
+    automaton = AhoCorasickAutomaton(["aa", "a"])
+    
+    assert Counter(automaton.find_all("aaaa")) == Counter({0: 3, 1: 4})
+
+
+@pytest.mark.parametrize("text", [
+    "パスワードを忘れてログインできません",
+    "アカウント設定からパスワードを変更",
+    "abababcabc",
+    ""
+])
+def test_matches_brute_force(text):
+    """全位置で比較した結果と一致する"""
+    patterns = ["パスワード", "ワード", "ログイン", "イン", "アカウント", "カウント", "ab", "bab", "abc", "c"]
+    automaton = AhoCorasickAutomaton(patterns)
+    
+    assert Counter(automaton.find_all(text)) == brute_force(patterns, text)
+
+
+def test_no_patterns():
+    """パターンがなければ何も見つからない"""
+    automaton = AhoCorasickAutomaton([])
+    
+    assert automaton.find_all("ログイン") == []
+    assert len(automaton) == 0
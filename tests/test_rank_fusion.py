@@ -0,0 +1,62 @@
+"""
+Reciprocal Rank Fusion（reciprocal_rank_fusion）のテスト
+"""
+
+import pytest
+
+from src.models import SearchHit
+from tool import reciprocal_rank_fusion
+
+
+def hit(doc_id, score, doc_type="faq"):
+    return SearchHit(
+        doc_type=doc_type,
+        doc_id=doc_id,
+        score=score,
+        distance=1 - score,
+        document=f"{doc_id} の内容",
+        metadata={"doc_id": doc_id}
+    )
+
+
+def test_documents_in_both_rankings_rank_first():
+    """両方のリストに現れるドキュメントが上位になる"""
+    dense = [hit("a", 0.9), hit("b", 0.8)]
+    lexical = [hit("c", 0.7), hit("b", 0.6)]
+    
+    fused = reciprocal_rank_fusion([(dense, 1.0), (lexical, 1.0)], k=60)
+    
+    assert [h.doc_id for h in fused] == ["b", "a", "c"]
+    assert fused[0].rrf_score == pytest.approx(1 / 62 + 1 / 62)
+    assert fused[1].rrf_score == pytest.approx(1 / 61)
+
+
+def test_keeps_highest_score_per_document():
+    """重複したドキュメントは各リトリーバーでの最高スコアの結果を残す"""
+    fused = reciprocal_rank_fusion([([hit("a", 0.4)], 1.0), ([hit("a", 0.8)], 1.0)], k=60)
+    
+    assert len(fused) == 1
+    assert fused[0].score == 0.8
+
+
+def test_weights_scale_contributions_and_skip_non_positive():
+    """重みで寄与が変わり、重みが0以下のリストは無視する"""
+    dense = [hit("a", 0.9)]
+    lexical = [hit("b", 0.9)]
+    ignored = [hit("c", 0.9)]
+    
+    fused = reciprocal_rank_fusion([(dense, 1.0), (lexical, 2.0), (ignored, 0.0)], k=60)
+    
+    assert [h.doc_id for h in fused] == ["b", "a"]
+    assert fused[0].rrf_score == pytest.approx(2 / 61)
+
+
+def test_hits_without_doc_id_are_keyed_by_content():
+    """doc_id のない結果は種類と内容で同一ドキュメントを判定する"""
+    first = hit(None, 0.5, doc_type="manual")
+    second = hit(None, 0.7, doc_type="manual")
+    
+    fused = reciprocal_rank_fusion([([first], 1.0), ([second], 1.0)], k=60)
+    
+    assert len(fused) == 1
+    assert fused[0].score == 0.7
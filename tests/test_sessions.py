@@ -0,0 +1,89 @@
+"""
+会話セッションの保管（SessionStore）のテスト
+"""
+
+import pytest
+
+from src.sessions import SessionStore
+
+
+@pytest.fixture
+def store():
+    return SessionStore(max_sessions=2, idle_seconds=60)
+
+
+def test_capacity_evicts_least_recently_used(store):
+    """上限を超えたら最も長く使われていないセッションから破棄する"""
+    first = store.create()
+    second = store.create()
+    
+    # first を参照して最近使ったものにする
+    assert store.get(first.session_id) is first
+    third = store.create()
+    
+    assert store.get(second.session_id) is None
+    assert store.get(first.session_id) is first
+    assert store.get(third.session_id) is third
+    assert store.get_stats()["evicted"]["capacity"] == 1
+
+
+def test_capacity_skips_busy_sessions(store):
+    """処理中のセッションは上限を超えても破棄しない"""
+    first = store.create()
+    second = store.create()
+    
+    with first.in_use():
+        store.create()
+        # 最も古い first は処理中のため、次に古い second を破棄
+        assert store.get(first.session_id) is first
+        assert store.get(second.session_id) is None
+
+
+def test_capacity_exceeded_temporarily_when_all_busy(store):
+    """すべて処理中なら一時的に上限を超え、処理が終われば破棄される"""
+    first = store.create()
+    second = store.create()
+    
+    with first.in_use(), second.in_use():
+        third = store.create()
+        assert store.get_stats()["active"] == 3
+    
+    fourth = store.create()
+    stats = store.get_stats()
+    assert stats["active"] == 2
+    assert stats["evicted"]["capacity"] == 2
+    assert store.get(first.session_id) is None
+    assert store.get(second.session_id) is None
+    assert store.get(third.session_id) is third
+    assert store.get(fourth.session_id) is fourth
+
+
+def test_idle_sessions_are_evicted_unless_busy(store, monkeypatch):
+    """アイドル時間を超えたセッションは処理中でなければ破棄する"""
+    idle = store.create()
+    busy = store.create()
+    
+    for session in (idle, busy):
+        monkeypatch.setattr(session, "last_active", session.last_active - 120)
+    
+    with busy.in_use():
+        assert store.evict_idle() == 1
+    
+    assert store.get(idle.session_id) is None
+    assert store.get(busy.session_id) is busy
+    assert store.get_stats()["evicted"]["idle"] == 1
+
+
+def test_in_use_moves_session_to_most_recent(store, monkeypatch):
+    """処理の終了時に保管順も更新し、期限切れのセッションの破棄が止まらない"""
+    long_running = store.create()
+    expired = store.create()
+    
+    with store.in_use(long_running):
+        monkeypatch.setattr(expired, "last_active", expired.last_active - 120)
+    
+    # 処理を終えたセッションより前に期限切れのセッションが並ぶ
+    assert list(store._sessions) == [expired.session_id, long_running.session_id]
+    assert store.evict_idle() == 1
+    assert store.get(expired.session_id) is None
+    assert store.get(long_running.session_id) is long_running
@@ -3,30 +3,101 @@
 FAQ検索とマニュアル検索の統合エンジン
 """
 
+from .embedding_model import get_embedding_model
 from .search_xyz_qa import get_faq_search_engine, FAQSearchEngine
 from .search_xyz_manual import get_manual_search_engine, ManualSearchEngine
+from .search_xyz_lexical import get_lexical_search_engine, LexicalSearchEngine
+from .faq_exact_match import get_faq_exact_matcher, FAQExactMatcher
+from .keyword_classifier import get_keyword_classifier, KeywordClassifier
+from .reranker import get_reranker, CrossEncoderReranker
 
 __all__ = [
+    'get_embedding_model',
     'get_faq_search_engine',
     'get_manual_search_engine', 
+    'get_lexical_search_engine',
+    'get_faq_exact_matcher',
+    'get_keyword_classifier',
+    'get_reranker',
     'FAQSearchEngine',
     'ManualSearchEngine',
+    'LexicalSearchEngine',
+    'FAQExactMatcher',
+    'KeywordClassifier',
+    'CrossEncoderReranker',
     'UnifiedSearchEngine'
 ]
 
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
-import asyncio
+from typing import List, Dict, Any, Optional, Tuple
 
 # プロジェクトルートをパスに追加
 sys.path.append(str(Path(__file__).parent.parent))
 
+from src.compression import attach_sentence_data
+from src.configs import config
 from src.custom_logger import get_module_logger
-from src.models import SearchResult
+from src.deadline import DeadlineExceeded, check_deadline, remaining_seconds
+from src.index_registry import get_index_registry
+from src.metrics import CACHE_HITS, CACHE_LOOKUPS, EMBEDDING_BATCH_SIZE, EMBEDDING_CALLS, LEXICAL_QUERY_SECONDS
+from src.models import SearchHit, SearchResult
+from src.timing import bind_context, span
 
 logger = get_module_logger("unified_search")
 
+# リトリーバーを並行実行するスレッドプール
+_retrieval_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="retrieval")
+
+
+
+def _hybrid_weight(retriever: str) -> float:
+    """リトリーバー（faq_dense など）のRRF重みを設定から取得"""
+    return getattr(config, f"HYBRID_WEIGHT_{retriever.upper()}", 1.0)
+
+
+def reciprocal_rank_fusion(
+    rankings: List[Tuple[List[SearchHit], float]],
+    k: int = None
+) -> List[SearchHit]:
+    """
+    Reciprocal Rank Fusion で複数の順位リストを統合
+    
+    各ドキュメントのスコアを Σ weight / (k + rank) として計算する。
+    生のスコアの尺度に依存しないため、密ベクトルとBM25のような
+    比較できないスコアを統合できる。
+    
+    Args:
+        rankings: (スコア降順の検索結果, 重み) のリスト
+        k: RRFの定数（大きいほど下位の順位も重視）
+    
+    Returns:
+        統合スコア順の検索結果。score には各リトリーバーでの最高スコア、
+        rrf_score に統合スコアを格納する
+    """
+    k = k or config.RRF_K
+    fused: Dict[str, SearchHit] = {}
+    fused_scores: Dict[str, float] = {}
+    
+    for hits, weight in rankings:
+        if weight <= 0:
+            continue
+        for rank, hit in enumerate(hits, 1):
+            key = hit.key
+            fused_scores[key] = fused_scores.get(key, 0.0) + weight / (k + rank)
+            
+            existing = fused.get(key)
+            if existing is None or hit.score > existing.score:
+                fused[key] = hit
+    
+    ordered = sorted(fused_scores, key=fused_scores.get, reverse=True)
+    for key in ordered:
+        fused[key].rrf_score = fused_scores[key]
+    
+    return [fused[key] for key in ordered]
+
 
 class UnifiedSearchEngine:
     """統合検索エンジン（FAQ + マニュアル）"""
@@ -34,6 +105,19 @@ class UnifiedSearchEngine:
     def __init__(self):
         self.faq_engine = None
         self.manual_engine = None
+        self.lexical_engine = None
+        self.exact_matcher = None
+        self.keyword_classifier = None
+        self.reranker = None
+        self._last_query_embedding: Optional[Tuple[str, List[float]]] = None
+        self.adaptive_stats = {
+            'requests': 0,
+            'results': 0,
+            'dense_fetched': 0,
+            'decisions': {}
+        }
+        # 並行リクエストからの統計更新を保護
+        self._stats_lock = threading.Lock()
         self._initialize()
     
     def _initialize(self):
@@ -47,12 +131,195 @@ class UnifiedSearchEngine:
             # マニュアル検索エンジンを初期化
             self.manual_engine = get_manual_search_engine()
             
+            # 語彙検索エンジンを初期化（インデックスがなくても起動は継続）
+            self.lexical_engine = get_lexical_search_engine()
+            
+            # 検索戦略のキーワード分類器を初期化
+            self.keyword_classifier = get_keyword_classifier()
+            
+            # 再順位付けを初期化（無効時・読み込み失敗時は従来の順位を使用）
+            self.reranker = get_reranker()
+            
+            # FAQ完全一致検索を初期化（テーブルがなくても起動は継続）
+            if config.FAQ_EXACT_MATCH_ENABLED:
+                self.exact_matcher = get_faq_exact_matcher()
+            
             logger.info("統合検索エンジンの初期化が完了しました")
             
         except Exception as e:
             logger.error(f"統合検索エンジンの初期化に失敗しました: {e}")
             raise
     
+    def find_exact_faq(self, query: str) -> Optional[SearchResult]:
+        """
+        質問文がFAQと（正規化後に）完全一致する場合、そのFAQを返す
+        
+        埋め込み計算やベクトルDBへの問い合わせは行わない。
+        """
+        if not self.exact_matcher:
+            return None
+        
+        entry = self.exact_matcher.lookup(query)
+        if entry is None:
+            return None
+        
+        return SearchResult(
+            content=self.faq_engine._format_faq_content(entry),
+            source=f"FAQ: {entry.get('question', 'Unknown')}",
+            score=1.0,
+            metadata={
+                'type': 'faq',
+                'question': entry.get('question', ''),
+                'answer': entry.get('answer', ''),
+                'doc_id': entry.get('id'),
+                'match_type': 'exact'
+            }
+        )
+    
+    def _engine_for(self, hit: SearchHit):
+        """検索結果の種別に対応するエンジン"""
+        return self.faq_engine if hit.doc_type == 'faq' else self.manual_engine
+    
+    def to_search_results(self, hits: List[SearchHit]) -> List[SearchResult]:
+        """内部表現の検索結果をAPIに返す SearchResult に変換"""
+        return [self._engine_for(hit).to_search_result(hit) for hit in hits]
+    
+    def _hit_content(self, hit: SearchHit) -> str:
+        """検索結果の整形済みの内容（再順位付け用）"""
+        if hit.doc_type == 'faq':
+            return self.faq_engine._format_faq_content(hit.metadata)
+        return self.manual_engine._format_manual_content(hit.metadata, hit.document)
+    
+    def attach_embeddings(self, results: List[SearchResult]):
+        """
+        埋め込みを持たない検索結果（語彙検索のみでヒットしたもの）に
+        ベクトルDBに保存済みの埋め込み（圧縮用の文の埋め込みを含む）を設定
+        """
+        missing = {
+            result.metadata['doc_id']: result
+            for result in results
+            if result.embedding is None and result.metadata and result.metadata.get('doc_id')
+        }
+        if not missing:
+            return
+        
+        try:
+            self.faq_engine._refresh_collection()
+            stored = self.faq_engine.collection.get(
+                ids=list(missing),
+                include=["embeddings", "documents", "metadatas"]
+            )
+            for doc_id, embedding, document, metadata in zip(
+                stored['ids'], stored['embeddings'], stored['documents'], stored['metadatas']
+            ):
+                missing[doc_id].set_embedding(list(embedding))
+                attach_sentence_data(missing[doc_id], document, metadata)
+        except Exception as e:
+            logger.warning(f"埋め込みの取得に失敗しました: {e}")
+    
+    def encode_query(self, query: str) -> List[float]:
+        """
+        クエリを埋め込みベクトルに変換（FAQ/マニュアルで共有）
+        
+        直前のクエリの埋め込みを保持し、検索後の圧縮などで同じクエリを
+        再度埋め込む場合は再計算しない。
+        """
+        CACHE_LOOKUPS.inc("query_embedding")
+        last = self._last_query_embedding
+        if last is not None and last[0] == query:
+            CACHE_HITS.inc("query_embedding")
+            return last[1]
+        
+        check_deadline("embed")
+        with span("embed"):
+            embedding = self.faq_engine.embedding_model.encode([query]).tolist()[0]
+        EMBEDDING_CALLS.inc("query")
+        EMBEDDING_BATCH_SIZE.observe(1, "query")
+        self._last_query_embedding = (query, embedding)
+        return embedding
+    
+    def _retrieve(
+        self,
+        query: str,
+        max_results_per_source: int,
+        min_score: float = None,
+        sources: Tuple[str, ...] = ('faq', 'manual')
+    ) -> Dict[str, List[SearchHit]]:
+        """
+        各リトリーバーを並行実行
+        
+        密ベクトル検索（ソース別）と、ハイブリッドモードでは語彙検索
+        （ソース別）を同時に実行する。クエリ埋め込みは一度だけ計算する。
+        
+        Returns:
+            "faq_dense", "faq_lexical" などをキーとする検索結果
+        """
+        jobs = {}
+        for source in sources:
+            jobs[f"{source}_dense"] = max_results_per_source
+            if config.SEARCH_MODE == "hybrid":
+                jobs[f"{source}_lexical"] = max_results_per_source
+        
+        return self._run_retrievers(query, jobs, min_score)
+    
+    def _run_retrievers(
+        self,
+        query: str,
+        jobs: Dict[str, int],
+        min_score: float = None,
+        query_embedding: Optional[List[float]] = None
+    ) -> Dict[str, List[SearchHit]]:
+        """
+        指定したリトリーバーを並行実行
+        
+        Args:
+            query: 検索クエリ
+            jobs: リトリーバー名（"faq_dense" など）と取得件数
+            min_score: 密ベクトル検索の最低類似度スコア
+            query_embedding: 計算済みのクエリ埋め込み
+        
+        Returns:
+            リトリーバー名をキーとする検索結果
+        """
+        dense_search = {
+            'faq': self.faq_engine.search_hits,
+            'manual': self.manual_engine.search_hits
+        }
+        if query_embedding is None and any(name.endswith("_dense") for name in jobs):
+            query_embedding = self.encode_query(query)
+        
+        futures = {}
+        for name, max_results in jobs.items():
+            source, retriever = name.split("_", 1)
+            if retriever == "dense":
+                futures[name] = _retrieval_executor.submit(
+                    bind_context(dense_search[source]),
+                    query=query,
+                    max_results=max_results,
+                    min_score=min_score,
+                    query_embedding=query_embedding
+                )
+            else:
+                futures[name] = _retrieval_executor.submit(
+                    bind_context(self.search_lexical_hits),
+                    query=query,
+                    source=source,
+                    max_results=max_results
+                )
+        
+        # 処理期限を過ぎても終わらないリトリーバーは待たずに空として扱う
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result(timeout=remaining_seconds())
+            except FutureTimeoutError:
+                logger.warning(f"処理期限までに検索が完了しませんでした ({name})")
+                results[name] = []
+            except Exception as e:
+                logger.error(f"検索に失敗しました ({name}): {e}")
+                results[name] = []
+        return results
+    
     def search_all(
         self, 
         query: str,
@@ -62,6 +329,9 @@ class UnifiedSearchEngine:
         """
         FAQ とマニュアルの両方を検索
         
+        ハイブリッドモードではソースごとに密ベクトル検索と語彙検索の
+        結果を Reciprocal Rank Fusion で統合する
+        
         Args:
             query: 検索クエリ
             max_results_per_source: ソース別の最大結果数
@@ -70,37 +340,32 @@ class UnifiedSearchEngine:
         Returns:
             ソース別の検索結果
         """
+        results = self._search_all_hits(query, max_results_per_source, min_score)
+        return {source: self.to_search_results(hits) for source, hits in results.items()}
+    
+    def _search_all_hits(
+        self, 
+        query: str,
+        max_results_per_source: int = 3,
+        min_score: float = None
+    ) -> Dict[str, List[SearchHit]]:
+        """search_all の内部表現版（ソース別の検索結果を変換せずに返す）"""
         try:
-            logger.info(f"統合検索実行: '{query}'")
+            logger.info(f"統合検索実行: '{query}' (モード: {config.SEARCH_MODE})")
             
-            results = {
-                'faq': [],
-                'manual': []
-            }
+            retrieved = self._retrieve(query, max_results_per_source, min_score)
             
-            # FAQ検索を実行
-            try:
-                faq_results = self.faq_engine.search_faq(
-                    query=query,
-                    max_results=max_results_per_source,
-                    min_score=min_score
-                )
-                results['faq'] = faq_results
-                logger.info(f"FAQ検索完了: {len(faq_results)}件")
-            except Exception as e:
-                logger.error(f"FAQ検索に失敗しました: {e}")
+            results = {}
+            for source in ('faq', 'manual'):
+                rankings = [
+                    (retrieved[name], _hybrid_weight(name))
+                    for name in (f"{source}_dense", f"{source}_lexical")
+                    if name in retrieved
+                ]
+                results[source] = reciprocal_rank_fusion(rankings)[:max_results_per_source]
             
-            # マニュアル検索を実行
-            try:
-                manual_results = self.manual_engine.search_manual(
-                    query=query,
-                    max_results=max_results_per_source,
-                    min_score=min_score
-                )
-                results['manual'] = manual_results
-                logger.info(f"マニュアル検索完了: {len(manual_results)}件")
-            except Exception as e:
-                logger.error(f"マニュアル検索に失敗しました: {e}")
+            logger.info(f"FAQ検索完了: {len(results['faq'])}件")
+            logger.info(f"マニュアル検索完了: {len(results['manual'])}件")
             
             total_results = len(results['faq']) + len(results['manual'])
             logger.info(f"統合検索完了: {total_results}件の結果を取得")
@@ -111,6 +376,54 @@ class UnifiedSearchEngine:
             logger.error(f"統合検索に失敗しました: {e}")
             return {'faq': [], 'manual': []}
     
+    def search_lexical(
+        self,
+        query: str,
+        source: str,
+        max_results: int = 3,
+        min_score: float = None
+    ) -> List[SearchResult]:
+        """
+        語彙（BM25）インデックスで検索
+        
+        システム名やエラーコードなど、埋め込みでは拾いにくい
+        完全一致の語を含むドキュメントを取得する
+        
+        Args:
+            query: 検索クエリ
+            source: 対象ソース（faq / manual）
+            max_results: 最大結果数
+            min_score: 最低スコア（0-1に変換後）
+        
+        Returns:
+            検索結果のリスト
+        """
+        return self.to_search_results(self.search_lexical_hits(query, source, max_results, min_score))
+    
+    def search_lexical_hits(
+        self,
+        query: str,
+        source: str,
+        max_results: int = 3,
+        min_score: float = None
+    ) -> List[SearchHit]:
+        """語彙検索を実行し、内部表現（SearchHit）のまま返す（引数は search_lexical と同じ）"""
+        try:
+            min_score = config.LEXICAL_MIN_SCORE if min_score is None else min_score
+            with span(f"{source}.lexical"), LEXICAL_QUERY_SECONDS.time(source):
+                raw_results = self.lexical_engine.search_raw(query, max_results, doc_type=source)
+            
+            # 各ソースのエンジンと同じ形式に変換
+            engine = self.faq_engine if source == 'faq' else self.manual_engine
+            hits = engine._process_search_hits(raw_results, min_score)
+            
+            logger.info(f"語彙検索完了 ({source}): {len(hits)}件")
+            return hits
+            
+        except Exception as e:
+            logger.error(f"語彙検索に失敗しました: {e}")
+            return []
+    
     def search_ranked(
         self, 
         query: str,
@@ -118,7 +431,10 @@ class UnifiedSearchEngine:
         min_score: float = None
     ) -> List[SearchResult]:
         """
-        FAQ とマニュアルを統合してスコア順にソート
+        FAQ とマニュアルを統合して順位付け
+        
+        ソース間で生のスコアは比較できないため、各リトリーバーの順位を
+        Reciprocal Rank Fusion（ソース別の重み付き）で統合する
         
         Args:
             query: 検索クエリ
@@ -126,26 +442,27 @@ class UnifiedSearchEngine:
             min_score: 最低類似度スコア
         
         Returns:
-            スコア順の統合検索結果
+            統合順位の検索結果
         """
+        return self.to_search_results(self._search_ranked_hits(query, max_total_results, min_score))
+    
+    def _search_ranked_hits(
+        self, 
+        query: str,
+        max_total_results: int = 5,
+        min_score: float = None
+    ) -> List[SearchHit]:
+        """search_ranked の内部表現版（統合順位の検索結果を変換せずに返す）"""
         try:
-            # 両方のソースから結果を取得
-            search_results = self.search_all(
-                query=query,
-                max_results_per_source=max_total_results,
-                min_score=min_score
-            )
-            
-            # すべての結果を統合
-            all_results = []
-            all_results.extend(search_results['faq'])
-            all_results.extend(search_results['manual'])
+            retrieved = self._retrieve(query, max_total_results, min_score)
             
-            # スコア順にソート
-            all_results.sort(key=lambda x: x.score, reverse=True)
+            rankings = [
+                (hits, _hybrid_weight(name))
+                for name, hits in retrieved.items()
+            ]
             
             # 指定した数まで切り取り
-            ranked_results = all_results[:max_total_results]
+            ranked_results = reciprocal_rank_fusion(rankings)[:max_total_results]
             
             logger.info(f"ランキング検索完了: {len(ranked_results)}件の結果")
             return ranked_results
@@ -154,6 +471,130 @@ class UnifiedSearchEngine:
             logger.error(f"ランキング検索に失敗しました: {e}")
             return []
     
+    # 戦略ごとのソース別の基本取得件数
+    BASE_DEPTHS = {
+        'faq_focus': {'faq': 3, 'manual': 2},
+        'manual_focus': {'manual': 3, 'faq': 2}
+    }
+    
+    def _choose_depth(self, probe: List[SearchHit], base_depth: int) -> Tuple[int, str]:
+        """
+        プローブ結果のスコア分布からソースの取得件数を決定
+        
+        Returns:
+            (取得件数, 判断理由)
+        """
+        if not probe:
+            return 0, "no_hits"
+        
+        best = probe[0].score
+        if best < config.SIMILARITY_THRESHOLD * config.ADAPTIVE_SKIP_RATIO:
+            return 0, "skip"
+        
+        if len(probe) < 2:
+            return 1, "single"
+        
+        # 1位が2位を大きく引き離していれば1位だけで十分
+        if best - probe[1].score >= config.ADAPTIVE_MARGIN:
+            return config.ADAPTIVE_MIN_K, "decisive"
+        
+        # 上位のスコアが横並びなら候補を広げる
+        if len(probe) >= config.ADAPTIVE_PROBE_K and best - probe[-1].score <= config.ADAPTIVE_FLAT_SPREAD:
+            return min(base_depth + config.ADAPTIVE_EXPAND_K, config.ADAPTIVE_MAX_K), "flat"
+        
+        return base_depth, "default"
+    
+    def adaptive_search(self, query: str, strategy_focus: str) -> List[SearchResult]:
+        """
+        スコア分布に応じて取得件数を変える検索
+        
+        1. 各ソースの密ベクトル検索で上位数件だけを取得（プローブ）
+        2. 最高スコアが閾値を大きく下回るソースは以降の検索を行わない
+        3. 1位の差が大きければ件数を絞り、横並びなら件数を増やす
+        
+        プローブの件数で足りるソースは密ベクトル検索の結果を再利用する。
+        
+        Args:
+            query: 検索クエリ
+            strategy_focus: 基本戦略（faq_focus / manual_focus / balanced）
+        
+        Returns:
+            検索結果
+        """
+        return self.to_search_results(self._adaptive_search_hits(query, strategy_focus))
+    
+    def _adaptive_search_hits(self, query: str, strategy_focus: str) -> List[SearchHit]:
+        """adaptive_search の内部表現版（検索結果を変換せずに返す）"""
+        balanced = strategy_focus not in self.BASE_DEPTHS
+        base_depths = self.BASE_DEPTHS.get(strategy_focus, {'faq': 3, 'manual': 3})
+        query_embedding = self.encode_query(query)
+        
+        # プローブ（閾値で切らずにスコアを確認）
+        probe = self._run_retrievers(
+            query,
+            {f"{source}_dense": config.ADAPTIVE_PROBE_K for source in base_depths},
+            min_score=0.0,
+            query_embedding=query_embedding
+        )
+        
+        plan = {
+            source: self._choose_depth(probe[f"{source}_dense"], base_depth)
+            for source, base_depth in base_depths.items()
+        }
+        depths = {source: depth for source, (depth, _) in plan.items() if depth > 0}
+        
+        # 追加で必要なリトリーバーのみ実行
+        jobs = {}
+        for source, depth in depths.items():
+            if depth > config.ADAPTIVE_PROBE_K:
+                jobs[f"{source}_dense"] = depth
+            if config.SEARCH_MODE == "hybrid":
+                jobs[f"{source}_lexical"] = depth
+        retrieved = self._run_retrievers(query, jobs, query_embedding=query_embedding) if jobs else {}
+        
+        per_source = {}
+        for source, depth in depths.items():
+            dense = retrieved.get(f"{source}_dense", probe[f"{source}_dense"])
+            dense = [hit for hit in dense if hit.score >= config.SIMILARITY_THRESHOLD][:depth]
+            rankings = [(dense, _hybrid_weight(f"{source}_dense"))]
+            if f"{source}_lexical" in retrieved:
+                rankings.append((retrieved[f"{source}_lexical"], _hybrid_weight(f"{source}_lexical")))
+            per_source[source] = rankings
+        
+        if balanced:
+            # 拡張した分だけ上限を広げる
+            expansion = sum(max(0, depths[source] - base_depths[source]) for source in depths)
+            limit = min(sum(depths.values()), config.MAX_SEARCH_RESULTS + expansion)
+            rankings = [ranking for rankings in per_source.values() for ranking in rankings]
+            final_results = reciprocal_rank_fusion(rankings)[:limit]
+        else:
+            # 重視するソースを先に並べる
+            final_results = []
+            for source in base_depths:
+                if source in per_source:
+                    final_results.extend(reciprocal_rank_fusion(per_source[source])[:depths[source]])
+        
+        # 検索深度を記録（ベクトルDBの取得件数とプロンプトに渡す件数の削減量の分析用）
+        dense_fetched = sum(len(hits) for hits in probe.values()) + sum(
+            jobs[name] for name in jobs if name.endswith("_dense")
+        )
+        with self._stats_lock:
+            self.adaptive_stats['requests'] += 1
+            self.adaptive_stats['results'] += len(final_results)
+            self.adaptive_stats['dense_fetched'] += dense_fetched
+            decisions = self.adaptive_stats['decisions']
+            for _, reason in plan.values():
+                decisions[reason] = decisions.get(reason, 0) + 1
+        
+        plan_summary = ", ".join(
+            f"{source}={depth} ({reason}, top={probe[f'{source}_dense'][0].score:.2f})"
+            if probe[f"{source}_dense"] else f"{source}={depth} ({reason})"
+            for source, (depth, reason) in plan.items()
+        )
+        logger.info(f"検索深度: {plan_summary} -> {len(final_results)}件 (密ベクトル取得 {dense_fetched}件)")
+        
+        return final_results
+    
     def smart_search(
         self, 
         query: str,
@@ -172,30 +613,74 @@ class UnifiedSearchEngine:
         try:
             context = context or {}
             
+            # インデックスの更新（監視モード・エイリアス切り替え）を確認
+            get_index_registry().check_for_updates()
+            
+            # FAQの質問そのままの問い合わせは完全一致で即答
+            with span("exact_match"):
+                exact_result = self.find_exact_faq(query)
+            if exact_result is not None:
+                logger.info(f"FAQ完全一致: '{query}' -> {exact_result.metadata['doc_id']}")
+                return [exact_result], "exact_match"
+            
             # クエリの分析で検索戦略を決定
-            search_strategy = self._determine_search_strategy(query, context)
+            with span("classify"):
+                search_strategy = self._determine_search_strategy(query, context)
+            
+            focus = self.get_strategy_focus(search_strategy)
             
             logger.info(f"スマート検索実行: '{query}' (戦略: {search_strategy})")
             
-            if search_strategy == "faq_focus":
+            rerank_enabled = self.reranker is not None and self.reranker.enabled
+            # 候補を多めに取得した場合に、再順位付けをスキップした際の件数
+            fallback_limit = None
+            
+            if config.ADAPTIVE_K_ENABLED:
+                # スコア分布に応じて取得件数を調整
+                final_hits = self._adaptive_search_hits(query, focus)
+                
+            elif focus == "faq_focus":
                 # FAQ重視の検索
-                results = self.search_all(query, max_results_per_source=4)
+                hits = self._search_all_hits(query, max_results_per_source=4)
                 # FAQの結果を優先
-                final_results = results['faq'][:3] + results['manual'][:2]
+                final_hits = hits['faq'][:3] + hits['manual'][:2]
                 
-            elif search_strategy == "manual_focus":
+            elif focus == "manual_focus":
                 # マニュアル重視の検索
-                results = self.search_all(query, max_results_per_source=4)
+                hits = self._search_all_hits(query, max_results_per_source=4)
                 # マニュアルの結果を優先
-                final_results = results['manual'][:3] + results['faq'][:2]
+                final_hits = hits['manual'][:3] + hits['faq'][:2]
+                
+            elif rerank_enabled:
+                # バランス型で再順位付けする場合は候補を多めに取得
+                final_hits = self._search_ranked_hits(query, max_total_results=config.RERANK_CANDIDATES)
+                fallback_limit = config.MAX_SEARCH_RESULTS
                 
             else:  # "balanced"
                 # バランス型の検索
-                final_results = self.search_ranked(query, max_total_results=5)
+                final_hits = self._search_ranked_hits(query, max_total_results=5)
+            
+            if rerank_enabled and final_hits:
+                # 検索戦略・検索深度で選んだ候補をクロスエンコーダーで並べ替え
+                with span("rerank"):
+                    reranked = self.reranker.rerank(
+                        query, final_hits, [self._hit_content(hit) for hit in final_hits]
+                    )
+                if reranked is not None:
+                    final_hits = reranked
+                elif fallback_limit is not None:
+                    # 予算超過・失敗時は統合順位のまま使う
+                    final_hits = final_hits[:fallback_limit]
+            
+            # 最終的に返す結果だけを SearchResult に変換
+            final_results = self.to_search_results(final_hits)
             
             logger.info(f"スマート検索完了: {len(final_results)}件 (戦略: {search_strategy})")
             return final_results, search_strategy
             
+        except DeadlineExceeded:
+            # 呼び出し元で縮退した回答を返す
+            raise
         except Exception as e:
             logger.error(f"スマート検索に失敗しました: {e}")
             return [], "error"
@@ -205,34 +690,32 @@ class UnifiedSearchEngine:
         query: str, 
         context: Dict[str, Any]
     ) -> str:
-        """検索戦略を決定"""
-        query_lower = query.lower()
-        
-        # FAQ向けキーワード
-        faq_keywords = [
-            'ログイン', '申請', 'パスワード', 'できない', 'エラー', 
-            'アカウント', 'ユーザー', 'サインイン', 'トラブル', '問題'
-        ]
-        
-        # マニュアル向けキーワード
-        manual_keywords = [
-            '手順', '方法', '設定', '操作', '画面', 'ボタン', 
-            'メニュー', '機能', '使い方', 'システム'
-        ]
-        
-        # FAQキーワードのマッチ数
-        faq_score = sum(1 for keyword in faq_keywords if keyword in query_lower)
-        
-        # マニュアルキーワードのマッチ数
-        manual_score = sum(1 for keyword in manual_keywords if keyword in query_lower)
-        
-        # 戦略を決定
-        if faq_score > manual_score:
-            return "faq_focus"
-        elif manual_score > faq_score:
-            return "manual_focus"
-        else:
-            return "balanced"
+        """検索戦略を決定（キーワード辞書による分類）"""
+        return self.keyword_classifier.classify(query)
+    
+    def get_strategy_focus(self, strategy: str) -> str:
+        """戦略に対応する基本戦略（faq_focus / manual_focus / balanced）を取得"""
+        return self.keyword_classifier.focus_of(strategy)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """検索の統計情報を取得"""
+        with self._stats_lock:
+            adaptive_stats = {
+                **self.adaptive_stats,
+                'decisions': dict(self.adaptive_stats['decisions'])
+            }
+        
+        return {
+            'exact_match': self.exact_matcher.get_stats() if self.exact_matcher else None,
+            'rerank': self.reranker.get_stats() if self.reranker else None,
+            'adaptive_depth': {
+                **adaptive_stats,
+                'avg_results': (
+                    adaptive_stats['results'] / adaptive_stats['requests']
+                    if adaptive_stats['requests'] else 0.0
+                )
+            }
+        }
     
     def health_check(self) -> Dict[str, bool]:
         """統合検索エンジンのヘルスチェック"""
@@ -251,6 +734,10 @@ class UnifiedSearchEngine:
             if self.manual_engine:
                 health_status['manual_engine'] = self.manual_engine.health_check()
             
+            # 語彙検索エンジンのヘルスチェック（全体の判定には含めない）
+            if self.lexical_engine:
+                health_status['lexical_engine'] = self.lexical_engine.health_check()
+            
             # 全体のヘルスは少なくとも一つのエンジンが正常であればOK
             health_status['overall'] = (
                 health_status['faq_engine'] or 
@@ -0,0 +1,38 @@
+"""
+埋め込みモデルの共有
+FAQ/マニュアル検索エンジンで同じモデルを1つだけ読み込む
+"""
+
+import sys
+import threading
+from pathlib import Path
+
+from sentence_transformers import SentenceTransformer
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.configs import config
+from src.custom_logger import get_module_logger
+
+logger = get_module_logger("embedding_model")
+
+
+# グローバルインスタンス管理
+_embedding_model = None
+_embedding_model_lock = threading.Lock()
+
+def get_embedding_model() -> SentenceTransformer:
+    """
+    埋め込みモデルのグローバルインスタンスを取得
+    
+    本番サーバーではワーカーの起動前（フォーク前）に読み込み、
+    モデルの重みをワーカー間でコピーオンライト共有する。
+    """
+    global _embedding_model
+    if _embedding_model is None:
+        with _embedding_model_lock:
+            if _embedding_model is None:
+                logger.info(f"埋め込みモデルを読み込み中: {config.EMBEDDING_MODEL}")
+                _embedding_model = SentenceTransformer(config.EMBEDDING_MODEL)
+    return _embedding_model
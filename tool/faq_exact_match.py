@@ -0,0 +1,155 @@
+"""
+FAQ完全一致検索
+正規化した質問文のハッシュ表で、埋め込み計算なしにFAQを特定
+"""
+
+import json
+import sys
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.configs import config
+from src.custom_logger import get_module_logger
+from src.index_registry import _atomic_write_json, get_index_registry
+from src.metrics import CACHE_HITS, CACHE_LOOKUPS
+
+logger = get_module_logger("faq_exact_match")
+
+
+def normalize_question(text: str) -> str:
+    """
+    質問文を照合用に正規化
+    
+    NFKC正規化・小文字化した上で、空白・句読点・記号を取り除く。
+    全角/半角や「？」の有無、改行の違いを吸収する。
+    """
+    normalized = unicodedata.normalize("NFKC", text).lower()
+    return "".join(
+        ch for ch in normalized
+        if not unicodedata.category(ch).startswith(("Z", "P", "S", "C"))
+    )
+
+
+def exact_index_path(collection_name: str) -> Path:
+    """コレクションに対応する完全一致テーブルのパス"""
+    return config.FAQ_EXACT_INDEX_DIR / f"{collection_name}.json"
+
+
+class FAQExactIndexBuilder:
+    """完全一致テーブルの構築クラス"""
+    
+    def __init__(self):
+        self.entries: Dict[str, Dict[str, Any]] = {}
+    
+    def add(self, doc_id: str, metadata: Dict[str, Any]):
+        """FAQドキュメントを追加（言い換え質問も同じFAQに対応付ける）"""
+        if metadata.get('type') != 'faq':
+            return
+        
+        entry = {
+            'id': doc_id,
+            'question': metadata.get('question', ''),
+            'answer': metadata.get('answer', '')
+        }
+        questions = [entry['question']]
+        alternates = metadata.get('alternate_questions')
+        if alternates:
+            questions.extend(alternates.split("\n"))
+        
+        for question in questions:
+            key = normalize_question(question)
+            if key and key not in self.entries:
+                self.entries[key] = entry
+    
+    def add_many(self, ids: Iterable[str], metadatas: Iterable[Dict[str, Any]]):
+        """ドキュメントをまとめて追加"""
+        for doc_id, metadata in zip(ids, metadatas):
+            self.add(doc_id, metadata)
+    
+    def save(self, path: Path):
+        """テーブルをJSONでアトミックに保存"""
+        _atomic_write_json(path, self.entries)
+
+
+class FAQExactMatcher:
+    """FAQ完全一致検索エンジン"""
+    
+    def __init__(self):
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.lookups = 0
+        self.hits = 0
+        self._loaded_key = None
+        self._lock = threading.Lock()
+        self._refresh_table()
+    
+    def _refresh_table(self):
+        """アクティブなコレクションのテーブルを（変更があれば）読み込み"""
+        path = exact_index_path(get_index_registry().resolve_collection_name())
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            missing_key = (str(path), None)
+            if self._loaded_key != missing_key:
+                logger.warning(f"FAQ完全一致テーブルが見つかりません: {path}")
+                self._loaded_key = missing_key
+                self.entries = {}
+            return
+        
+        key = (str(path), stat.st_mtime_ns)
+        if key == self._loaded_key:
+            return
+        
+        with self._lock:
+            if key == self._loaded_key:
+                return
+            try:
+                self.entries = json.loads(path.read_text(encoding='utf-8'))
+                self._loaded_key = key
+                logger.info(f"FAQ完全一致テーブルを読み込みました: {path} ({len(self.entries)}件)")
+            except Exception as e:
+                logger.error(f"FAQ完全一致テーブルの読み込みに失敗しました: {e}")
+    
+    def lookup(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        質問文に完全一致するFAQを取得
+        
+        Args:
+            query: ユーザーの質問
+        
+        Returns:
+            FAQのエントリ（id, question, answer）。一致しなければNone
+        """
+        self._refresh_table()
+        entry = self.entries.get(normalize_question(query))
+        
+        self.lookups += 1
+        CACHE_LOOKUPS.inc("faq_exact")
+        if entry is not None:
+            self.hits += 1
+            CACHE_HITS.inc("faq_exact")
+        return entry
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """ヒット率などの統計を取得"""
+        return {
+            'entries': len(self.entries),
+            'lookups': self.lookups,
+            'hits': self.hits,
+            'hit_rate': self.hits / self.lookups if self.lookups else 0.0
+        }
+
+
+# グローバルインスタンス管理
+_faq_exact_matcher = None
+
+def get_faq_exact_matcher() -> FAQExactMatcher:
+    """FAQ完全一致検索エンジンのグローバルインスタンスを取得"""
+    global _faq_exact_matcher
+    if _faq_exact_matcher is None:
+        _faq_exact_matcher = FAQExactMatcher()
+    return _faq_exact_matcher
@@ -0,0 +1,299 @@
+"""
+キーワード辞書による検索戦略の分類
+Aho-Corasick法で多数のキーワードをクエリ1回の走査で照合
+"""
+
+import json
+import sys
+import threading
+import time
+import unicodedata
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.configs import config
+from src.custom_logger import get_module_logger
+
+logger = get_module_logger("keyword_classifier")
+
+# 検索の実行方法（フォーカス）と基本戦略名の対応
+BASE_STRATEGIES = {
+    'faq': 'faq_focus',
+    'manual': 'manual_focus',
+    'balanced': 'balanced'
+}
+DEFAULT_STRATEGY = 'balanced'
+
+
+def normalize_keyword_text(text: str) -> str:
+    """照合用にテキストを正規化（全角/半角・大文字/小文字を吸収）"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+class AhoCorasickAutomaton:
+    """
+    Aho-Corasick法による複数パターン照合オートマトン
+    
+    照合コストはクエリ長に比例し、キーワード数には依存しない。
+    各状態は遷移表（dict）・失敗遷移・出力（パターン番号）を持つ。
+    """
+    
+    def __init__(self, patterns: List[str]):
+        self.patterns = patterns
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[int, ...]] = [()]
+        
+        for pattern_id, pattern in enumerate(patterns):
+            self._insert(pattern, pattern_id)
+        self._build_failure_links()
+    
+    def _insert(self, pattern: str, pattern_id: int):
+        """トライにパターンを追加"""
+        state = 0
+        for ch in pattern:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            state = next_state
+        self._output[state] += (pattern_id,)
+    
+    def _build_failure_links(self):
+        """幅優先で失敗遷移を構築し、出力を失敗先から継承"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] += self._output[self._fail[next_state]]
+    
+    def find_all(self, text: str) -> List[int]:
+        """
+        テキストに出現するパターン番号をすべて取得
+        
+        Returns:
+            出現したパターン番号のリスト（出現回数分）
+        """
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        
+        matches = []
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                matches.extend(output[state])
+        return matches
+    
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+
+class KeywordClassifier:
+    """
+    キーワード辞書による検索戦略の分類クラス
+    
+    辞書ディレクトリ（既定: data/keywords）の *.json を読み込む。
+    
+    辞書ファイルの形式:
+        {
+            "strategy": "faq_focus",
+            "focus": "faq",
+            "keywords": {"ログイン": 1.0, "パスワード": 1.5}
+        }
+    
+    strategy は任意の名前を付けられ（例: 製品分野ごとの戦略）、
+    focus（faq / manual / balanced）で検索の実行方法を指定する。
+    keywords はキーワードのリスト（重み1.0）でもよい。
+    
+    クエリに含まれるキーワードの重みを戦略ごとに合計し、最も高い
+    戦略を採用する。同点の場合やマッチがない場合は balanced とする。
+    辞書ファイルの変更は一定間隔で検出し、再起動なしで反映する。
+    """
+    
+    def __init__(self, dictionary_dir: Optional[Path] = None, reload_interval: Optional[float] = None):
+        self.dictionary_dir = Path(dictionary_dir or config.KEYWORD_DICT_DIR)
+        self.reload_interval = (
+            config.KEYWORD_RELOAD_INTERVAL if reload_interval is None else reload_interval
+        )
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._failed_snapshot = None
+        self._last_checked = 0.0
+        
+        # (オートマトン, キーワードごとの [(戦略, 重み)], 戦略 -> フォーカス)
+        self._state: Tuple[AhoCorasickAutomaton, List[List[Tuple[str, float]]], Dict[str, str]] = (
+            AhoCorasickAutomaton([]), [], {}
+        )
+        self.reload(force=True)
+    
+    def _dictionary_snapshot(self) -> Tuple[Tuple[str, int, int], ...]:
+        """辞書ファイルの (名前, 更新時刻, サイズ) の一覧"""
+        snapshot = []
+        for path in sorted(self.dictionary_dir.glob("*.json")):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            snapshot.append((path.name, stat.st_mtime_ns, stat.st_size))
+        return tuple(snapshot)
+    
+    def reload(self, force: bool = False) -> bool:
+        """
+        辞書ファイルを（変更があれば）読み込み直す
+        
+        読み込みに失敗した場合は直前の辞書を使い続ける。
+        
+        Args:
+            force: 変更の有無に関わらず読み込む
+        
+        Returns:
+            辞書を読み込み直したかどうか
+        """
+        with self._lock:
+            self._last_checked = time.monotonic()
+            snapshot = self._dictionary_snapshot()
+            if not force and snapshot in (self._snapshot, self._failed_snapshot):
+                return False
+            
+            try:
+                self._state = self._load(snapshot)
+                self._snapshot = snapshot
+                self._failed_snapshot = None
+            except Exception as e:
+                # 同じ内容のまま再試行してエラーを繰り返さないよう記録
+                self._failed_snapshot = snapshot
+                logger.error(f"キーワード辞書の読み込みに失敗しました: {e}")
+                return False
+        
+        summary = self.get_summary()
+        logger.info(
+            f"キーワード辞書を読み込みました: {summary['dictionary_count']}ファイル, "
+            f"{summary['keyword_count']}キーワード, 戦略 {summary['strategies']}"
+        )
+        return True
+    
+    def _load(self, snapshot) -> Tuple[AhoCorasickAutomaton, List[List[Tuple[str, float]]], Dict[str, str]]:
+        """辞書ファイルからオートマトンを構築"""
+        if not snapshot:
+            logger.warning(f"キーワード辞書が見つかりません: {self.dictionary_dir}")
+        
+        keyword_weights: Dict[str, Dict[str, float]] = {}
+        focuses: Dict[str, str] = {}
+        
+        for name, _, _ in snapshot:
+            path = self.dictionary_dir / name
+            data = json.loads(path.read_text(encoding='utf-8'))
+            
+            strategy = data.get('strategy') or path.stem
+            focus = data.get('focus') or next(
+                (key for key, base in BASE_STRATEGIES.items() if base == strategy),
+                'balanced'
+            )
+            if focus not in BASE_STRATEGIES:
+                raise ValueError(f"{name}: 不明なfocusです: {focus}")
+            focuses[strategy] = BASE_STRATEGIES[focus]
+            
+            keywords = data.get('keywords', {})
+            if isinstance(keywords, list):
+                keywords = {keyword: 1.0 for keyword in keywords}
+            
+            for keyword, weight in keywords.items():
+                normalized = normalize_keyword_text(keyword).strip()
+                if not normalized:
+                    continue
+                weights = keyword_weights.setdefault(normalized, {})
+                weights[strategy] = max(weights.get(strategy, 0.0), float(weight))
+        
+        patterns = list(keyword_weights)
+        automaton = AhoCorasickAutomaton(patterns)
+        pattern_weights = [list(keyword_weights[pattern].items()) for pattern in patterns]
+        return automaton, pattern_weights, focuses
+    
+    def _maybe_reload(self):
+        """再読み込み間隔を過ぎていれば辞書の変更を確認"""
+        if self.reload_interval >= 0 and time.monotonic() - self._last_checked >= self.reload_interval:
+            self.reload()
+    
+    def score(self, query: str) -> Dict[str, float]:
+        """
+        戦略ごとのキーワードスコアを計算
+        
+        同じキーワードが複数回出現しても1回として数える。
+        """
+        self._maybe_reload()
+        automaton, pattern_weights, _ = self._state
+        
+        scores: Dict[str, float] = {}
+        for pattern_id in set(automaton.find_all(normalize_keyword_text(query))):
+            for strategy, weight in pattern_weights[pattern_id]:
+                scores[strategy] = scores.get(strategy, 0.0) + weight
+        return scores
+    
+    def classify(self, query: str) -> str:
+        """
+        クエリの検索戦略を決定
+        
+        Returns:
+            戦略名（最高スコアが同点・マッチなしの場合は balanced）
+        """
+        scores = self.score(query)
+        if not scores:
+            return DEFAULT_STRATEGY
+        
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        if len(ranked) > 1 and ranked[0][1] == ranked[1][1]:
+            return DEFAULT_STRATEGY
+        return ranked[0][0]
+    
+    def focus_of(self, strategy: str) -> str:
+        """戦略に対応する基本戦略（faq_focus / manual_focus / balanced）を取得"""
+        if strategy in BASE_STRATEGIES.values():
+            return strategy
+        return self._state[2].get(strategy, DEFAULT_STRATEGY)
+    
+    def get_summary(self) -> Dict[str, Any]:
+        """読み込み済み辞書の概要を取得"""
+        automaton, pattern_weights, focuses = self._state
+        keyword_counts: Dict[str, int] = {}
+        for weights in pattern_weights:
+            for strategy, _ in weights:
+                keyword_counts[strategy] = keyword_counts.get(strategy, 0) + 1
+        
+        return {
+            'dictionary_dir': str(self.dictionary_dir),
+            'dictionary_count': len(self._snapshot or ()),
+            'keyword_count': len(automaton),
+            'strategies': {
+                strategy: {'focus': focus, 'keyword_count': keyword_counts.get(strategy, 0)}
+                for strategy, focus in focuses.items()
+            }
+        }
+
+
+# グローバルインスタンス管理
+_keyword_classifier = None
+
+def get_keyword_classifier() -> KeywordClassifier:
+    """キーワード分類器のグローバルインスタンスを取得"""
+    global _keyword_classifier
+    if _keyword_classifier is None:
+        _keyword_classifier = KeywordClassifier()
+    return _keyword_classifier
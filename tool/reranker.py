@@ -0,0 +1,257 @@
+"""
+クロスエンコーダーによる検索結果の再順位付け
+(クエリ, 候補) のペアを一括でスコアリングし、スコアをキャッシュ
+"""
+
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.configs import config
+from src.custom_logger import get_module_logger
+from src.deadline import remaining_seconds
+from src.index_registry import get_index_registry
+from src.metrics import CACHE_HITS, CACHE_LOOKUPS
+from src.models import SearchHit
+
+logger = get_module_logger("reranker")
+
+
+def _query_hash(query: str) -> str:
+    """キャッシュキー用のクエリハッシュ"""
+    return hashlib.sha1(query.strip().encode('utf-8')).hexdigest()[:16]
+
+
+class CrossEncoderReranker:
+    """
+    クロスエンコーダーによる再順位付けクラス
+    
+    ペアのスコアは (クエリハッシュ, ドキュメントID) をキーにLRUで
+    キャッシュし、インデックス更新時は変更されたIDのみ無効化する。
+    
+    1ペアあたりの処理時間を指数移動平均で推定し、未キャッシュの
+    ペア数から見積もった時間が予算を超える場合は再順位付けを
+    スキップする（呼び出し側は元の順位を使う）。推定が過大なまま
+    固定されないよう、一定回数スキップが続いたら計測し直す。
+    """
+    
+    EMA_ALPHA = 0.2
+    REMEASURE_AFTER_SKIPS = 20
+    
+    def __init__(self):
+        self.model = None
+        self.enabled = False
+        self.latency_budget_ms = config.RERANK_LATENCY_BUDGET_MS
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # 統計・処理時間の推定は並行する検索から更新されるため別のロックで保護
+        self._stats_lock = threading.Lock()
+        self._ms_per_pair: Optional[float] = None
+        self._consecutive_skips = 0
+        self.stats = {
+            'reranked': 0,
+            'skipped_budget': 0,
+            'skipped_deadline': 0,
+            'over_budget': 0,
+            'cache_hits': 0,
+            'cache_misses': 0
+        }
+        self._initialize()
+    
+    def _initialize(self):
+        """クロスエンコーダーを読み込み（失敗時は再順位付けを無効化）"""
+        if not config.RERANK_ENABLED:
+            logger.info("再順位付けは無効です (RERANK_ENABLED=false)")
+            return
+        
+        try:
+            from sentence_transformers import CrossEncoder
+            
+            logger.info(f"クロスエンコーダーを読み込み中: {config.RERANK_MODEL}")
+            self.model = CrossEncoder(config.RERANK_MODEL, max_length=config.RERANK_MAX_LENGTH)
+            self.enabled = True
+            
+            # インデックス更新時にキャッシュを無効化
+            get_index_registry().add_listener(self.invalidate)
+            
+            logger.info("クロスエンコーダーの初期化が完了しました")
+        
+        except Exception as e:
+            logger.error(f"クロスエンコーダーの初期化に失敗しました（再順位付けを無効化します）: {e}")
+            self.model = None
+            self.enabled = False
+    
+    def rerank(
+        self,
+        query: str,
+        candidates: List[SearchHit],
+        contents: List[str],
+        top_n: Optional[int] = None
+    ) -> Optional[List[SearchHit]]:
+        """
+        候補をクロスエンコーダーのスコア順に並べ替え
+        
+        Args:
+            query: 検索クエリ
+            candidates: 再順位付けする候補
+            contents: 各候補の（整形済みの）内容
+            top_n: 返す件数
+        
+        Returns:
+            並べ替えた上位の候補（rerank_score を設定）。予算超過・失敗時はNone
+        """
+        if not self.enabled or not candidates:
+            return None
+        
+        top_n = top_n or config.RERANK_TOP_N
+        query_key = _query_hash(query)
+        keys = [(query_key, self._doc_key(hit, content)) for hit, content in zip(candidates, contents)]
+        
+        scores: Dict[int, float] = {}
+        with self._cache_lock:
+            for position, key in enumerate(keys):
+                score = self._cache.get(key)
+                if score is not None:
+                    self._cache.move_to_end(key)
+                    scores[position] = score
+        
+        missing = [position for position in range(len(candidates)) if position not in scores]
+        with self._stats_lock:
+            self.stats['cache_hits'] += len(scores)
+            self.stats['cache_misses'] += len(missing)
+            ms_per_pair = self._ms_per_pair
+        CACHE_LOOKUPS.inc("rerank", amount=len(candidates))
+        CACHE_HITS.inc("rerank", amount=len(scores))
+        
+        if missing:
+            # リクエストの処理期限までに終わらない見込みならスキップ
+            remaining = remaining_seconds()
+            if remaining is not None:
+                estimated_ms = (ms_per_pair or 0.0) * len(missing)
+                if remaining <= 0 or estimated_ms > remaining * 1000:
+                    with self._stats_lock:
+                        self.stats['skipped_deadline'] += 1
+                    logger.info(
+                        f"再順位付けをスキップしました: 見積もり {estimated_ms:.0f}ms, "
+                        f"処理期限まで {remaining * 1000:.0f}ms ({len(missing)}ペア)"
+                    )
+                    return None
+            
+            # 見積もりが予算を超える場合はスキップ
+            skipped = False
+            if ms_per_pair is not None:
+                estimated_ms = ms_per_pair * len(missing)
+                with self._stats_lock:
+                    if (
+                        estimated_ms > self.latency_budget_ms
+                        and self._consecutive_skips < self.REMEASURE_AFTER_SKIPS
+                    ):
+                        self._consecutive_skips += 1
+                        self.stats['skipped_budget'] += 1
+                        skipped = True
+                    else:
+                        self._consecutive_skips = 0
+            if skipped:
+                logger.info(
+                    f"再順位付けをスキップしました: 見積もり {estimated_ms:.0f}ms > "
+                    f"予算 {self.latency_budget_ms:.0f}ms ({len(missing)}ペア)"
+                )
+                return None
+            
+            try:
+                new_scores = self._predict(query, [contents[position] for position in missing])
+            except Exception as e:
+                logger.error(f"再順位付けのスコア計算に失敗しました: {e}")
+                return None
+            
+            with self._cache_lock:
+                for position, score in zip(missing, new_scores):
+                    scores[position] = score
+                    self._cache[keys[position]] = score
+                while len(self._cache) > config.RERANK_CACHE_SIZE:
+                    self._cache.popitem(last=False)
+        
+        order = sorted(range(len(candidates)), key=lambda position: scores[position], reverse=True)
+        reranked = []
+        for position in order[:top_n]:
+            hit = candidates[position]
+            hit.rerank_score = scores[position]
+            reranked.append(hit)
+        
+        with self._stats_lock:
+            self.stats['reranked'] += 1
+        return reranked
+    
+    def _predict(self, query: str, contents: List[str]) -> List[float]:
+        """ペアを1回のバッチ推論でスコアリングし、処理時間の推定を更新"""
+        start = time.perf_counter()
+        raw_scores = self.model.predict(
+            [(query, content) for content in contents],
+            batch_size=config.RERANK_BATCH_SIZE,
+            show_progress_bar=False
+        )
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        
+        per_pair = elapsed_ms / len(contents)
+        over_budget = elapsed_ms > self.latency_budget_ms
+        with self._stats_lock:
+            if self._ms_per_pair is None:
+                self._ms_per_pair = per_pair
+            else:
+                self._ms_per_pair += self.EMA_ALPHA * (per_pair - self._ms_per_pair)
+            if over_budget:
+                self.stats['over_budget'] += 1
+        
+        if over_budget:
+            logger.warning(f"再順位付けが予算を超過しました: {elapsed_ms:.0f}ms ({len(contents)}ペア)")
+        
+        return [float(score) for score in raw_scores]
+    
+    @staticmethod
+    def _doc_key(hit: SearchHit, content: str) -> str:
+        """ドキュメントIDを取得（IDがない場合は内容のハッシュ）"""
+        return hit.doc_id or hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+    
+    def invalidate(self, changed_ids: Optional[Set[str]] = None):
+        """変更されたドキュメントのスコアを破棄（Noneは全件）"""
+        with self._cache_lock:
+            if changed_ids is None:
+                self._cache.clear()
+            else:
+                for key in [key for key in self._cache if key[1] in changed_ids]:
+                    del self._cache[key]
+        
+        logger.info(f"再順位付けキャッシュを無効化しました (対象: {'全件' if changed_ids is None else len(changed_ids)})")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """再順位付けの統計を取得"""
+        with self._cache_lock:
+            cache_size = len(self._cache)
+        with self._stats_lock:
+            ms_per_pair = self._ms_per_pair
+            stats = dict(self.stats)
+        
+        return {
+            'enabled': self.enabled,
+            'cache_size': cache_size,
+            'estimated_ms_per_pair': ms_per_pair,
+            **stats
+        }
+
+
+# グローバルインスタンス管理
+_reranker = None
+
+def get_reranker() -> CrossEncoderReranker:
+    """再順位付けのグローバルインスタンスを取得"""
+    global _reranker
+    if _reranker is None:
+        _reranker = CrossEncoderReranker()
+    return _reranker
@@ -0,0 +1,418 @@
+"""
+BM25による語彙検索エンジン
+日本語向けの文字n-gramで転置インデックスを構築し、完全一致に強い検索を提供
+"""
+
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import unicodedata
+import numpy as np
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional, Dict, Any, Iterable, Sequence
+
+# プロジェクトルートをパスに追加
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.configs import config
+from src.custom_logger import get_module_logger
+from src.index_registry import get_index_registry
+
+logger = get_module_logger("search_lexical")
+
+# 英数字の語（エラーコード・システム名など）はn-gramに分割せず1語として扱う
+_WORD_PATTERN = re.compile(r"[0-9a-z]+(?:[-_.][0-9a-z]+)*")
+# ひらがな・カタカナ・漢字の連続はn-gramに分割する
+_CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff々〆]+")
+
+
+def tokenize(text: str, ngram_sizes: Optional[Sequence[int]] = None) -> List[str]:
+    """
+    形態素解析器を使わずに日本語テキストをトークン化
+    
+    NFKC正規化・小文字化の後、英数字の語はそのまま、
+    日本語の連続部分は文字n-gramに分割する。n-gramより短い
+    日本語の連続部分はそのまま1トークンとする。
+    
+    Args:
+        text: 対象テキスト
+        ngram_sizes: 生成するn-gramの長さ
+    
+    Returns:
+        トークンのリスト
+    """
+    ngram_sizes = ngram_sizes or config.LEXICAL_NGRAM_SIZES
+    normalized = unicodedata.normalize("NFKC", text).lower()
+    
+    tokens = _WORD_PATTERN.findall(normalized)
+    for run in _CJK_PATTERN.findall(normalized):
+        if len(run) < min(ngram_sizes):
+            tokens.append(run)
+            continue
+        for size in ngram_sizes:
+            tokens.extend(run[i:i + size] for i in range(len(run) - size + 1))
+    return tokens
+
+
+def lexical_index_path(collection_name: str) -> Path:
+    """コレクションに対応する語彙インデックスのパス"""
+    return config.LEXICAL_INDEX_DIR / f"{collection_name}.npz"
+
+
+class LexicalIndex:
+    """
+    配列ベースのBM25転置インデックス
+    
+    ポスティングは CSR 形式で保持する:
+        term_offsets[t]:term_offsets[t+1] が語 t のポスティング範囲
+        posting_docs / posting_tfs にその範囲の文書番号と出現回数
+    """
+    
+    def __init__(
+        self,
+        terms: List[str],
+        term_offsets: np.ndarray,
+        posting_docs: np.ndarray,
+        posting_tfs: np.ndarray,
+        doc_lengths: np.ndarray,
+        doc_ids: List[str],
+        doc_types: List[str],
+        documents: List[str],
+        metadatas: List[Dict[str, Any]]
+    ):
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        self.terms = terms
+        self.term_offsets = term_offsets
+        self.posting_docs = posting_docs
+        self.posting_tfs = posting_tfs
+        self.doc_lengths = doc_lengths
+        self.doc_ids = doc_ids
+        self.doc_types = doc_types
+        self.documents = documents
+        self.metadatas = metadatas
+        
+        doc_count = len(doc_ids)
+        avg_length = float(doc_lengths.mean()) if doc_count else 0.0
+        document_frequency = np.diff(term_offsets).astype(np.float32)
+        
+        # 検索時の計算を減らすため、IDFと文書長正規化項を事前計算
+        self.idf = np.log1p((doc_count - document_frequency + 0.5) / (document_frequency + 0.5))
+        self.length_norm = config.BM25_K1 * (
+            1 - config.BM25_B + config.BM25_B * doc_lengths / max(avg_length, 1e-9)
+        )
+        self.type_masks = {
+            doc_type: np.array([t == doc_type for t in doc_types], dtype=bool)
+            for doc_type in set(doc_types)
+        }
+    
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+    
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        doc_type: Optional[str] = None
+    ) -> List[tuple]:
+        """
+        BM25で検索
+        
+        Args:
+            query: 検索クエリ
+            top_k: 取得件数
+            doc_type: 文書種別での絞り込み（faq / manual）
+        
+        Returns:
+            (文書番号, BM25スコア) のリスト（スコア降順）
+        """
+        query_terms = Counter(t for t in tokenize(query) if t in self.term_ids)
+        if not query_terms or not len(self):
+            return []
+        
+        scores = np.zeros(len(self), dtype=np.float32)
+        k1 = config.BM25_K1
+        for term, query_tf in query_terms.items():
+            term_id = self.term_ids[term]
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            docs = self.posting_docs[start:end]
+            tfs = self.posting_tfs[start:end]
+            scores[docs] += query_tf * self.idf[term_id] * tfs * (k1 + 1) / (tfs + self.length_norm[docs])
+        
+        if doc_type is not None:
+            mask = self.type_masks.get(doc_type)
+            if mask is None:
+                return []
+            scores[~mask] = 0.0
+        
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        
+        return [(int(i), float(scores[i])) for i in candidates]
+    
+    def save(self, path: Path):
+        """インデックスをnpz形式でアトミックに保存"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = json.dumps(
+            {
+                'terms': self.terms,
+                'doc_ids': self.doc_ids,
+                'doc_types': self.doc_types,
+                'documents': self.documents,
+                'metadatas': self.metadatas
+            },
+            ensure_ascii=False
+        ).encode('utf-8')
+        
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    term_offsets=self.term_offsets,
+                    posting_docs=self.posting_docs,
+                    posting_tfs=self.posting_tfs,
+                    doc_lengths=self.doc_lengths,
+                    payload=np.frombuffer(payload, dtype=np.uint8)
+                )
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+    
+    @classmethod
+    def load(cls, path: Path) -> "LexicalIndex":
+        """npz形式のインデックスを読み込み"""
+        with np.load(path, allow_pickle=False) as data:
+            payload = json.loads(data['payload'].tobytes().decode('utf-8'))
+            return cls(
+                terms=payload['terms'],
+                term_offsets=data['term_offsets'],
+                posting_docs=data['posting_docs'],
+                posting_tfs=data['posting_tfs'],
+                doc_lengths=data['doc_lengths'],
+                doc_ids=payload['doc_ids'],
+                doc_types=payload['doc_types'],
+                documents=payload['documents'],
+                metadatas=payload['metadatas']
+            )
+
+
+class LexicalIndexBuilder:
+    """語彙インデックスの構築クラス"""
+    
+    def __init__(self):
+        self._postings: Dict[str, List[tuple]] = {}
+        self._doc_lengths: List[int] = []
+        self._doc_ids: List[str] = []
+        self._doc_types: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+    
+    def add(self, doc_id: str, document: str, metadata: Dict[str, Any]):
+        """ドキュメントを追加"""
+        # FAQの言い換え質問も検索対象に含める
+        text = document
+        alternates = metadata.get('alternate_questions')
+        if alternates:
+            text = f"{document}\n{alternates}"
+        
+        doc_index = len(self._doc_ids)
+        term_counts = Counter(tokenize(text))
+        for term, count in term_counts.items():
+            self._postings.setdefault(term, []).append((doc_index, count))
+        
+        self._doc_lengths.append(sum(term_counts.values()))
+        self._doc_ids.append(doc_id)
+        self._doc_types.append(metadata.get('type', ''))
+        self._documents.append(document)
+        # 圧縮用の文の埋め込みは語彙インデックスには保存しない（必要時はベクトルDBから取得）
+        self._metadatas.append({
+            key: value for key, value in metadata.items()
+            if key not in ('sentence_embeddings', 'sentence_count')
+        })
+    
+    def add_many(self, ids: Iterable[str], documents: Iterable[str], metadatas: Iterable[Dict[str, Any]]):
+        """ドキュメントをまとめて追加"""
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            self.add(doc_id, document, metadata)
+    
+    def build(self) -> LexicalIndex:
+        """CSR形式のインデックスを構築"""
+        terms = sorted(self._postings)
+        lengths = [len(self._postings[term]) for term in terms]
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=term_offsets[1:])
+        
+        posting_docs = np.empty(term_offsets[-1], dtype=np.int32)
+        posting_tfs = np.empty(term_offsets[-1], dtype=np.float32)
+        for i, term in enumerate(terms):
+            postings = self._postings[term]
+            start = term_offsets[i]
+            posting_docs[start:start + len(postings)] = [doc for doc, _ in postings]
+            posting_tfs[start:start + len(postings)] = [tf for _, tf in postings]
+        
+        return LexicalIndex(
+            terms=terms,
+            term_offsets=term_offsets,
+            posting_docs=posting_docs,
+            posting_tfs=posting_tfs,
+            doc_lengths=np.asarray(self._doc_lengths, dtype=np.float32),
+            doc_ids=self._doc_ids,
+            doc_types=self._doc_types,
+            documents=self._documents,
+            metadatas=self._metadatas
+        )
+
+
+class LexicalSearchEngine:
+    """語彙検索エンジン"""
+    
+    def __init__(self):
+        self.index: Optional[LexicalIndex] = None
+        self._loaded_key = None
+        self._lock = threading.Lock()
+        self._refresh_index()
+    
+    def _refresh_index(self):
+        """アクティブなコレクションのインデックスを（変更があれば）読み込み"""
+        path = lexical_index_path(get_index_registry().resolve_collection_name())
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            missing_key = (str(path), None)
+            if self._loaded_key != missing_key:
+                logger.warning(f"語彙インデックスが見つかりません: {path}")
+                self._loaded_key = missing_key
+                self.index = None
+            return
+        
+        key = (str(path), stat.st_mtime_ns)
+        if key == self._loaded_key:
+            return
+        
+        with self._lock:
+            if key == self._loaded_key:
+                return
+            try:
+                self.index = LexicalIndex.load(path)
+                self._loaded_key = key
+                logger.info(f"語彙インデックスを読み込みました: {path} (ドキュメント数: {len(self.index)})")
+            except Exception as e:
+                logger.error(f"語彙インデックスの読み込みに失敗しました: {e}")
+    
+    def search_raw(
+        self,
+        query: str,
+        max_results: int = None,
+        doc_type: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        語彙検索を実行しChromaDBのquery結果と同じ形式で返す
+        
+        スコアは s / (s + LEXICAL_SCORE_SATURATION) で 0-1 に変換し、
+        距離 (1 - スコア) として格納する。各エンジンの
+        _process_search_hits でそのまま変換できる。
+        
+        Args:
+            query: 検索クエリ
+            max_results: 最大結果数
+            doc_type: 文書種別での絞り込み（faq / manual）
+        
+        Returns:
+            ids / documents / metadatas / distances を持つ辞書
+        """
+        empty = {'ids': [[]], 'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
+        try:
+            if not query.strip():
+                return empty
+            
+            self._refresh_index()
+            index = self.index
+            if index is None:
+                return empty
+            
+            max_results = max_results or config.MAX_SEARCH_RESULTS
+            hits = index.search(query, max_results, doc_type)
+            
+            saturation = config.LEXICAL_SCORE_SATURATION
+            metadatas = []
+            distances = []
+            for doc, bm25_score in hits:
+                metadata = dict(index.metadatas[doc])
+                metadata['bm25_score'] = bm25_score
+                metadatas.append(metadata)
+                distances.append(1 - bm25_score / (bm25_score + saturation))
+            
+            return {
+                'ids': [[index.doc_ids[doc] for doc, _ in hits]],
+                'documents': [[index.documents[doc] for doc, _ in hits]],
+                'metadatas': [metadatas],
+                'distances': [distances]
+            }
+        
+        except Exception as e:
+            logger.error(f"語彙検索に失敗しました: {e}")
+            return empty
+    
+    def health_check(self) -> bool:
+        """検索エンジンのヘルスチェック"""
+        self._refresh_index()
+        return self.index is not None and len(self.index) > 0
+
+
+# グローバルインスタンス管理
+_lexical_search_engine = None
+
+def get_lexical_search_engine() -> LexicalSearchEngine:
+    """語彙検索エンジンのグローバルインスタンスを取得"""
+    global _lexical_search_engine
+    if _lexical_search_engine is None:
+        _lexical_search_engine = LexicalSearchEngine()
+    return _lexical_search_engine
+
+
+def main():
+    """テスト用のメイン関数"""
+    import argparse
+    import time
+    
+    parser = argparse.ArgumentParser(description="語彙検索エンジンのテスト")
+    parser.add_argument('query', help='検索クエリ')
+    parser.add_argument('--max-results', type=int, default=5, help='最大結果数')
+    parser.add_argument('--type', choices=['faq', 'manual'], help='文書種別')
+    
+    args = parser.parse_args()
+    
+    try:
+        engine = get_lexical_search_engine()
+        if not engine.health_check():
+            logger.error("語彙インデックスが利用できません")
+            return 1
+        
+        start = time.perf_counter()
+        results = engine.search_raw(args.query, args.max_results, args.type)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        
+        print(f"\n=== 語彙検索結果: '{args.query}' ({len(results['ids'][0])}件, {elapsed_ms:.3f}ms)")
+        print("=" * 50)
+        for doc_id, document, metadata in zip(results['ids'][0], results['documents'][0], results['metadatas'][0]):
+            print(f"\n[{metadata.get('type')}] {doc_id} (BM25: {metadata['bm25_score']:.3f})")
+            print(document)
+            print("-" * 30)
+        
+        return 0
+    
+    except Exception as e:
+        logger.error(f"テスト実行に失敗しました: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,14 +8,19 @@ from pathlib import Path
 from typing import List, Optional, Dict, Any
 import chromadb
 from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
 
 # プロジェクトルートをパスに追加
 sys.path.append(str(Path(__file__).parent.parent))
 
+from src.compression import attach_sentence_data
 from src.configs import config
 from src.custom_logger import get_module_logger
-from src.models import SearchResult
+from src.deadline import DeadlineExceeded, check_deadline
+from src.index_registry import get_index_registry
+from src.metrics import EMBEDDING_BATCH_SIZE, EMBEDDING_CALLS, VECTOR_QUERY_SECONDS
+from src.models import SearchHit, SearchResult
+from src.timing import span
+from tool.embedding_model import get_embedding_model
 
 logger = get_module_logger("search_qa")
 
@@ -27,14 +32,14 @@ class FAQSearchEngine:
         self.embedding_model = None
         self.chroma_client = None
         self.collection = None
+        self.collection_name = None
         self._initialize()
     
     def _initialize(self):
         """検索エンジンを初期化"""
         try:
-            # 埋め込みモデルを読み込み
-            logger.info(f"埋め込みモデルを読み込み中: {config.EMBEDDING_MODEL}")
-            self.embedding_model = SentenceTransformer(config.EMBEDDING_MODEL)
+            # 埋め込みモデルを取得（FAQ/マニュアルで共有）
+            self.embedding_model = get_embedding_model()
             
             # ChromaDBに接続
             self._connect_to_chroma()
@@ -54,25 +59,41 @@ class FAQSearchEngine:
                 settings=Settings(allow_reset=True)
             )
             
-            # FAQコレクションを取得
+            # FAQコレクションを取得（エイリアスを解決）
+            self.collection_name = get_index_registry().resolve_collection_name()
             self.collection = self.chroma_client.get_collection(
-                name=config.CHROMA_COLLECTION_NAME
+                name=self.collection_name
             )
             
             # コレクションの件数を確認
             count = self.collection.count()
-            logger.info(f"ChromaDBに接続しました (コレクション: {config.CHROMA_COLLECTION_NAME}, ドキュメント数: {count})")
+            logger.info(f"ChromaDBに接続しました (コレクション: {self.collection_name}, ドキュメント数: {count})")
             
         except Exception as e:
             logger.error(f"ChromaDBサーバーへの接続に失敗しました: {e}")
             logger.error("ChromaDBが動作していることを確認してください")
             raise
     
+    def _refresh_collection(self):
+        """エイリアスが切り替わっていれば新しいコレクションに付け替え"""
+        collection_name = get_index_registry().resolve_collection_name()
+        if collection_name == self.collection_name:
+            return
+        
+        try:
+            self.collection = self.chroma_client.get_collection(name=collection_name)
+            logger.info(f"コレクションを切り替えました: {self.collection_name} -> {collection_name}")
+            self.collection_name = collection_name
+        except Exception as e:
+            # 切り替え先が取得できない場合は現行コレクションで継続
+            logger.error(f"コレクション '{collection_name}' への切り替えに失敗しました: {e}")
+    
     def search_faq(
         self, 
         query: str, 
         max_results: int = None,
-        min_score: float = None
+        min_score: float = None,
+        query_embedding: Optional[List[float]] = None
     ) -> List[SearchResult]:
         """
         FAQ検索を実行
@@ -81,10 +102,27 @@ class FAQSearchEngine:
             query: 検索クエリ
             max_results: 最大結果数
             min_score: 最低類似度スコア
+            query_embedding: 計算済みのクエリ埋め込み（省略時はここで計算）
         
         Returns:
             検索結果のリスト
         """
+        hits = self.search_hits(query, max_results, min_score, query_embedding)
+        return [self.to_search_result(hit) for hit in hits]
+    
+    def search_hits(
+        self, 
+        query: str, 
+        max_results: int = None,
+        min_score: float = None,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[SearchHit]:
+        """
+        FAQ検索を実行し、内部表現（SearchHit）のまま返す
+        
+        統合検索エンジンは融合・絞り込みの後で最終結果だけを変換する。
+        引数は search_faq と同じ。
+        """
         try:
             if not query.strip():
                 logger.warning("空の検索クエリが指定されました")
@@ -92,27 +130,43 @@ class FAQSearchEngine:
             
             # デフォルト値を設定
             max_results = max_results or config.MAX_SEARCH_RESULTS
-            min_score = min_score or config.SIMILARITY_THRESHOLD
+            min_score = config.SIMILARITY_THRESHOLD if min_score is None else min_score
             
             logger.info(f"FAQ検索を実行: '{query}' (最大{max_results}件, 最低スコア{min_score})")
             
+            self._refresh_collection()
+            
             # クエリを埋め込みベクトルに変換
-            query_embedding = self.embedding_model.encode([query]).tolist()[0]
+            if query_embedding is None:
+                with span("faq.embed"):
+                    query_embedding = self.embedding_model.encode([query]).tolist()[0]
+                EMBEDDING_CALLS.inc("faq")
+                EMBEDDING_BATCH_SIZE.observe(1, "faq")
             
             # ChromaDBで類似度検索を実行
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=max_results,
-                where={"type": "faq"},  # FAQのみを対象
-                include=["documents", "metadatas", "distances"]
-            )
+            # 埋め込みは多様化（MMR）・文脈圧縮で使う場合のみ取得
+            include = ["documents", "metadatas", "distances"]
+            if config.MMR_ENABLED or config.COMPRESSION_ENABLED:
+                include.append("embeddings")
+            
+            check_deadline("faq.dense")
+            with span("faq.dense"), VECTOR_QUERY_SECONDS.time("faq"):
+                results = self.collection.query(
+                    query_embeddings=[query_embedding],
+                    n_results=max_results,
+                    where={"type": "faq"},  # FAQのみを対象
+                    include=include
+                )
             
             # 結果を処理
-            search_results = self._process_search_results(results, min_score)
+            hits = self._process_search_hits(results, min_score)
             
-            logger.info(f"FAQ検索完了: {len(search_results)}件の結果を取得")
-            return search_results
+            logger.info(f"FAQ検索完了: {len(hits)}件の結果を取得")
+            return hits
             
+        except DeadlineExceeded as e:
+            logger.warning(f"FAQ検索を中止しました: {e}")
+            return []
         except Exception as e:
             logger.error(f"FAQ検索に失敗しました: {e}")
             return []
@@ -123,41 +177,61 @@ class FAQSearchEngine:
         min_score: float
     ) -> List[SearchResult]:
         """検索結果を処理してSearchResultオブジェクトに変換"""
-        search_results = []
+        return [self.to_search_result(hit) for hit in self._process_search_hits(raw_results, min_score)]
+    
+    def _process_search_hits(
+        self, 
+        raw_results: Dict[str, Any], 
+        min_score: float
+    ) -> List[SearchHit]:
+        """検索結果を内部表現（SearchHit）に変換（スコアの高い順）"""
+        hits = []
         
         if not raw_results['documents'] or not raw_results['documents'][0]:
-            return search_results
+            return hits
         
         documents = raw_results['documents'][0]
         metadatas = raw_results['metadatas'][0]
         distances = raw_results['distances'][0]
+        ids = raw_results['ids'][0] if raw_results.get('ids') else [None] * len(documents)
+        
+        # 検索時に取得した埋め込み（多様化に再利用、語彙検索の結果にはない）
+        raw_embeddings = raw_results.get('embeddings')
+        embeddings = raw_embeddings[0] if raw_embeddings is not None else [None] * len(documents)
         
-        for doc, metadata, distance in zip(documents, metadatas, distances):
+        for doc_id, doc, metadata, distance, embedding in zip(ids, documents, metadatas, distances, embeddings):
             # 距離を類似度スコアに変換（距離が小さいほど類似度が高い）
             similarity_score = max(0, 1 - distance)
             
             # 最低スコア以上の結果のみを追加
             if similarity_score >= min_score:
-                # FAQ形式の内容を整形
-                content = self._format_faq_content(metadata)
-                
-                search_result = SearchResult(
-                    content=content,
-                    source=f"FAQ: {metadata.get('question', 'Unknown')}",
-                    score=similarity_score,
-                    metadata={
-                        'type': 'faq',
-                        'question': metadata.get('question', ''),
-                        'answer': metadata.get('answer', ''),
-                        'original_distance': distance
-                    }
-                )
-                search_results.append(search_result)
+                hits.append(SearchHit('faq', doc_id, similarity_score, distance, doc, metadata, embedding))
         
         # スコアの高い順にソート
-        search_results.sort(key=lambda x: x.score, reverse=True)
+        hits.sort(key=lambda hit: hit.score, reverse=True)
         
-        return search_results
+        return hits
+    
+    def to_search_result(self, hit: SearchHit) -> SearchResult:
+        """内部表現をAPIに返す SearchResult に変換"""
+        metadata = hit.metadata
+        
+        search_result = SearchResult(
+            content=self._format_faq_content(metadata),
+            source=f"FAQ: {metadata.get('question', 'Unknown')}",
+            score=hit.score,
+            metadata={
+                'type': 'faq',
+                'question': metadata.get('question', ''),
+                'answer': metadata.get('answer', ''),
+                'doc_id': hit.doc_id,
+                'original_distance': hit.distance,
+                **hit.ranking_metadata()
+            }
+        )
+        search_result.set_embedding(hit.embedding)
+        attach_sentence_data(search_result, hit.document, metadata)
+        return search_result
     
     def _format_faq_content(self, metadata: Dict[str, Any]) -> str:
         """FAQメタデータをユーザー向け形式に整形"""
@@ -204,6 +278,7 @@ class FAQSearchEngine:
         """
         try:
             logger.info(f"ランダムFAQを{count}件取得中...")
+            self._refresh_collection()
             
             # ダミークエリで検索（実際の実装ではランダム選択が必要）
             results = self.collection.query(
@@ -222,6 +297,8 @@ class FAQSearchEngine:
     def health_check(self) -> bool:
         """検索エンジンのヘルスチェック"""
         try:
+            self._refresh_collection()
+            
             # コレクションの件数を取得
             count = self.collection.count()
             if count == 0: